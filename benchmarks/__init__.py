@@ -0,0 +1,9 @@
+# 基准测试脚本，从仓库根目录以 `python -m benchmarks.<name>` 运行。
+# 与 pyproject.toml 中 pytest 的 pythonpath 配置保持一致: 同时将仓库根目录和 src 加入导入路径。
+import sys
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+for _path in (str(_ROOT), str(_ROOT / "src")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
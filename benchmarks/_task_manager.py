@@ -0,0 +1,10 @@
+"""基准测试共用的 InMemoryTaskManager: 只测存储和锁，不实现任务执行。"""
+from src.vendor.A2A.server.task_manager import InMemoryTaskManager
+
+
+class StubTaskManager(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
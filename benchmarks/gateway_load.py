@@ -0,0 +1,192 @@
+"""
+网关端到端负载基准测试。
+
+在同一进程内运行 A2AServer + MCPGatewayAgentTaskManager，客户端和下游 MCP 服务
+(examples/MCP/service.py) 都通过 httpx.ASGITransport 连接，不经过网络，测得的是网关自身的开销。
+对 并发数 × 结果大小 × 错误比例 的每种组合执行 --tasks 个 tasks/send，报告:
+    tasks_per_s                 吞吐量
+    latency_ms.p50/p95/p99      单个 tasks/send 的延迟
+    peak_rss_mb                 本轮运行期间进程的最大常驻内存 (每 10ms 采样一次)
+    outcomes                    completed / failed / protocol_error 的任务数
+错误按比例均匀分布在任务中，一半是 MCP 返回的 JSON-RPC 错误，一半是 HTTP 500。
+结果为 JSON (键有序)，可以在不同版本之间直接 diff。
+
+用法 (在仓库根目录运行):
+    python -m benchmarks.gateway_load --concurrency 1 16 128 --sizes 256 16384 1048576 --error-ratios 0 0.1 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from examples.MCP.service import create_app as create_mcp_service
+from src.translator.agent_card import def_get_mcp_gateway_agent_card
+from src.translator.mcp_client import MCPClientRegistry
+from src.translator.resilience import CircuitBreakers
+from src.translator.task_manager import MCPGatewayAgentTaskManager
+from src.vendor.A2A.server import A2AServer
+
+MCP_URL = "http://mock-mcp.local/mcp"
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # 非 Linux: 只能得到整个进程生命周期的峰值 (macOS 以字节为单位，其他系统以 KB 为单位)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == "Darwin" else peak * 1024
+
+
+async def _sample_rss(peak: List[int], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        peak[0] = max(peak[0], _rss_bytes())
+        try:
+            await asyncio.wait_for(stop.wait(), 0.01)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _arguments(i: int, size: int, error_ratio: float) -> Dict[str, Any]:
+    """第 i 个任务的 tools/call 参数。错误按比例均匀分布，交替使用 JSON-RPC 错误和 HTTP 500。"""
+    errors_before, errors_through = int(i * error_ratio), int((i + 1) * error_ratio)
+    if errors_through > errors_before:
+        return {"fail": "jsonrpc" if errors_through % 2 else "http"}
+    return {"size": size}
+
+
+def _send_body(task_id: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": task_id,
+        "method": "tasks/send",
+        "params": {
+            "id": task_id,
+            "message": {"role": "user", "parts": [{"type": "data", "data": {
+                "mcp_target_url": MCP_URL,
+                "mcp_method": "tools/call",
+                "mcp_params": {"name": "echo", "arguments": arguments},
+            }}]},
+        },
+    }
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run_once(num_tasks: int, concurrency: int, size: int, error_ratio: float) -> Dict[str, Any]:
+    mcp_service = create_mcp_service()
+    task_manager = MCPGatewayAgentTaskManager(
+        client_registry=MCPClientRegistry(transport=httpx.ASGITransport(app=mcp_service)),
+        # 模拟的 HTTP 500 不应打开熔断器，否则后续任务不再到达 MCP 服务，各轮结果不可比
+        circuit_breakers=CircuitBreakers(failure_threshold=0),
+    )
+    server = A2AServer(agent_card=def_get_mcp_gateway_agent_card("127.0.0.1", 0), task_manager=task_manager)
+    latencies: List[float] = []
+    outcomes = {"completed": 0, "failed": 0, "protocol_error": 0}
+    peak_rss = [_rss_bytes()]
+    stop_sampling = asyncio.Event()
+
+    await task_manager.on_startup()
+    sampler = asyncio.create_task(_sample_rss(peak_rss, stop_sampling))
+    next_task = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://gateway.local", timeout=60.0) as client:
+        async def worker() -> None:
+            nonlocal next_task
+            while next_task < num_tasks:
+                i = next_task
+                next_task += 1
+                body = _send_body(f"load-{i}", _arguments(i, size, error_ratio))
+                started = time.perf_counter()
+                response = await client.post("/", json=body)
+                latencies.append(time.perf_counter() - started)
+                payload = response.json()
+                state = (payload.get("result") or {}).get("status", {}).get("state")
+                if state in ("completed", "failed"):
+                    outcomes[state] += 1
+                else:
+                    outcomes["protocol_error"] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    stop_sampling.set()
+    await sampler
+    await task_manager.on_shutdown()
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "result_bytes": size,
+        "error_ratio": error_ratio,
+        "tasks": num_tasks,
+        "tasks_per_s": round(num_tasks / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 3),
+            "p50": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(_percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(_percentile(latencies, 0.99) * 1000, 3),
+        },
+        "peak_rss_mb": round(peak_rss[0] / 2**20, 1),
+        "outcomes": outcomes,
+    }
+
+
+async def run(
+    num_tasks: int, concurrency_levels: List[int], sizes: List[int], error_ratios: List[float], max_bytes: Optional[int]
+) -> Dict[str, Any]:
+    runs = []
+    for size in sizes:
+        # 大结果时按总字节数缩减任务数，避免单轮运行时间过长
+        tasks = num_tasks if not max_bytes else max(1, min(num_tasks, max_bytes // max(size, 1)))
+        for error_ratio in error_ratios:
+            for concurrency in concurrency_levels:
+                runs.append(await run_once(tasks, concurrency, size, error_ratio))
+    return {
+        "params": {
+            "tasks": num_tasks,
+            "concurrency": concurrency_levels,
+            "sizes": sizes,
+            "error_ratios": error_ratios,
+            "max_bytes": max_bytes,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "runs": runs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000, help="每种组合执行的任务数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 16384, 1048576], help="MCP 结果的字节数")
+    parser.add_argument("--error-ratios", type=float, nargs="+", default=[0.0, 0.1])
+    parser.add_argument("--max-bytes", type=int, default=512 * 2**20,
+                        help="每轮 MCP 结果的总字节数上限，超过时减少该轮的任务数，0 表示不限制")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.tasks, args.concurrency, args.sizes, args.error_ratios, args.max_bytes or None))
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+单个任务 CPU 热路径的微基准测试，带基线和容差，用于在本地发现性能回退。
+
+覆盖 tasks/send 处理过程中按顺序执行的各步:
+    a2a_validate_json           A2ARequest.validate_json (原始请求体 -> SendTaskRequest)
+    a2a_validate_python         A2ARequest.validate_python (已解析的字典 -> SendTaskRequest)
+    parse_a2a_input             MCPGatewayAgentTaskManager._parse_a2a_input
+    build_mcp_request_body      MCPGatewayAgentTaskManager._build_mcp_request_body
+    mcp_response_validate       mcp_types.JSONRPCResponse.model_validate
+    format_a2a_result           MCPGatewayAgentTaskManager._format_a2a_result_from_mcp_response
+    update_store                InMemoryTaskManager.update_store (每次调用前重置任务，测的是单次写入)
+    send_task_response_dump     SendTaskResponse.model_dump_json (服务端序列化响应)
+每一步都在 small / medium / large 三种负载大小下测量 (分别是 mcp_params 或 MCP 结果中
+字符串的字节数，默认 256 B、64 KB、4 MB)。每个用例先校准迭代次数使一批耗时不少于 --min-time 秒，
+然后所有用例交替运行 --repeat 轮，取每个用例最快一批的单次耗时，尽量排除调度和 GC 带来的噪声。
+另有一个与网关代码无关的参考用例 (reference) 一起交替运行，比较时按它相对基线的快慢修正其他用例，
+抵消机器整体负载或频率的变化。
+
+基线保存在 benchmarks/baselines/hot_path.json，记录了生成它的机器环境。--check 时某个用例
+修正后的单次耗时超过 基线 * (1 + 容差)，且比基线慢 --min-delta-us 微秒以上，即视为回退，
+进程以状态码 1 退出。基线只在同一台机器、同一个 Python 版本上可比；换机器或有意接受新的性能水平时
+用 --update-baseline 重新生成 (只覆盖本次运行的用例)。
+
+用法 (在仓库根目录运行):
+    python -m benchmarks.hot_path --check
+    python -m benchmarks.hot_path --check --tolerance 0.5 --cases parse_a2a_input update_store
+    python -m benchmarks.hot_path --update-baseline
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from vendor.MCP import types as mcp_types
+
+from src.translator.task_manager import MCPGatewayAgentTaskManager
+from src.vendor.A2A.types import A2ARequest, SendTaskRequest, SendTaskResponse, Task, TaskState, TaskStatus
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hot_path.json")
+DEFAULT_TOLERANCE = 0.25
+# 绝对差值低于此值 (微秒) 时不算回退: 几微秒的用例容易被调度抖动放大成很大的比例
+DEFAULT_MIN_DELTA_US = 2.0
+SIZES = {"small": 256, "medium": 64 * 1024, "large": 4 * 2**20}
+MCP_URL = "http://mock-mcp.local/mcp"
+# 参考用例与其他用例交替运行，比较时按它的变化比例修正所有用例
+REFERENCE_CASE = "reference"
+CASE_NAMES = [
+    "a2a_validate_json",
+    "a2a_validate_python",
+    "parse_a2a_input",
+    "build_mcp_request_body",
+    "mcp_response_validate",
+    "format_a2a_result",
+    "update_store",
+    "send_task_response_dump",
+]
+
+Benchmark = Union[Callable[[], Any], Callable[[], Awaitable[Any]]]
+
+
+def _send_body(size: int) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": "bench-request",
+        "method": "tasks/send",
+        "params": {
+            "id": "bench-task",
+            "message": {"role": "user", "parts": [{"type": "data", "data": {
+                "mcp_target_url": MCP_URL,
+                "mcp_method": "tools/call",
+                "mcp_params": {"name": "echo", "arguments": {"text": "x" * size}},
+            }}]},
+        },
+    }
+
+
+def _mcp_response(size: int) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": "bench-request",
+        "result": {"status": "success", "message": "ok", "output": {"content": "x" * size}},
+    }
+
+
+def _cases(manager: MCPGatewayAgentTaskManager, size: int) -> Dict[str, Benchmark]:
+    """一种负载大小下的全部用例。输入在计时之外预先构造好。"""
+    send_body = _send_body(size)
+    send_json = json.dumps(send_body).encode()
+    send_request = SendTaskRequest.model_validate(send_body)
+    mcp_params = send_body["params"]["message"]["parts"][0]["data"]["mcp_params"]
+    mcp_response = _mcp_response(size)
+    status, artifacts = manager._format_a2a_result_from_mcp_response(mcp_response["result"], "bench-request")
+
+    submitted = Task(
+        id="bench-task",
+        sessionId="bench-session",
+        status=TaskStatus(state=TaskState.SUBMITTED),
+        history=[send_request.params.message],
+    )
+    completed = submitted.model_copy(update={"status": status, "artifacts": artifacts})
+
+    async def update_store() -> None:
+        manager.tasks["bench-task"] = submitted
+        await manager.update_store("bench-task", status, artifacts)
+
+    return {
+        "a2a_validate_json": lambda: A2ARequest.validate_json(send_json),
+        "a2a_validate_python": lambda: A2ARequest.validate_python(send_body),
+        "parse_a2a_input": lambda: manager._parse_a2a_input(send_request),
+        "build_mcp_request_body": lambda: manager._build_mcp_request_body("tools/call", mcp_params, "bench-request"),
+        "mcp_response_validate": lambda: mcp_types.JSONRPCResponse.model_validate(mcp_response),
+        "format_a2a_result": lambda: manager._format_a2a_result_from_mcp_response(mcp_response["result"], "bench-request"),
+        "update_store": update_store,
+        "send_task_response_dump": lambda: SendTaskResponse(id="bench-request", result=completed).model_dump_json(exclude_none=True),
+    }
+
+
+_REFERENCE_DOC = {"items": [{"id": i, "name": f"item-{i}", "tags": ["a", "b"], "score": i / 7} for i in range(50)]}
+
+
+def _reference() -> None:
+    """与网关代码无关的固定工作量，用来估计两次运行之间机器整体快慢的变化。"""
+    json.loads(json.dumps(_REFERENCE_DOC))
+    sorted(str(i) for i in range(200))
+
+
+def _timer(loop: asyncio.AbstractEventLoop, fn: Benchmark) -> Callable[[int], float]:
+    """返回 batch(n): 连续调用 fn n 次的耗时 (秒)。协程函数在同一个事件循环中依次 await。"""
+    if asyncio.iscoroutine(probe := fn()):
+        loop.run_until_complete(probe)
+
+        async def run_async(n: int) -> None:
+            for _ in range(n):
+                await fn()
+
+        def batch(n: int) -> float:
+            started = time.perf_counter()
+            loop.run_until_complete(run_async(n))
+            return time.perf_counter() - started
+    else:
+        def batch(n: int) -> float:
+            started = time.perf_counter()
+            for _ in range(n):
+                fn()
+            return time.perf_counter() - started
+    return batch
+
+
+def _calibrate(batch: Callable[[int], float], min_time: float) -> int:
+    """使一批耗时不少于 min_time 秒的迭代次数。"""
+    n = 1
+    while (elapsed := batch(n)) < min_time:
+        n = max(n * 2, int(n * min_time / max(elapsed, 1e-9) * 1.2))
+    return n
+
+
+def run(case_names: List[str], sizes: Dict[str, int], min_time: float, repeat: int) -> Dict[str, Any]:
+    """
+    先为每个用例校准迭代次数，再按轮次交替运行所有用例，每个用例取各轮中最快的一批。
+    交替运行使持续一段时间的干扰 (其他进程、CPU 降频) 分散到不同用例的不同轮次，
+    而不是集中拖慢恰好在那段时间里运行的用例。计时期间关闭 GC (与 timeit 相同)。
+    """
+    loop = asyncio.new_event_loop()
+    manager = MCPGatewayAgentTaskManager()
+    batches: Dict[str, Tuple[Callable[[int], float], int]] = {}
+    best: Dict[str, float] = {}
+    gc_was_enabled = gc.isenabled()
+    try:
+        for size_name, size in sizes.items():
+            cases = _cases(manager, size)
+            for name in case_names:
+                batch = _timer(loop, cases[name])
+                batches[f"{name}/{size_name}"] = (batch, _calibrate(batch, min_time))
+        reference = _timer(loop, _reference)
+        batches[REFERENCE_CASE] = (reference, _calibrate(reference, min_time))
+        gc.collect()
+        gc.disable()
+        for _ in range(repeat):
+            for key, (batch, n) in batches.items():
+                best[key] = min(best.get(key, float("inf")), batch(n) / n)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+        loop.close()
+
+    results = {key: {"iterations": batches[key][1], "us_per_call": round(best[key] * 1e6, 3)} for key in batches}
+    for key, result in results.items():
+        print(f"{key}: {result['us_per_call']} us", file=sys.stderr)
+    return {
+        "params": {"sizes": sizes, "min_time": min_time, "repeat": repeat},
+        "environment": _environment(),
+        "results": results,
+    }
+
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_us: float) -> List[Dict[str, Any]]:
+    """
+    返回每个用例与基线的比较。先用参考用例的耗时之比 (machine_factor) 修正本次结果，
+    修正后的单次耗时超过 基线 * (1 + tolerance) 且比基线慢 min_delta_us 微秒以上时为 regressed。
+    基线中没有的用例标记为 new，不算回退。
+    """
+    current_reference = results["results"].get(REFERENCE_CASE)
+    baseline_reference = baseline["results"].get(REFERENCE_CASE)
+    machine_factor = 1.0
+    if current_reference and baseline_reference:
+        machine_factor = current_reference["us_per_call"] / baseline_reference["us_per_call"]
+
+    comparisons = []
+    for key, current in sorted(results["results"].items()):
+        if key == REFERENCE_CASE:
+            continue
+        expected = baseline["results"].get(key)
+        if expected is None:
+            comparisons.append({"case": key, "status": "new", "us_per_call": current["us_per_call"]})
+            continue
+        adjusted = current["us_per_call"] / machine_factor
+        ratio = adjusted / expected["us_per_call"]
+        regressed = ratio > 1 + tolerance and adjusted - expected["us_per_call"] > min_delta_us
+        comparisons.append({
+            "case": key,
+            "status": "regressed" if regressed else "ok",
+            "us_per_call": current["us_per_call"],
+            "baseline_us_per_call": expected["us_per_call"],
+            "ratio": round(ratio, 3),
+            "machine_factor": round(machine_factor, 3),
+        })
+    return comparisons
+
+
+def _update_baseline(path: str, results: Dict[str, Any], tolerance: Optional[float]) -> None:
+    """只覆盖本次运行过的用例，基线中的其他用例保持不变。"""
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {"results": {}}
+    baseline["results"].update(results["results"])
+    baseline["environment"] = results["environment"]
+    baseline["params"] = {"min_time": results["params"]["min_time"], "repeat": results["params"]["repeat"], "sizes": SIZES}
+    if tolerance is not None or "tolerance" not in baseline:
+        baseline["tolerance"] = tolerance if tolerance is not None else DEFAULT_TOLERANCE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=CASE_NAMES, default=CASE_NAMES,
+                        help="只运行这些用例，默认全部")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="只运行这些负载大小")
+    parser.add_argument("--min-time", type=float, default=0.1, help="每批的最短耗时 (秒)")
+    parser.add_argument("--repeat", type=int, default=7, help="交替运行所有用例的轮数，每个用例取最快一批")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"允许比基线慢的比例，默认使用基线文件中的值 (没有时为 {DEFAULT_TOLERANCE})")
+    parser.add_argument("--min-delta-us", type=float, default=DEFAULT_MIN_DELTA_US,
+                        help="比基线慢不超过这么多微秒时不算回退")
+    parser.add_argument("--check", action="store_true", help="与基线比较，有回退时以状态码 1 退出")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线文件")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.cases, {name: SIZES[name] for name in args.sizes}, args.min_time, args.repeat)
+    exit_code = 0
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+        if baseline.get("environment", {}).get("python") != results["environment"]["python"]:
+            print(f"警告: 基线由 Python {baseline.get('environment', {}).get('python')} 生成，"
+                  f"当前为 {results['environment']['python']}，结果可能不可比", file=sys.stderr)
+        results["comparison"] = compare(results, baseline, tolerance, args.min_delta_us)
+        results["tolerance"] = tolerance
+        regressed = [c for c in results["comparison"] if c["status"] == "regressed"]
+        for c in regressed:
+            print(f"回退: {c['case']} {c['us_per_call']} us，基线 {c['baseline_us_per_call']} us "
+                  f"(修正后 x{c['ratio']}，机器快慢系数 {c['machine_factor']})", file=sys.stderr)
+        exit_code = 1 if regressed else 0
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        _update_baseline(args.baseline, results, args.tolerance)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+InMemoryTaskManager 锁竞争基准测试。
+
+对比两种加锁方式在大量并发任务下的吞吐量:
+  - global:  所有任务共享一把锁，读操作 (tasks/get) 也需要持锁 (旧实现)
+  - striped: 按 task_id 分片的写锁，读操作无锁 (当前实现)
+
+每个模拟任务按 on_send_task 的顺序执行 upsert_task + 3 次 update_store，
+同时有若干轮询者不断调用 on_get_task。--write-latency 模拟在持锁期间发生
+await 的存储写入 (例如持久化存储)，此时全局锁会把所有任务串行化。
+
+用法 (在仓库根目录运行):
+    python -m benchmarks.task_lock_contention --tasks 2000 --pollers 50 --write-latency 0.0005
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict
+
+from src.vendor.A2A.server.task_manager import InMemoryTaskManager
+from src.vendor.A2A.types import (
+    GetTaskRequest,
+    Message,
+    TaskQueryParams,
+    TaskSendParams,
+    TaskState,
+    TaskStatus,
+    TextPart,
+)
+
+from benchmarks._task_manager import StubTaskManager
+
+
+class _BenchTaskManager(StubTaskManager):
+    def __init__(self, lock_stripes: int, write_latency: float):
+        super().__init__(lock_stripes=lock_stripes)
+        self.write_latency = write_latency
+
+    async def update_store(self, task_id, status, artifacts):
+        if self.write_latency:
+            # 模拟持锁期间的一次存储 I/O
+            async with self.task_lock(task_id):
+                await asyncio.sleep(self.write_latency)
+        return await super().update_store(task_id, status, artifacts)
+
+
+class _GlobalLockTaskManager(_BenchTaskManager):
+    """旧实现: 单一全局锁，读也持锁。"""
+
+    def __init__(self, write_latency: float):
+        super().__init__(lock_stripes=1, write_latency=write_latency)
+
+    async def on_get_task(self, request):
+        async with self.task_lock(request.params.id):
+            return await super().on_get_task(request)
+
+
+async def _run_task(manager: InMemoryTaskManager, i: int) -> None:
+    task_id = f"task-{i}"
+    message = Message(role="user", parts=[TextPart(text="bench")])
+    await manager.upsert_task(TaskSendParams(id=task_id, message=message))
+    for state in (TaskState.WORKING, TaskState.WORKING, TaskState.COMPLETED):
+        await manager.update_store(task_id, TaskStatus(state=state), [])
+        await asyncio.sleep(0)  # 模拟阶段之间的下游 I/O
+
+
+async def _run_poller(manager: InMemoryTaskManager, num_tasks: int, stop: asyncio.Event, counter: Dict[str, int]) -> None:
+    i = 0
+    while not stop.is_set():
+        task_id = f"task-{i % num_tasks}"
+        await manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id=task_id, historyLength=1)))
+        counter["polls"] += 1
+        i += 1
+        await asyncio.sleep(0)
+
+
+async def _measure(manager: InMemoryTaskManager, num_tasks: int, num_pollers: int) -> Dict[str, Any]:
+    stop = asyncio.Event()
+    counter = {"polls": 0}
+    pollers = [asyncio.create_task(_run_poller(manager, num_tasks, stop, counter)) for _ in range(num_pollers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_task(manager, i) for i in range(num_tasks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*pollers)
+    return {
+        "elapsed_s": round(elapsed, 4),
+        "tasks_per_s": round(num_tasks / elapsed, 1),
+        "polls_per_s": round(counter["polls"] / elapsed, 1),
+    }
+
+
+async def run(num_tasks: int, num_pollers: int, write_latency: float, stripes: int) -> Dict[str, Any]:
+    results = {
+        "params": {"tasks": num_tasks, "pollers": num_pollers, "write_latency": write_latency, "stripes": stripes},
+        "global": await _measure(_GlobalLockTaskManager(write_latency), num_tasks, num_pollers),
+        "striped": await _measure(_BenchTaskManager(stripes, write_latency), num_tasks, num_pollers),
+    }
+    results["speedup"] = round(results["global"]["elapsed_s"] / results["striped"]["elapsed_s"], 2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--pollers", type=int, default=50)
+    parser.add_argument("--write-latency", type=float, default=0.0, help="持锁期间模拟的存储写入延迟 (秒)")
+    parser.add_argument("--stripes", type=int, default=64)
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.tasks, args.pollers, args.write_latency, args.stripes))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+任务存储拷贝开销基准测试: 测量大型 MCP 结果 artifact 下每次 on_send_task
+与 on_get_task 的内存分配峰值。
+
+对比:
+  - deepcopy: 旧实现，update_store 每次状态变更返回 task.model_copy(deep=True)，
+              并在原对象上就地修改
+  - snapshot: 当前实现，写时复制的不可变快照，读取不做深拷贝
+
+用法 (在仓库根目录运行):
+    python -m benchmarks.task_snapshot_allocations --sizes 1024 1048576 8388608
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import Any, Dict
+from unittest.mock import patch
+
+from src.translator.task_manager import MCPGatewayAgentTaskManager
+from src.vendor.A2A.types import (
+    DataPart,
+    GetTaskRequest,
+    Message,
+    SendTaskRequest,
+    TaskQueryParams,
+    TaskSendParams,
+)
+
+
+class _DeepCopyTaskManager(MCPGatewayAgentTaskManager):
+    """复刻旧版 update_store / append_task_history 的拷贝行为。"""
+
+    async def update_store(self, task_id, status, artifacts):
+        async with self.task_lock(task_id):
+            task = self.tasks[task_id].model_copy(deep=True)
+            task.status = status
+            if status.message is not None:
+                task.history.append(status.message)
+            if artifacts is not None:
+                if task.artifacts is None:
+                    task.artifacts = []
+                task.artifacts.extend(artifacts)
+            self.tasks[task_id] = task
+            return task.model_copy(deep=True)
+
+    def append_task_history(self, task, historyLength):
+        new_task = task.model_copy(deep=True)
+        if historyLength is not None and historyLength > 0:
+            new_task.history = new_task.history[-historyLength:]
+        else:
+            new_task.history = []
+        return new_task
+
+
+def _request(task_id: str) -> SendTaskRequest:
+    payload = {"mcp_target_url": "http://bench-mcp.local", "mcp_method": "resources/read", "mcp_params": {"uri": "bench://blob"}}
+    message = Message(role="user", parts=[DataPart(data=payload)])
+    return SendTaskRequest(params=TaskSendParams(id=task_id, message=message))
+
+
+async def _peak_allocated(coro) -> tuple[int, float]:
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    return peak - before, elapsed
+
+
+async def _measure(manager: MCPGatewayAgentTaskManager, size: int, rounds: int) -> Dict[str, Any]:
+    # 由许多小条目组成的结果 (例如资源列表)，深拷贝开销与条目数成正比
+    item_count = max(1, size // 128)
+
+    async def fake_send_mcp_request(target_url, body, **kwargs):
+        contents = [{"uri": f"bench://item/{i}", "mimeType": "text/plain", "text": "x" * 64} for i in range(item_count)]
+        return {"jsonrpc": "2.0", "id": body["id"], "result": {"contents": contents}}
+
+    send_peaks, get_peaks = [], []
+    with patch("src.translator.task_manager.send_mcp_request", side_effect=fake_send_mcp_request):
+        for i in range(rounds):
+            task_id = f"task-{size}-{i}"
+            send_peaks.append(await _peak_allocated(manager.on_send_task(_request(task_id))))
+            get_request = GetTaskRequest(params=TaskQueryParams(id=task_id, historyLength=10))
+            get_peaks.append(await _peak_allocated(manager.on_get_task(get_request)))
+    return {
+        "on_send_task_peak_bytes": min(p for p, _ in send_peaks),
+        "on_send_task_ms": round(min(t for _, t in send_peaks) * 1000, 3),
+        "on_get_task_peak_bytes": min(p for p, _ in get_peaks),
+        "on_get_task_ms": round(min(t for _, t in get_peaks) * 1000, 3),
+    }
+
+
+async def run(sizes, rounds: int) -> Dict[str, Any]:
+    tracemalloc.start()
+    results: Dict[str, Any] = {}
+    for size in sizes:
+        deep = await _measure(_DeepCopyTaskManager(), size, rounds)
+        snap = await _measure(MCPGatewayAgentTaskManager(), size, rounds)
+        results[str(size)] = {"deepcopy": deep, "snapshot": snap}
+    tracemalloc.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 1024 * 1024, 8 * 1024 * 1024], help="MCP 结果 artifact 的近似 JSON 大小 (字节)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.sizes, args.rounds))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
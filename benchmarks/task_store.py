@@ -0,0 +1,149 @@
+"""
+任务存储后端基准测试: 内存 (InMemoryTaskStore) 与 SQLite WAL (SQLiteTaskStore)。
+
+throughput: 并发执行 --tasks 个模拟任务 (upsert_task + 3 次 update_store，与 on_send_task
+            的写入顺序一致)，同时轮询 on_get_task。SQLite 的计时包含关闭时把剩余批次落盘。
+restart:    预先写入 --stored 个已结束任务，测量打开存储并恢复保留策略记录所需时间，
+            以及重启后第一次 (冷) 和第二次 (热缓存) tasks/get 的延迟。
+            内存存储重启后没有任何任务保留。
+
+用法 (在仓库根目录运行):
+    python -m benchmarks.task_store --tasks 20000 --stored 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict
+
+from src.vendor.A2A.server.retention import RetentionPolicy
+from src.vendor.A2A.server.store import InMemoryTaskStore, SQLiteTaskStore, TaskStore
+from src.vendor.A2A.server.task_manager import InMemoryTaskManager
+from src.vendor.A2A.types import (
+    Artifact,
+    GetTaskRequest,
+    Message,
+    Task,
+    TaskQueryParams,
+    TaskSendParams,
+    TaskState,
+    TaskStatus,
+    TextPart,
+)
+
+from benchmarks._task_manager import StubTaskManager
+
+# 基准中不淘汰任务
+_KEEP_ALL = RetentionPolicy(terminal_ttl=None, max_tasks=None)
+
+
+class _BenchTaskManager(StubTaskManager):
+    def __init__(self, store: TaskStore):
+        super().__init__(retention_policy=_KEEP_ALL, task_store=store)
+
+
+async def _run_task(manager: InMemoryTaskManager, i: int) -> None:
+    task_id = f"task-{i}"
+    await manager.upsert_task(TaskSendParams(id=task_id, message=Message(role="user", parts=[TextPart(text="bench")])))
+    await manager.update_store(task_id, TaskStatus(state=TaskState.WORKING), [])
+    await asyncio.sleep(0)  # 模拟下游 MCP 调用
+    await manager.update_store(task_id, TaskStatus(state=TaskState.WORKING), [])
+    await manager.update_store(
+        task_id, TaskStatus(state=TaskState.COMPLETED), [Artifact(parts=[TextPart(text="result " * 8)])]
+    )
+    await manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id=task_id)))
+
+
+async def _throughput(store: TaskStore, num_tasks: int, concurrency: int = 256) -> Dict[str, Any]:
+    manager = _BenchTaskManager(store)
+    await manager.on_startup()
+    started = time.perf_counter()
+    for offset in range(0, num_tasks, concurrency):
+        await asyncio.gather(*(_run_task(manager, i) for i in range(offset, min(offset + concurrency, num_tasks))))
+    await manager.on_shutdown()
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "tasks_per_s": round(num_tasks / elapsed, 1)}
+
+
+def _populate(path: str, stored: int) -> float:
+    """直接批量写入 stored 个已结束任务 (不经过存储层，仅用于准备数据)。"""
+    template = Task(
+        id="TASK_ID",
+        status=TaskStatus(state=TaskState.COMPLETED),
+        artifacts=[Artifact(parts=[TextPart(text="result " * 8)])],
+        history=[Message(role="user", parts=[TextPart(text="bench")])],
+    ).model_dump_json(exclude_none=True)
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, state TEXT NOT NULL, body TEXT NOT NULL) WITHOUT ROWID")
+    batch = 50_000
+    for offset in range(0, stored, batch):
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR REPLACE INTO tasks (id, state, body) VALUES (?, ?, ?)",
+            ((f"stored-{i}", "completed", template.replace("TASK_ID", f"stored-{i}")) for i in range(offset, min(offset + batch, stored))),
+        )
+        conn.execute("COMMIT")
+    conn.close()
+    return time.perf_counter() - started
+
+
+async def _restart(path: str, stored: int) -> Dict[str, Any]:
+    manager = _BenchTaskManager(SQLiteTaskStore(path))
+    started = time.perf_counter()
+    await manager.on_startup()
+    restart_s = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(2):
+        started = time.perf_counter()
+        response = await manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id=f"stored-{stored // 2}")))
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.result is not None
+    tasks_after_restart = len(manager.tasks)
+    await manager.on_shutdown()
+    return {
+        "restart_s": round(restart_s, 3),
+        "tasks_after_restart": tasks_after_restart,
+        "cold_get_ms": round(latencies[0], 3),
+        "hot_get_ms": round(latencies[1], 3),
+    }
+
+
+async def run(num_tasks: int, stored: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        results: Dict[str, Any] = {"params": {"tasks": num_tasks, "stored": stored}}
+        results["throughput"] = {
+            "memory": await _throughput(InMemoryTaskStore(), num_tasks),
+            "sqlite": await _throughput(SQLiteTaskStore(os.path.join(tmp, "throughput.db")), num_tasks),
+        }
+
+        restart_db = os.path.join(tmp, "restart.db")
+        populate_s = _populate(restart_db, stored)
+        results["restart"] = {
+            "memory": {"restart_s": 0.0, "tasks_after_restart": 0},
+            "sqlite": {"populate_s": round(populate_s, 1), **await _restart(restart_db, stored)},
+        }
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=20_000)
+    parser.add_argument("--stored", type=int, default=1_000_000)
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.tasks, args.stored))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+多 worker 吞吐量基准测试。
+
+依次以 1/2/4/8 个 worker 启动网关 (python -m src.translator --workers N)，
+下游是一个本地的模拟 MCP 服务 (多进程 uvicorn，不成为瓶颈)。
+若干负载进程在固定时长内循环执行: tasks/send 一个新任务，再 tasks/get 同一个任务。
+由于连接由内核分配给任意 worker，大部分 tasks/get 会落在非所属 worker 上并经 IPC 转发；
+"get_misses" 统计找不到任务的次数，用于验证任务 ID 亲和性 (应为 0)。
+
+用法 (在仓库根目录运行):
+    python -m benchmarks.worker_scaling --workers 1 2 4 8 --duration 10 --clients 4 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+
+async def mock_mcp_app(scope, receive, send):
+    """最小化的 ASGI MCP 服务: 对任意 JSON-RPC 请求返回一个小的 result。"""
+    if scope["type"] != "http":
+        return
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    request = json.loads(body) if body else {}
+    payload = json.dumps({
+        "jsonrpc": "2.0",
+        "id": request.get("id"),
+        "result": {"content": [{"type": "text", "text": "ok"}]},
+    }).encode()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([str(_ROOT), str(_ROOT / "src"), env.get("PYTHONPATH", "")])
+    env["LOG_LEVEL"] = "WARNING"
+    return env
+
+
+def _start(args: List[str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=_ROOT, env=_env(),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _stop(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _send_request(task_id: str, mcp_url: str) -> Dict[str, Any]:
+    return {
+        "jsonrpc": "2.0",
+        "id": task_id,
+        "method": "tasks/send",
+        "params": {
+            "id": task_id,
+            "message": {"role": "user", "parts": [{"type": "data", "data": {
+                "mcp_target_url": mcp_url,
+                "mcp_method": "tools/call",
+                "mcp_params": {"name": "echo", "arguments": {}},
+            }}]},
+        },
+    }
+
+
+async def _client_loop(gateway_url: str, mcp_url: str, duration: float, concurrency: int) -> Dict[str, int]:
+    counts = {"requests": 0, "errors": 0, "get_misses": 0}
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=gateway_url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            while time.monotonic() < deadline:
+                task_id = uuid.uuid4().hex
+                try:
+                    sent = await client.post("/", json=_send_request(task_id, mcp_url))
+                    got = await client.post("/", json={"jsonrpc": "2.0", "id": 1, "method": "tasks/get", "params": {"id": task_id}})
+                    counts["requests"] += 2
+                    if sent.status_code != 200 or "error" in sent.json():
+                        counts["errors"] += 1
+                    if "error" in got.json():
+                        counts["get_misses"] += 1
+                except httpx.HTTPError:
+                    counts["errors"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return counts
+
+
+def _run_client(gateway_url: str, mcp_url: str, duration: float, concurrency: int, results) -> None:
+    results.put(asyncio.run(_client_loop(gateway_url, mcp_url, duration, concurrency)))
+
+
+def measure(workers: int, mcp_url: str, duration: float, clients: int, concurrency: int) -> Dict[str, Any]:
+    port = _free_port()
+    gateway_url = f"http://127.0.0.1:{port}"
+    gateway = _start(["-m", "src.translator", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)])
+    try:
+        _wait_ready(f"{gateway_url}/.well-known/agent.json")
+        results = multiprocessing.Queue()
+        loaders = [
+            multiprocessing.Process(target=_run_client, args=(gateway_url, mcp_url, duration, concurrency, results))
+            for _ in range(clients)
+        ]
+        started = time.perf_counter()
+        for loader in loaders:
+            loader.start()
+        totals = {"requests": 0, "errors": 0, "get_misses": 0}
+        for _ in loaders:
+            for key, value in results.get().items():
+                totals[key] += value
+        for loader in loaders:
+            loader.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        _stop(gateway)
+    return {"workers": workers, **totals, "requests_per_s": round(totals["requests"] / elapsed, 1)}
+
+
+def run(worker_counts: List[int], duration: float, clients: int, concurrency: int) -> Dict[str, Any]:
+    mcp_port = _free_port()
+    mcp_service = _start(["-m", "uvicorn", "benchmarks.worker_scaling:mock_mcp_app", "--host", "127.0.0.1",
+                          "--port", str(mcp_port), "--workers", "4", "--log-level", "warning"])
+    try:
+        _wait_ready(f"http://127.0.0.1:{mcp_port}/")
+        mcp_url = f"http://127.0.0.1:{mcp_port}/mcp"
+        runs = [measure(n, mcp_url, duration, clients, concurrency) for n in worker_counts]
+    finally:
+        _stop(mcp_service)
+
+    baseline = runs[0]["requests_per_s"] or 1
+    for result in runs:
+        result["scaling"] = round(result["requests_per_s"] / baseline, 2)
+    return {
+        "params": {"duration": duration, "clients": clients, "concurrency": concurrency, "cpus": os.cpu_count()},
+        "runs": runs,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=10.0, help="每个配置的负载时长 (秒)")
+    parser.add_argument("--clients", type=int, default=4, help="负载进程数")
+    parser.add_argument("--concurrency", type=int, default=32, help="每个负载进程的并发请求数")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.workers, args.duration, args.clients, args.concurrency)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,113 @@
 #!/usr/bin/env python
-import uvicorn
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+"""
+模拟 MCP 服务，用于 A2A-to-MCP Adapter 演示 (examples/run_demo.sh) 和负载基准测试 (benchmarks/gateway_load.py)。
+
+支持的方法:
+    tools/call      成功返回模拟结果。arguments 中可以控制响应:
+                        size: 结果中 content 文本的字节数
+                        delay_ms: 返回前等待的毫秒数
+                        fail: "jsonrpc" 返回 JSON-RPC 错误 (-32603)，"http" 返回 HTTP 500
+    tools/list      返回一个 echo 工具
+    其他方法        返回 JSON-RPC 错误 -32601 (Method not found)
+请求体也可以是 JSON-RPC 批量数组，响应为对应的数组。
+
+create_app() 返回 ASGI 应用，基准测试在进程内通过 httpx.ASGITransport 调用它，不经过网络。
+"""
+import argparse
+import asyncio
 import json
 
-app = FastAPI(
-    title="模拟 MCP 服务",
-    description="一个简单的 FastAPI 应用，用于模拟响应 MCP 请求，主要用于 A2A-to-MCP Adapter 演示。",
-    version="0.1.0",
-)
-
-@app.post("/mcp")
-async def handle_mcp_request(request: Request):
-    """处理发送到 /mcp 的 POST 请求，模拟 MCP 服务行为"""
-    request_id = "unknown" # Default if parsing fails or ID is missing
-    try:
-        body = await request.json()
-        print("--- 模拟 MCP 服务收到请求 ---")
-        print(json.dumps(body, indent=2, ensure_ascii=False))
-        print("--------------------------")
-
-        # 尝试获取 JSON-RPC 请求 ID 和方法
-        request_id = body.get('id')
-        method = body.get('method')
-        params = body.get('params')
-
-        if method == "tools/call":
-            # 模拟成功的响应
-            response_payload = {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "status": "success",
-                    "message": "模拟工具调用成功！",
-                    "output": {
-                        "content": f"这是对方法 '{method}' 和参数 {params} 的模拟响应。"
-                    }
-                }
-            }
-            print("--- 模拟 MCP 服务发送成功响应 ---")
-            print(json.dumps(response_payload, indent=2, ensure_ascii=False))
-            print("-----------------------------")
-            return JSONResponse(content=response_payload)
-        else:
-            # 模拟方法未找到的错误
-            error_payload = {
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "error": {
-                    "code": -32601,
-                    "message": "Method not found",
-                    "data": f"方法 '{method}' 在此模拟服务中未实现。"
-                }
-            }
-            print("--- 模拟 MCP 服务发送错误响应 (Method Not Found) ---")
-            print(json.dumps(error_payload, indent=2, ensure_ascii=False))
-            print("---------------------------------------------------")
-            # 根据 JSON-RPC 规范，即使是错误响应，HTTP 状态码通常也是 200
-            # 但如果需要，也可以返回 400 或 500 系列错误
-            return JSONResponse(content=error_payload)
-
-    except json.JSONDecodeError:
-        print("错误：无法解析请求体为 JSON")
-        # 返回 JSON-RPC 解析错误
-        error_payload = {
-            "jsonrpc": "2.0",
-            "id": None, # ID 未知，因为无法解析请求
-            "error": {
-                "code": -32700,
-                "message": "Parse error",
-                "data": "无法将请求体解析为有效的 JSON。"
-            }
-        }
-        # 对于解析错误，返回 400 Bad Request 可能更合适
-        return JSONResponse(content=error_payload, status_code=400)
-    except Exception as e:
-        print(f"处理请求时发生意外错误: {e}")
-        # 返回内部错误
-        error_payload = {
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+def _error(request_id, code: int, message: str, data=None) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message, "data": data}}
+
+
+class _HTTPFailure(Exception):
+    """tools/call 的 arguments.fail == "http" 时整个请求以 HTTP 500 失败。"""
+
+
+async def _handle_one(body: dict) -> dict:
+    request_id = body.get("id")
+    method = body.get("method")
+    params = body.get("params") or {}
+
+    if method == "tools/list":
+        return {"jsonrpc": "2.0", "id": request_id, "result": {"tools": [{"name": "echo", "inputSchema": {"type": "object"}}]}}
+
+    if method == "tools/call":
+        arguments = params.get("arguments") or {}
+        if arguments.get("delay_ms"):
+            await asyncio.sleep(arguments["delay_ms"] / 1000)
+        if arguments.get("fail") == "http":
+            raise _HTTPFailure()
+        if arguments.get("fail") == "jsonrpc":
+            return _error(request_id, -32603, "Internal error", f"工具 '{params.get('name')}' 模拟执行失败。")
+        size = arguments.get("size")
+        content = "x" * size if isinstance(size, int) else f"这是对方法 '{method}' 和参数 {params} 的模拟响应。"
+        return {
             "jsonrpc": "2.0",
-            "id": request_id, # 尝试使用之前获取的 ID
-            "error": {
-                "code": -32603,
-                "message": "Internal error",
-                "data": f"处理请求时发生服务器内部错误: {str(e)}"
-            }
+            "id": request_id,
+            "result": {
+                "status": "success",
+                "message": "模拟工具调用成功！",
+                "output": {"content": content},
+            },
         }
-        # 对于内部错误，返回 500 Internal Server Error
-        return JSONResponse(content=error_payload, status_code=500)
+
+    # 模拟方法未找到的错误 (根据 JSON-RPC 规范，错误响应的 HTTP 状态码通常也是 200)
+    return _error(request_id, -32601, "Method not found", f"方法 '{method}' 在此模拟服务中未实现。")
+
+
+def create_app(verbose: bool = False) -> Starlette:
+    """创建模拟 MCP 服务的 ASGI 应用。verbose 为 True 时打印每个请求和响应 (演示用)。"""
+
+    def log(title: str, payload) -> None:
+        if verbose:
+            print(f"--- {title} ---")
+            print(json.dumps(payload, indent=2, ensure_ascii=False))
+
+    async def handle_mcp_request(request: Request) -> Response:
+        """处理发送到 /mcp 的 POST 请求，模拟 MCP 服务行为"""
+        try:
+            body = json.loads(await request.body())
+        except json.JSONDecodeError:
+            # 无法解析请求体，返回 JSON-RPC 解析错误
+            return JSONResponse(_error(None, -32700, "Parse error", "无法将请求体解析为有效的 JSON。"), status_code=400)
+
+        log("模拟 MCP 服务收到请求", body)
+        try:
+            if isinstance(body, list):
+                response_payload = [await _handle_one(item) for item in body]
+            else:
+                response_payload = await _handle_one(body)
+        except _HTTPFailure:
+            return JSONResponse(_error(None, -32603, "Internal error", "模拟的 HTTP 500 错误。"), status_code=500)
+        except Exception as e:
+            request_id = body.get("id") if isinstance(body, dict) else None
+            return JSONResponse(_error(request_id, -32603, "Internal error", f"处理请求时发生服务器内部错误: {e}"), status_code=500)
+
+        log("模拟 MCP 服务发送响应", response_payload)
+        return JSONResponse(response_payload)
+
+    return Starlette(routes=[Route("/mcp", handle_mcp_request, methods=["POST"])])
+
+
+app = create_app(verbose=True)
+
 
 if __name__ == "__main__":
-    print("启动模拟 MCP 服务，监听 http://localhost:8001")
-    # 运行 uvicorn 服务器
-    # host="0.0.0.0" 表示监听所有可用网络接口，方便从容器或其他机器访问
-    # 如果只需要本机访问，可以使用 host="127.0.0.1" 或 host="localhost"
-    # reload=True 在开发时很有用，代码更改时会自动重启服务，但在 run_demo.sh 中可能不需要
-    uvicorn.run("service:app", host="127.0.0.1", port=8001, log_level="info") 
\ No newline at end of file
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="模拟 MCP 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--quiet", action="store_true", help="不打印请求和响应")
+    args = parser.parse_args()
+
+    print(f"启动模拟 MCP 服务，监听 http://{args.host}:{args.port}")
+    uvicorn.run(create_app(verbose=not args.quiet), host=args.host, port=args.port, log_level="info")
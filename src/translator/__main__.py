@@ -1,13 +1,27 @@
 import os
 import click
 import logging
+from typing import Optional
 
 from dotenv import load_dotenv
 
 from vendor.A2A.server import A2AServer
+from src.vendor.A2A.server.retention import RetentionPolicy
+from src.vendor.A2A.server.sse import OverflowPolicy
+from src.vendor.A2A.server.push import PushNotificationSender
+from src.vendor.A2A.server.metrics import MetricsRegistry
+from src.vendor.A2A.server.tracing import FileSpanExporter, Tracer
+from src.vendor.A2A.server.profiler import SamplingProfiler
+from src.vendor.A2A.server.store import SQLiteTaskStore
 from vendor.A2A.types import AgentCard, AgentCapabilities, AgentSkill
 from .task_manager import MCPGatewayAgentTaskManager
+from .admission import AdmissionController
+from .mcp_batching import MCPBatchDispatcher
+from .resilience import CircuitBreakers, HedgePolicy, LatencyTracker, RetryBudget
+from .mcp_cache import MCPResponseCache
+from .mcp_client import MCPClientPoolConfig, MCPClientRegistry
 from .agent_card import def_get_mcp_gateway_agent_card
+from .workers import serve_workers
 
 load_dotenv()
 
@@ -17,25 +31,138 @@ logger = logging.getLogger(__name__)
 @click.command()
 @click.option("--host", default=os.getenv("MCP_GATEWAY_HOST", "0.0.0.0"), help="Agent 服务监听的主机地址。")
 @click.option("--port", type=int, default=int(os.getenv("MCP_GATEWAY_PORT", "8080")), help="Agent 服务监听的端口。")
-def main(host: str, port: int):
+@click.option("--mcp-max-connections", type=int, default=int(os.getenv("MCP_GATEWAY_MAX_CONNECTIONS", "100")), help="每个 MCP 目标的最大并发连接数。")
+@click.option("--mcp-max-keepalive", type=int, default=int(os.getenv("MCP_GATEWAY_MAX_KEEPALIVE", "20")), help="每个 MCP 目标保留的最大空闲 keep-alive 连接数。")
+@click.option("--mcp-keepalive-expiry", type=float, default=float(os.getenv("MCP_GATEWAY_KEEPALIVE_EXPIRY", "30")), help="空闲 keep-alive 连接的保留时间（秒）。")
+@click.option("--mcp-http2/--no-mcp-http2", default=os.getenv("MCP_GATEWAY_HTTP2", "false").lower() == "true", help="对 MCP 目标启用 HTTP/2。")
+@click.option("--task-ttl", type=float, default=os.getenv("MCP_GATEWAY_TASK_TTL"), help="已结束任务 (COMPLETED/FAILED/CANCELED) 的保留时间（秒），0 表示不按时间淘汰。默认 memory 存储为 3600，sqlite 存储不淘汰。")
+@click.option("--max-tasks", type=int, default=os.getenv("MCP_GATEWAY_MAX_TASKS"), help="任务存储的最大条目数 (LRU 淘汰已结束任务)，0 表示不限制。默认 memory 存储为 100000，sqlite 存储不限制。")
+@click.option("--max-task-bytes", type=int, default=int(os.getenv("MCP_GATEWAY_MAX_TASK_BYTES", "0")), help="任务存储的近似字节预算，0 表示不限制。")
+@click.option("--replay-buffer-size", type=int, default=int(os.getenv("MCP_GATEWAY_REPLAY_BUFFER_SIZE", "64")), help="每个流式任务为 tasks/resubscribe 保留的最近事件数。")
+@click.option("--replay-grace", type=float, default=float(os.getenv("MCP_GATEWAY_REPLAY_GRACE", "60")), help="任务结束后回放缓冲区的保留时间（秒）。")
+@click.option("--sse-queue-size", type=int, default=int(os.getenv("MCP_GATEWAY_SSE_QUEUE_SIZE", "256")), help="每个 SSE 订阅者队列的最大事件数。")
+@click.option("--sse-overflow", type=click.Choice([p.value for p in OverflowPolicy]), default=os.getenv("MCP_GATEWAY_SSE_OVERFLOW", OverflowPolicy.COALESCE.value), help="SSE 订阅者队列满时的处理策略。")
+@click.option("--task-store", type=click.Choice(["memory", "sqlite"]), default=os.getenv("MCP_GATEWAY_TASK_STORE", "memory"), help="任务存储后端。sqlite 将任务持久化到 --task-db，重启后仍可查询。")
+@click.option("--task-db", default=os.getenv("MCP_GATEWAY_TASK_DB", "tasks.db"), help="SQLite 任务数据库路径 (多 worker 时每个 worker 使用 <路径>.<序号>)。")
+@click.option("--mcp-cache-size", type=int, default=int(os.getenv("MCP_GATEWAY_CACHE_SIZE", "1024")), help="只读 MCP 方法 (tools/list、resources/read 等) 响应缓存的最大条目数，0 表示禁用缓存。")
+@click.option("--mcp-cache-ttl", type=float, default=float(os.getenv("MCP_GATEWAY_CACHE_TTL", "10")), help="MCP 响应缓存条目的有效期（秒）。带外的变更通知收不到，这是缓存结果过期的上界。")
+@click.option("--mcp-batch-window", type=float, default=float(os.getenv("MCP_GATEWAY_BATCH_WINDOW", "0")), help="微批处理: 收集发往同一 MCP 目标的并发调用的时间窗口（秒），0 表示不合并。")
+@click.option("--mcp-batch-size", type=int, default=int(os.getenv("MCP_GATEWAY_BATCH_SIZE", "32")), help="微批处理: 每个 JSON-RPC 批量请求的最大调用数。")
+@click.option("--mcp-max-in-flight", type=int, default=int(os.getenv("MCP_GATEWAY_MAX_IN_FLIGHT", "0")), help="每个 MCP 目标的最大并发调用数，超出的调用按会话轮转排队，0 表示不限制。")
+@click.option("--mcp-queue-size", type=int, default=int(os.getenv("MCP_GATEWAY_QUEUE_SIZE", "1000")), help="每个 MCP 目标等待队列的最大长度，队列满时任务立即失败。")
+@click.option("--mcp-queue-timeout", type=float, default=float(os.getenv("MCP_GATEWAY_QUEUE_TIMEOUT", "30")), help="在等待队列中等待调用名额的最长时间（秒），超时任务失败。")
+@click.option("--mcp-breaker-failures", type=int, default=int(os.getenv("MCP_GATEWAY_BREAKER_FAILURES", "5")), help="打开 MCP 目标熔断器所需的连续失败次数，0 表示禁用熔断。")
+@click.option("--mcp-breaker-reset", type=float, default=float(os.getenv("MCP_GATEWAY_BREAKER_RESET", "30")), help="熔断器打开后多少秒放行一个探测调用。")
+@click.option("--mcp-connect-timeout", type=float, default=float(os.getenv("MCP_GATEWAY_CONNECT_TIMEOUT", "5")), help="连接 MCP 目标的超时（秒）。")
+@click.option("--mcp-timeout-min", type=float, default=float(os.getenv("MCP_GATEWAY_TIMEOUT_MIN", "1")), help="自适应读超时的下限（秒）。")
+@click.option("--mcp-timeout-max", type=float, default=float(os.getenv("MCP_GATEWAY_TIMEOUT_MAX", "30")), help="自适应读超时的上限（秒），也是样本不足时使用的读超时。")
+@click.option("--mcp-hedging/--no-mcp-hedging", default=os.getenv("MCP_GATEWAY_HEDGING", "false").lower() == "true", help="幂等调用超过目标的 p95 耗时仍未完成时，向副本 (或同一目标) 发出对冲请求。")
+@click.option("--mcp-retries", type=int, default=int(os.getenv("MCP_GATEWAY_RETRIES", "0")), help="幂等调用遇到连接错误或 5xx 时的最大重试次数 (带抖动的指数退避)，0 表示不重试。")
+@click.option("--mcp-retry-budget", type=float, default=float(os.getenv("MCP_GATEWAY_RETRY_BUDGET", "0.1")), help="重试和对冲请求数占请求总数的最大比例。")
+@click.option("--mcp-replica", "mcp_replicas", multiple=True, default=os.getenv("MCP_GATEWAY_REPLICAS", "").split(), help="MCP 目标的可互换副本，格式为 PRIMARY_URL=REPLICA_URL，可重复指定；重试和对冲会轮流使用副本。")
+@click.option("--async-tasks/--no-async-tasks", default=os.getenv("MCP_GATEWAY_ASYNC_TASKS", "false").lower() == "true", help="tasks/send 立即返回已提交的任务，MCP 调用在后台执行 (通过 tasks/get 查询结果)。")
+@click.option("--push-notifications/--no-push-notifications", default=os.getenv("MCP_GATEWAY_PUSH_NOTIFICATIONS", "false").lower() == "true", help="将任务状态和产物事件推送到客户端注册的 webhook (默认关闭)。")
+@click.option("--push-allow-host", "push_allow_hosts", multiple=True, default=os.getenv("MCP_GATEWAY_PUSH_ALLOW_HOSTS", "").split(), help="推送通知: 即使解析到回环、链路本地或内网地址也允许的 webhook 主机名，可重复指定；其他主机只能解析到公网地址。")
+@click.option("--push-batch-window", type=float, default=float(os.getenv("MCP_GATEWAY_PUSH_BATCH_WINDOW", "0.05")), help="推送通知: 合并发往同一 webhook 的事件的时间窗口（秒）。")
+@click.option("--push-retries", type=int, default=int(os.getenv("MCP_GATEWAY_PUSH_RETRIES", "5")), help="推送通知: 连接错误、429 和 5xx 的最大重试次数。")
+@click.option("--push-queue-size", type=int, default=int(os.getenv("MCP_GATEWAY_PUSH_QUEUE_SIZE", "1000")), help="推送通知: 每个 webhook 的最大待发送事件数。")
+@click.option("--metrics/--no-metrics", default=os.getenv("MCP_GATEWAY_METRICS", "true").lower() == "true", help="在 /metrics 以 Prometheus 文本格式提供请求、MCP 上游调用和任务的指标。")
+@click.option("--trace-sample-rate", type=float, default=float(os.getenv("MCP_GATEWAY_TRACE_SAMPLE_RATE", "0")), help="记录阶段追踪 span 的请求比例 (0-1)，0 表示关闭；带 traceparent 的请求遵循调用方的采样决定。")
+@click.option("--trace-file", default=os.getenv("MCP_GATEWAY_TRACE_FILE", "traces.jsonl"), help="追踪 span 写入的 JSON Lines 文件 (多 worker 时追加 worker 序号)。")
+@click.option("--admin-token", default=os.getenv("MCP_GATEWAY_ADMIN_TOKEN"), help="管理接口的 Bearer 令牌。设置后启用 POST /admin/profile 按需采样分析；不设置时不提供该接口。")
+@click.option("--profile-dir", default=os.getenv("MCP_GATEWAY_PROFILE_DIR", "profiles"), help="采样分析结果 (collapsed stack 格式) 的输出目录。")
+@click.option("--profile-signal-seconds", type=float, default=float(os.getenv("MCP_GATEWAY_PROFILE_SIGNAL_SECONDS", "30")), help="收到 SIGUSR2 时采样分析的时长（秒），0 表示不响应该信号。")
+@click.option("--profile-interval", type=float, default=float(os.getenv("MCP_GATEWAY_PROFILE_INTERVAL", "0.005")), help="采样分析时两次采样之间的 CPU 时间（秒）。")
+@click.option("--workers", type=int, default=int(os.getenv("MCP_GATEWAY_WORKERS", "1")), help="worker 进程数。大于 1 时按任务 ID 分区，非所属 worker 收到的请求经本机 IPC 转发。")
+def main(host: str, port: int, mcp_max_connections: int, mcp_max_keepalive: int, mcp_keepalive_expiry: float, mcp_http2: bool,
+         task_ttl: Optional[float], max_tasks: Optional[int], max_task_bytes: int, replay_buffer_size: int, replay_grace: float,
+         sse_queue_size: int, sse_overflow: str, task_store: str, task_db: str, mcp_cache_size: int, mcp_cache_ttl: float,
+         mcp_batch_window: float, mcp_batch_size: int, mcp_max_in_flight: int, mcp_queue_size: int, mcp_queue_timeout: float,
+         mcp_breaker_failures: int, mcp_breaker_reset: float, mcp_connect_timeout: float, mcp_timeout_min: float, mcp_timeout_max: float,
+         mcp_hedging: bool, mcp_retries: int, mcp_retry_budget: float, mcp_replicas: tuple, async_tasks: bool,
+         push_notifications: bool, push_allow_hosts: tuple, push_batch_window: float, push_retries: int, push_queue_size: int, metrics: bool,
+         trace_sample_rate: float, trace_file: str, admin_token: Optional[str], profile_dir: str, profile_signal_seconds: float,
+         profile_interval: float, workers: int):
     """启动 MCPGatewayAgent 服务器。"""
     logger.info(f"MCPGatewayAgent 准备启动于 http://{host}:{port}")
 
-    agent_card_instance = def_get_mcp_gateway_agent_card(host=host, port=port)
+    agent_card_instance = def_get_mcp_gateway_agent_card(host=host, port=port, push_notifications=push_notifications)
 
-    task_manager_instance = MCPGatewayAgentTaskManager()
-
-    server = A2AServer(
-        agent_card=agent_card_instance,
-        task_manager=task_manager_instance,
-        host=host,
-        port=port,
+    # 默认上限只是为了限制内存存储的内存占用；持久化的 sqlite 存储默认保留所有任务，不从数据库中删除
+    default_ttl, default_max_tasks = (0, 0) if task_store == "sqlite" else (3600.0, 100_000)
+    retention_policy = RetentionPolicy(
+        terminal_ttl=(default_ttl if task_ttl is None else task_ttl) or None,
+        max_tasks=(default_max_tasks if max_tasks is None else max_tasks) or None,
+        max_bytes=max_task_bytes or None,
     )
 
-    logger.info(f"启动服务器于 http://{host}:{port}")
+    replicas = {}
+    for replica_spec in mcp_replicas:
+        primary_url, sep, replica_url = replica_spec.partition("=")
+        if not sep or not primary_url or not replica_url:
+            raise click.BadParameter(f"应为 PRIMARY_URL=REPLICA_URL: {replica_spec}", param_hint="--mcp-replica")
+        replicas.setdefault(primary_url, []).append(replica_url)
+
+    def build_server(task_router=None) -> A2AServer:
+        # 多进程模式下每个 worker 在自己的进程中调用一次，各自拥有连接池和任务存储
+        client_registry = MCPClientRegistry(
+            MCPClientPoolConfig(
+                max_connections=mcp_max_connections,
+                max_keepalive_connections=mcp_max_keepalive,
+                keepalive_expiry=mcp_keepalive_expiry,
+                http2=mcp_http2,
+            )
+        )
+        store = None
+        if task_store == "sqlite":
+            # 每个 worker 只保存自己分区的任务，使用各自的数据库文件；重启时需保持相同的 worker 数
+            store = SQLiteTaskStore(task_db if task_router is None else f"{task_db}.{task_router.worker_index}")
+        task_manager_instance = MCPGatewayAgentTaskManager(
+            client_registry=client_registry,
+            response_cache=MCPResponseCache(max_entries=mcp_cache_size, ttl=mcp_cache_ttl),
+            admission=AdmissionController(max_in_flight=mcp_max_in_flight, max_queue=mcp_queue_size, queue_timeout=mcp_queue_timeout),
+            circuit_breakers=CircuitBreakers(failure_threshold=mcp_breaker_failures, reset_timeout=mcp_breaker_reset),
+            latency_tracker=LatencyTracker(min_timeout=mcp_timeout_min, max_timeout=mcp_timeout_max, connect_timeout=mcp_connect_timeout),
+            hedge_policy=HedgePolicy(
+                hedge=mcp_hedging, max_retries=mcp_retries, budget=RetryBudget(ratio=mcp_retry_budget), replicas=replicas
+            ) if mcp_hedging or mcp_retries > 0 else None,
+            async_execution=async_tasks,
+            batch_dispatcher=MCPBatchDispatcher(window=mcp_batch_window, max_batch_size=mcp_batch_size) if mcp_batch_window > 0 else None,
+            task_store=store,
+            push_sender=PushNotificationSender(
+                batch_window=push_batch_window, max_retries=push_retries, max_queue=push_queue_size,
+                allowed_hosts=push_allow_hosts,
+            ) if push_notifications else None,
+            retention_policy=retention_policy,
+            replay_buffer_size=replay_buffer_size,
+            replay_grace=replay_grace,
+            sse_queue_size=sse_queue_size,
+            sse_overflow=OverflowPolicy(sse_overflow),
+        )
+        return A2AServer(
+            agent_card=agent_card_instance,
+            task_manager=task_manager_instance,
+            host=host,
+            port=port,
+            task_router=task_router,
+            # 多进程模式下每个 worker 有自己的指标，抓取到的是接受该连接的 worker，用 worker 标签区分
+            metrics=MetricsRegistry(const_labels={"worker": str(task_router.worker_index)}) if task_router is not None else None,
+            metrics_path="/metrics" if metrics else None,
+            tracer=Tracer(
+                sample_rate=trace_sample_rate,
+                exporter=FileSpanExporter(trace_file if task_router is None else f"{trace_file}.{task_router.worker_index}"),
+            ) if trace_sample_rate > 0 else None,
+            # 未在采样时不安装任何钩子，可以在生产环境常开；多 worker 时各 worker 分别采样自己的进程
+            profiler=SamplingProfiler(
+                output_dir=profile_dir, interval=profile_interval, signal_duration=profile_signal_seconds
+            ) if admin_token or profile_signal_seconds > 0 else None,
+            admin_token=admin_token,
+        )
+
+    logger.info(f"启动服务器于 http://{host}:{port} ({workers} 个 worker)")
     logger.info(f"A2A Agent Card URL: http://{host}:{port}/")
     try:
-        server.start()
+        serve_workers(build_server, host, port, workers, log_level=os.getenv("LOG_LEVEL", "INFO").lower())
     except Exception as e:
         logger.error(f"服务器启动失败: {e}", exc_info=True)
 
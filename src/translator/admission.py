@@ -0,0 +1,162 @@
+"""
+按 MCP 目标的准入控制: 并发上限、有界等待队列和按会话轮转的公平调度。
+
+每个 mcp_target_url 最多同时进行 max_in_flight 个调用，其余调用进入该目标的等待队列。
+等待队列按 sessionId 分组，空出的名额在会话之间轮转分配，
+因此一个发出大量任务的会话不会让其他会话一直等待。
+队列已满时立即拒绝，等待超过 queue_timeout 时放弃；两种情况都抛出 AdmissionError，
+由任务管理器转换为任务失败。
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Dict, Optional
+
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_QUEUE_TIMEOUT = 30.0
+
+
+class AdmissionError(Exception):
+    """调用未被准入 (等待队列已满或等待超时)。"""
+
+
+class QueueFullError(AdmissionError):
+    pass
+
+
+class QueueTimeoutError(AdmissionError):
+    pass
+
+
+@dataclass
+class TargetAdmissionStats:
+    admitted: int = 0
+    queued: int = 0  # 曾进入等待队列的调用数
+    rejected: int = 0
+    timed_out: int = 0
+    wait_time_total: float = 0.0
+    wait_time_max: float = 0.0
+
+    def record_wait(self, waited: float) -> None:
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+
+
+@dataclass
+class _TargetState:
+    in_flight: int = 0
+    # sessionId -> 该会话等待中的调用；OrderedDict 的顺序就是轮转顺序
+    waiters: "OrderedDict[Optional[str], Deque[asyncio.Future]]" = field(default_factory=OrderedDict)
+    depth: int = 0
+    stats: TargetAdmissionStats = field(default_factory=TargetAdmissionStats)
+
+
+class AdmissionController:
+    """
+    Args:
+        max_in_flight: 每个目标的最大并发调用数，0 表示不限制 (不排队)
+        max_queue: 每个目标等待队列的最大长度
+        queue_timeout: 在队列中等待的最长秒数
+    """
+
+    def __init__(self, max_in_flight: int = 0, max_queue: int = DEFAULT_MAX_QUEUE, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._targets: Dict[str, _TargetState] = {}
+
+    @asynccontextmanager
+    async def slot(self, target_url: str, session_id: Optional[str] = None) -> AsyncIterator[None]:
+        """在 target_url 的一个调用名额内执行 async with 块。"""
+        if self.max_in_flight <= 0:
+            yield
+            return
+        state = self._targets.setdefault(target_url, _TargetState())
+        await self._acquire(target_url, state, session_id)
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    async def _acquire(self, target_url: str, state: _TargetState, session_id: Optional[str]) -> None:
+        if state.in_flight < self.max_in_flight and state.depth == 0:
+            state.in_flight += 1
+            state.stats.admitted += 1
+            return
+        if state.depth >= self.max_queue:
+            state.stats.rejected += 1
+            raise QueueFullError(f"MCP 目标 {target_url} 的等待队列已满 ({self.max_queue})")
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.setdefault(session_id, deque()).append(waiter)
+        state.depth += 1
+        state.stats.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # 名额在超时/取消的同时被分配给了这个调用，转交给下一个等待者
+                self._release(state)
+            else:
+                waiter.cancel()
+                self._remove_waiter(state, session_id, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                state.stats.timed_out += 1
+                raise QueueTimeoutError(
+                    f"等待 MCP 目标 {target_url} 的调用名额超过 {self.queue_timeout} 秒"
+                ) from None
+            raise
+        finally:
+            state.stats.record_wait(time.monotonic() - started)
+        state.stats.admitted += 1
+
+    def _release(self, state: _TargetState) -> None:
+        waiter = self._next_waiter(state)
+        if waiter is None:
+            state.in_flight -= 1
+        else:
+            # 名额直接转交给下一个等待者，in_flight 不变
+            waiter.set_result(None)
+
+    def _next_waiter(self, state: _TargetState) -> Optional[asyncio.Future]:
+        while state.waiters:
+            session_id, queue = next(iter(state.waiters.items()))
+            waiter = queue.popleft()
+            state.depth -= 1
+            if queue:
+                state.waiters.move_to_end(session_id)
+            else:
+                del state.waiters[session_id]
+            if not waiter.done():
+                return waiter
+        return None
+
+    @staticmethod
+    def _remove_waiter(state: _TargetState, session_id: Optional[str], waiter: asyncio.Future) -> None:
+        queue = state.waiters.get(session_id)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        state.depth -= 1
+        if not queue:
+            del state.waiters[session_id]
+
+    def stats(self) -> Dict[str, dict]:
+        """每个目标的当前并发数、队列深度和累计等待统计。"""
+        return {
+            target_url: {
+                "in_flight": state.in_flight,
+                "queue_depth": state.depth,
+                "queued_sessions": len(state.waiters),
+                "admitted": state.stats.admitted,
+                "queued": state.stats.queued,
+                "rejected": state.stats.rejected,
+                "timed_out": state.stats.timed_out,
+                "wait_time_total_s": round(state.stats.wait_time_total, 6),
+                "wait_time_max_s": round(state.stats.wait_time_max, 6),
+            }
+            for target_url, state in self._targets.items()
+        }
@@ -2,13 +2,14 @@ from src.vendor.A2A.types import AgentCard, AgentCapabilities, AgentSkill, Agent
 
 DEFAULT_AGENT_VERSION = "0.1.0"
 
-def def_get_mcp_gateway_agent_card(host: str, port: int, version: str = DEFAULT_AGENT_VERSION) -> AgentCard:
+def def_get_mcp_gateway_agent_card(host: str, port: int, version: str = DEFAULT_AGENT_VERSION, push_notifications: bool = False) -> AgentCard:
     """
     创建并返回 MCP Gateway Agent 的 AgentCard。
     Args:
         host: Agent 服务监听的主机名或 IP 地址。
         port: Agent 服务监听的端口号。
         version: Agent 的版本号。
+        push_notifications: 是否声明支持推送通知 (服务器启用了推送投递时为 True，默认关闭)。
 
     Returns:
         AgentCard: 配置好的 AgentCard 实例。
@@ -17,8 +18,8 @@ def def_get_mcp_gateway_agent_card(host: str, port: int, version: str = DEFAULT_
     agent_url = f"http://{host}:{port}/"
 
     capabilities = AgentCapabilities(
-        streaming=False,
-        pushNotifications=False
+        streaming=True,
+        pushNotifications=push_notifications
     )
 
     execute_mcp_skill = AgentSkill(
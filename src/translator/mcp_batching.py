@@ -0,0 +1,193 @@
+"""
+按 MCP 目标透明地合并并发调用的微批处理调度器 (可选)。
+
+MCPBatchDispatcher 位于 MCPGatewayAgentTaskManager 和 send_mcp_request 之间:
+发往同一目标 URL 的调用先在一个很短的时间窗口内收集 (或收集到 max_batch_size 条)，
+再作为一个 JSON-RPC 批量数组在一个 HTTP 请求中发送，响应按 id 分发回各个调用者。
+发送时 id 被替换为批内序号，因此不同任务使用相同的 mcp_request_id 也不会冲突；
+返回给调用者的响应带有其原始 id。
+
+目标拒绝批量数组时 (4xx 状态码，或返回的不是响应数组)，本批调用逐个重发，
+此后该目标的调用不再合并。
+
+每条调用可以带自己的超时 (自适应读超时)；批量请求使用批内最宽松的超时，
+因此合并发送的调用不会比单独发送时更早超时，但最多可能等到批内最长的超时。
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+import httpx
+
+from src.translator import mcp_client
+from src.translator.resilience import widest_timeout
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WINDOW = 0.002
+DEFAULT_MAX_BATCH_SIZE = 32
+
+# 批大小直方图的桶上界 (最后一个桶收集所有更大的批)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+@dataclass
+class BatchStats:
+    batches: int = 0  # 发出的 HTTP 请求数 (包括只有一条调用的批)
+    calls: int = 0  # 经过调度器的调用数
+    fallbacks: int = 0  # 因目标拒绝批量数组而逐个重发的批数
+    size_histogram: Dict[str, int] = field(default_factory=lambda: {
+        **{f"le_{bound}": 0 for bound in BATCH_SIZE_BUCKETS}, "inf": 0
+    })
+
+    def record(self, size: int) -> None:
+        self.batches += 1
+        self.calls += size
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self.size_histogram[f"le_{bound}"] += 1
+                return
+        self.size_histogram["inf"] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "calls": self.calls,
+            "fallbacks": self.fallbacks,
+            "size_histogram": dict(self.size_histogram),
+        }
+
+
+Timeout = Union[float, httpx.Timeout]
+
+# (请求体, 调用者等待的 future, 该调用的超时)
+_Call = Tuple[Dict[str, Any], asyncio.Future, Timeout]
+
+
+@dataclass
+class _PendingBatch:
+    client: Optional[httpx.AsyncClient]
+    calls: List[_Call] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MCPBatchDispatcher:
+    """
+    Args:
+        window: 第一条调用到达后等待更多调用的秒数
+        max_batch_size: 每批的最大调用数，达到后立即发送
+    """
+
+    def __init__(self, window: float = DEFAULT_BATCH_WINDOW, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.stats = BatchStats()
+        self._pending: Dict[str, _PendingBatch] = {}
+        # 拒绝过批量数组的目标，之后直接逐个发送
+        self._unbatchable: Set[str] = set()
+        self._sending: Set[asyncio.Task] = set()
+
+    async def submit(
+        self,
+        target_url: str,
+        mcp_json_rpc_request_dict: Dict[str, Any],
+        client: Optional[httpx.AsyncClient] = None,
+        timeout: Timeout = mcp_client.DEFAULT_MCP_TIMEOUT,
+    ) -> Dict[str, Any]:
+        """与 send_mcp_request 相同的参数含义、返回值和异常，但请求可能与其他调用合并发送。"""
+        if target_url in self._unbatchable or self.max_batch_size <= 1:
+            return await mcp_client.send_mcp_request(target_url, mcp_json_rpc_request_dict, client=client, timeout=timeout)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(target_url)
+        if batch is None:
+            batch = self._pending[target_url] = _PendingBatch(client)
+            batch.timer = loop.call_later(self.window, self._flush, target_url)
+        batch.calls.append((mcp_json_rpc_request_dict, future, timeout))
+        if len(batch.calls) >= self.max_batch_size:
+            self._flush(target_url)
+        return await future
+
+    def _flush(self, target_url: str) -> None:
+        batch = self._pending.pop(target_url, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._send(target_url, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, target_url: str, batch: _PendingBatch) -> None:
+        # 等待期间被取消的调用不再发送
+        calls = [call for call in batch.calls if not call[1].done()]
+        if not calls:
+            return
+        if len(calls) == 1:
+            self.stats.record(1)
+            await self._send_single(target_url, batch.client, *calls[0])
+            return
+
+        self.stats.record(len(calls))
+        wire_requests = [{**body, "id": index} for index, (body, _, _) in enumerate(calls)]
+        try:
+            responses = await mcp_client.send_mcp_batch(
+                target_url, wire_requests, client=batch.client, timeout=widest_timeout(timeout for _, _, timeout in calls)
+            )
+        except httpx.HTTPStatusError as e:
+            if not e.response.is_client_error:
+                _fail(calls, e)
+                return
+            responses = None
+        except Exception as e:
+            _fail(calls, e)
+            return
+
+        if not isinstance(responses, list):
+            logger.warning(f"MCP 目标 {target_url} 不接受 JSON-RPC 批量请求，之后逐个发送")
+            self._unbatchable.add(target_url)
+            self.stats.fallbacks += 1
+            await asyncio.gather(*(self._send_single(target_url, batch.client, *call) for call in calls))
+            return
+
+        responses_by_index = {response.get("id"): response for response in responses if isinstance(response, dict)}
+        for index, (body, future, _) in enumerate(calls):
+            if future.done():
+                continue
+            response = responses_by_index.get(index)
+            if response is None:
+                future.set_exception(ValueError(f"MCP batch response from {target_url} has no entry for the request"))
+            else:
+                future.set_result({**response, "id": body.get("id")})
+
+    async def _send_single(
+        self,
+        target_url: str,
+        client: Optional[httpx.AsyncClient],
+        body: Dict[str, Any],
+        future: asyncio.Future,
+        timeout: Timeout,
+    ) -> None:
+        try:
+            response = await mcp_client.send_mcp_request(target_url, body, client=client, timeout=timeout)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(response)
+
+    async def aclose(self) -> None:
+        """发送所有等待中的批并等待其完成。"""
+        for target_url in list(self._pending):
+            self._flush(target_url)
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+
+def _fail(calls: List[_Call], error: Exception) -> None:
+    for _, future, _ in calls:
+        if not future.done():
+            future.set_exception(error)
@@ -0,0 +1,160 @@
+"""
+只读 MCP 方法的响应缓存。
+
+许多 A2A 任务会对同一个目标重复调用 tools/list、resources/read 等只读方法。
+MCPResponseCache 以 (目标 URL, 方法, 规范化参数) 为键缓存成功的 result，
+按 LRU 限制条目数并按 TTL 过期；当目标通过通知声明其工具/资源/提示发生变化时，
+使对应条目失效。
+
+网关只能收到目标在调用响应的 SSE 流中附带发出的通知，不维持独立的通知连接，
+目标在两次调用之间 (带外) 发出的变更通知收不到。因此 TTL 是过期的主要上界，默认值较短。
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# 可以缓存的只读 MCP 方法
+CACHEABLE_METHODS = frozenset({
+    "tools/list",
+    "resources/list",
+    "resources/read",
+    "prompts/list",
+    "prompts/get",
+})
+
+# 通知方法 -> 被其失效的缓存方法
+_INVALIDATED_BY = {
+    "notifications/tools/list_changed": ("tools/list",),
+    "notifications/resources/list_changed": ("resources/list",),
+    "notifications/prompts/list_changed": ("prompts/list", "prompts/get"),
+}
+_RESOURCE_UPDATED = "notifications/resources/updated"
+
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_CACHE_TTL = 10.0
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str, str]
+
+
+def canonical_params(params: Optional[Dict[str, Any]]) -> str:
+    """参数的规范化 JSON 表示: 键排序、无多余空白，并忽略不影响结果的 _meta (如 progressToken)。"""
+    params = {k: v for k, v in (params or {}).items() if k != "_meta"}
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def request_key(target_url: str, method: str, params: Optional[Dict[str, Any]]) -> CacheKey:
+    """(目标 URL, 方法, 规范化参数)，相同的键表示结果可以互相替代的请求。"""
+    return target_url, method, canonical_params(params)
+
+
+def is_cacheable(method: str) -> bool:
+    return method in CACHEABLE_METHODS
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class _Entry:
+    result: Dict[str, Any]
+    expires_at: float
+    uri: Optional[str] = None  # resources/read 的资源 URI，用于按资源失效
+
+
+class MCPResponseCache:
+    """按目标隔离、容量受限的 LRU+TTL 缓存。只缓存 CACHEABLE_METHODS 中方法的成功结果。"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES, ttl: float = DEFAULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: OrderedDict[CacheKey, _Entry] = OrderedDict()
+        # 每个目标的失效代数。请求开始时记录，结果返回时若代数已变化 (期间收到了失效通知)，
+        # 该结果可能已过时，不写入缓存
+        self._generations: Dict[str, int] = {}
+
+    def generation(self, target_url: str) -> int:
+        return self._generations.get(target_url, 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry.result
+
+    def put(
+        self,
+        key: CacheKey,
+        result: Dict[str, Any],
+        params: Optional[Dict[str, Any]] = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        if self.max_entries <= 0 or not is_cacheable(key[1]):
+            return
+        if generation is not None and generation != self.generation(key[0]):
+            return
+        uri = (params or {}).get("uri") if key[1] == "resources/read" else None
+        self._entries[key] = _Entry(result, time.monotonic() + self.ttl, uri)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, target_url: str, methods: Iterable[str], uri: Optional[str] = None) -> int:
+        """删除 target_url 上指定方法的条目；给出 uri 时只删除该资源 (或其父/子资源) 的条目。"""
+        methods = set(methods)
+        self._generations[target_url] = self.generation(target_url) + 1
+        victims = [
+            key for key, entry in self._entries.items()
+            if key[0] == target_url and key[1] in methods
+            and (uri is None or _uri_overlaps(entry.uri, uri))
+        ]
+        for key in victims:
+            del self._entries[key]
+        self.stats.invalidations += len(victims)
+        return len(victims)
+
+    def handle_notification(self, target_url: str, notification: Dict[str, Any]) -> int:
+        """根据目标发出的 MCP 通知使缓存失效，返回删除的条目数。"""
+        method = notification.get("method")
+        if method == _RESOURCE_UPDATED:
+            uri = (notification.get("params") or {}).get("uri")
+            if not isinstance(uri, str):
+                return 0
+            removed = self.invalidate(target_url, ("resources/read",), uri=uri)
+        elif method in _INVALIDATED_BY:
+            removed = self.invalidate(target_url, _INVALIDATED_BY[method])
+        else:
+            return 0
+        if removed:
+            logger.debug(f"MCP 通知 {method} 使 {target_url} 的 {removed} 个缓存条目失效")
+        return removed
+
+
+def _uri_overlaps(cached_uri: Optional[str], updated_uri: str) -> bool:
+    # 通知中的 URI 可能是所缓存资源的子资源，反之亦然
+    if cached_uri is None:
+        return False
+    return cached_uri.startswith(updated_uri) or updated_uri.startswith(cached_uri)
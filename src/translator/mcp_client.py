@@ -1,11 +1,150 @@
+import asyncio
+import functools
 import httpx
-from typing import Dict, Any, Optional
+import json
+from dataclasses import asdict, dataclass
+from typing import Dict, Any, Hashable, List, Optional, Tuple, Callable, Awaitable, TypeVar, Union
+
+# 接收 MCP 服务在响应完成前发出的通知 (如 notifications/progress) 的回调
+NotificationHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+DEFAULT_MCP_TIMEOUT = 30.0
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class MCPClientPoolConfig:
+    """
+    MCP 下游连接池配置。每个目标源 (scheme, host, port) 对应一个独立的连接池。
+
+    Attributes:
+        max_connections: 每个目标允许的最大并发连接数
+        max_keepalive_connections: 每个目标保留的最大空闲 keep-alive 连接数
+        keepalive_expiry: 空闲连接保留的秒数，超时后关闭
+        http2: 是否启用 HTTP/2 (需要目标服务支持，默认关闭)
+    """
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+    def to_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class MCPClientRegistry:
+    """
+    按目标源 (scheme, host, port) 缓存长连接 httpx.AsyncClient 的注册表。
+
+    同一目标的所有 MCP 调用共享一个连接池，从而复用 TCP/TLS 连接。
+    由 MCPGatewayAgentTaskManager 持有，并随 A2AServer 的启动/关闭而打开/关闭。
+    """
+
+    def __init__(
+        self,
+        config: Optional[MCPClientPoolConfig] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,  # 可选的自定义传输层 (测试/基准用)
+    ):
+        self.config = config or MCPClientPoolConfig()
+        self._transport = transport
+        self._clients: Dict[Tuple[str, str, Optional[int]], httpx.AsyncClient] = {}
+
+    @staticmethod
+    def _origin_key(target_url: str) -> Tuple[str, str, Optional[int]]:
+        url = httpx.URL(target_url)
+        return url.scheme, url.host, url.port
+
+    def get_client(self, target_url: str) -> httpx.AsyncClient:
+        """返回 target_url 所属源的共享客户端，必要时惰性创建。"""
+        key = self._origin_key(target_url)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=DEFAULT_MCP_TIMEOUT,
+                follow_redirects=True,
+                limits=self.config.to_limits(),
+                http2=self.config.http2,
+                transport=self._transport,
+            )
+            self._clients[key] = client
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def aclose(self) -> None:
+        """关闭所有已打开的客户端并释放其连接。"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0  # 实际发出的调用数
+    shared: int = 0  # 加入进行中调用、共享其结果的请求数
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用: 同一时刻每个键只有一个调用在进行，其间到达的相同请求等待并共享它的结果 (或异常)。
+
+    调用在独立的 asyncio.Task 中执行，部分等待者被取消不会取消共享调用，其他等待者仍能拿到结果；
+    所有等待者都被取消时，没有人再需要结果，共享调用随之取消 (释放其连接和调用名额)。
+    调用结束后键立即释放，之后的请求会发起新的调用 (结果的复用由 MCPResponseCache 负责)。
+    """
+
+    def __init__(self):
+        self.stats = SingleFlightStats()
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        # 每个共享调用当前的等待者数
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            self.stats.calls += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._finish, key))
+        else:
+            self.stats.shared += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # 所有等待者都已取消时，避免 "exception was never retrieved" 警告
+
 
 async def send_mcp_request(
     target_url: str,  # 完整的 URL，包括路径
     mcp_json_rpc_request_dict: Dict[str, Any],  # 序列化为字典的 MCP JSON-RPC 请求
     headers: Optional[Dict[str, str]] = None,  # 可选的额外 HTTP 头
-    timeout: float = 30.0  # 请求超时时间（秒）
+    timeout: Union[float, httpx.Timeout] = DEFAULT_MCP_TIMEOUT,  # 请求超时时间（秒），或分别设置连接/读超时的 httpx.Timeout
+    client: Optional[httpx.AsyncClient] = None,  # 可选的共享客户端 (来自 MCPClientRegistry)
+    on_notification: Optional[NotificationHandler] = None,  # 可选的通知回调，启用 SSE 流式响应
 ) -> Dict[str, Any]:  # 返回从 MCP 服务解析的 JSON 响应字典
     """
     向 MCP 服务发送 JSON-RPC 请求并返回响应。
@@ -14,7 +153,12 @@ async def send_mcp_request(
         target_url: 目标 MCP 服务的完整 URL（包括路径）
         mcp_json_rpc_request_dict: 序列化为字典的 MCP JSON-RPC 请求
         headers: 可选的额外 HTTP 头
-        timeout: 请求超时时间（秒）
+        timeout: 请求超时时间（秒），或 httpx.Timeout
+        client: 可选的共享 httpx.AsyncClient。提供时复用其连接池且不会关闭它；
+            未提供时为本次调用创建并关闭一个临时客户端。
+        on_notification: 可选的异步回调。提供时以 `Accept: application/json, text/event-stream`
+            发送请求；若 MCP 服务以 SSE 流响应，流中的通知消息会在到达时逐条传给该回调，
+            与请求 ID 匹配的响应消息作为返回值。
 
     Returns:
         Dict[str, Any]: MCP 服务的 JSON 响应
@@ -30,34 +174,126 @@ async def send_mcp_request(
         **(headers or {})
     }
 
+    post = _post_mcp_request
+    if on_notification is not None:
+        request_headers.setdefault("Accept", "application/json, text/event-stream")
+        post = functools.partial(_stream_mcp_request, on_notification=on_notification)
+
+    if client is not None:
+        return await post(client, target_url, mcp_json_rpc_request_dict, request_headers, timeout=timeout)
+
     async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        try:
-            response = await client.post(
-                target_url,
-                json=mcp_json_rpc_request_dict,
-                headers=request_headers
-            )
+        return await post(client, target_url, mcp_json_rpc_request_dict, request_headers)
+
+
+async def send_mcp_batch(
+    target_url: str,
+    mcp_json_rpc_requests: List[Dict[str, Any]],  # 多个 JSON-RPC 请求，作为一个批量数组发送
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = DEFAULT_MCP_TIMEOUT,
+    client: Optional[httpx.AsyncClient] = None,
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    在一个 HTTP 请求中以 JSON-RPC 2.0 批量数组发送多个 MCP 请求。
+
+    Returns:
+        响应对象数组 (顺序不保证与请求一致，应按 id 对应)；
+        目标不支持批量请求时，通常返回单个 JSON-RPC 错误对象。
+
+    Raises:
+        与 send_mcp_request 相同。
+    """
+    request_headers = {
+        "Content-Type": "application/json",
+        **(headers or {})
+    }
+    if client is not None:
+        return await _post_mcp_request(client, target_url, mcp_json_rpc_requests, request_headers, timeout=timeout)
+
+    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+        return await _post_mcp_request(client, target_url, mcp_json_rpc_requests, request_headers)
+
+
+async def _stream_mcp_request(
+    client: httpx.AsyncClient,
+    target_url: str,
+    mcp_json_rpc_request_dict: Dict[str, Any],
+    request_headers: Dict[str, str],
+    on_notification: NotificationHandler,
+    **request_kwargs: Any,
+) -> Dict[str, Any]:
+    async with client.stream(
+        "POST",
+        target_url,
+        json=mcp_json_rpc_request_dict,
+        headers=request_headers,
+        **request_kwargs
+    ) as response:
+        if response.is_error:
+            await response.aread()
             response.raise_for_status()
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            await response.aread()
             return response.json()
-        except httpx.HTTPError as e:
-            # 如果是 HTTP 错误，尝试解析错误响应
-            # 安全地访问 e.response
-            current_response = getattr(e, 'response', None)
-            if current_response is not None:
-                try:
-                    error_data = current_response.json()
-                    # 尝试获取更详细的错误消息
-                    error_message_detail = error_data.get('error', {}).get('message', None)
-                    # 如果成功获取了详细消息，可以选择记录日志，但无论如何都重新抛出原始异常 e
-                    # 它已经包含了 request 和 response
-                    if error_message_detail:
-                        # 可选：在这里添加日志记录详细错误信息
-                        # logger.error(f"MCP HTTP Error {current_response.status_code} with detail: {error_message_detail}")
-                        pass 
-                    raise e # 重新抛出原始异常
-                except ValueError: # JSON decoding failed
-                    # 如果 JSON 解析失败，也重新抛出原始异常 e
-                    raise e
-            else:
-                # 如果原始异常没有 response (例如 ConnectError)，直接重新抛出
+
+        request_id = mcp_json_rpc_request_dict.get("id")
+        async for message in _iter_sse_messages(response):
+            if "method" in message and "id" not in message:
+                await on_notification(message)
+            elif message.get("id") == request_id and ("result" in message or "error" in message):
+                return message
+        raise ValueError("MCP SSE stream ended without a response to the request")
+
+
+async def _iter_sse_messages(response: httpx.Response):
+    """逐条解析 SSE 流中的 JSON 消息 (多行 data 字段按规范以换行拼接)。"""
+    data_lines = []
+    async for line in response.aiter_lines():
+        if not line:
+            if data_lines:
+                yield json.loads("\n".join(data_lines))
+                data_lines = []
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip(" "))
+    if data_lines:
+        yield json.loads("\n".join(data_lines))
+
+
+async def _post_mcp_request(
+    client: httpx.AsyncClient,
+    target_url: str,
+    mcp_json_rpc_request_dict: Union[Dict[str, Any], List[Dict[str, Any]]],
+    request_headers: Dict[str, str],
+    **request_kwargs: Any,
+) -> Any:
+    try:
+        response = await client.post(
+            target_url,
+            json=mcp_json_rpc_request_dict,
+            headers=request_headers,
+            **request_kwargs
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        # 如果是 HTTP 错误，尝试解析错误响应
+        # 安全地访问 e.response
+        current_response = getattr(e, 'response', None)
+        if current_response is not None:
+            try:
+                error_data = current_response.json()
+                # 尝试获取更详细的错误消息
+                error_message_detail = error_data.get('error', {}).get('message', None)
+                # 如果成功获取了详细消息，可以选择记录日志，但无论如何都重新抛出原始异常 e
+                # 它已经包含了 request 和 response
+                if error_message_detail:
+                    # 可选：在这里添加日志记录详细错误信息
+                    # logger.error(f"MCP HTTP Error {current_response.status_code} with detail: {error_message_detail}")
+                    pass 
+                raise e # 重新抛出原始异常
+            except ValueError: # JSON decoding failed
+                # 如果 JSON 解析失败，也重新抛出原始异常 e
                 raise e
+        else:
+            # 如果原始异常没有 response (例如 ConnectError)，直接重新抛出
+            raise e
@@ -0,0 +1,316 @@
+"""
+MCP 目标的熔断器与按延迟自适应的读超时。
+
+CircuitBreakers: 每个目标一个熔断器。连续失败 (连接/超时等传输错误或 5xx) 达到阈值后打开，
+打开期间的调用立即以 CircuitOpenError 失败，不再等待连接失败或超时；
+reset_timeout 秒后进入半开状态，放行一个探测调用，成功则关闭，失败则重新打开。
+
+LatencyTracker: 记录每个 (目标, 方法) 最近的成功调用耗时，读超时取 p99 的若干倍，
+并限制在 [min_timeout, max_timeout] 内。样本不足时使用 max_timeout。
+
+HedgePolicy: 幂等调用的对冲请求与重试。首次尝试在目标的 p95 耗时内没有应答时，
+向副本 (若配置) 或同一目标再发一次，先成功的结果胜出；连接错误和 5xx 按带抖动的指数退避重试。
+对冲和重试都从全局的 RetryBudget 中扣除，避免在目标过载时放大负载。
+"""
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+import httpx
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+DEFAULT_MIN_TIMEOUT = 1.0
+DEFAULT_MAX_TIMEOUT = 30.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+# 读超时 = p99 耗时 * TIMEOUT_MULTIPLIER
+TIMEOUT_MULTIPLIER = 3.0
+LATENCY_WINDOW = 256
+MIN_LATENCY_SAMPLES = 20
+# 每记录这么多个样本重新计算一次分位数
+_RECOMPUTE_EVERY = 16
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """目标的熔断器处于打开 (或半开且探测中) 状态，调用未发出。"""
+
+    def __init__(self, target_url: str, retry_after: float):
+        super().__init__(f"MCP 目标 {target_url} 暂时不可用 (熔断器打开)，{retry_after:.1f} 秒后重试")
+        self.target_url = target_url
+        self.retry_after = retry_after
+
+
+def is_target_failure(error: BaseException) -> bool:
+    """只有说明目标本身不可用的错误才计入熔断: 传输层错误 (连接失败、超时等) 和 5xx。"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.is_server_error
+    return isinstance(error, httpx.TransportError)
+
+
+@dataclass
+class _Breaker:
+    state: CircuitState = CircuitState.CLOSED
+    consecutive_failures: int = 0
+    opened_at: float = 0.0
+    probe_in_flight: bool = False
+    opened: int = 0
+    rejected: int = 0
+
+
+class CircuitBreakers:
+    """
+    Args:
+        failure_threshold: 打开熔断器所需的连续失败次数，0 表示禁用熔断
+        reset_timeout: 打开后多少秒进入半开状态
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, _Breaker] = {}
+
+    def state(self, target_url: str) -> CircuitState:
+        breaker = self._breakers.get(target_url)
+        return breaker.state if breaker is not None else CircuitState.CLOSED
+
+    @asynccontextmanager
+    async def guard(self, target_url: str) -> AsyncIterator[None]:
+        """在熔断器保护下执行一次调用: 打开时抛出 CircuitOpenError，并根据块内的结果更新状态。"""
+        if self.failure_threshold <= 0:
+            yield
+            return
+        breaker = self._breakers.setdefault(target_url, _Breaker())
+        probe = self._before_call(target_url, breaker)
+        try:
+            yield
+        except BaseException as e:
+            if is_target_failure(e):
+                self._record_failure(breaker)
+            elif probe:
+                # 探测调用因与目标无关的原因 (取消、准入等) 结束，允许下一个调用继续探测
+                breaker.probe_in_flight = False
+            raise
+        self._record_success(breaker)
+
+    def _before_call(self, target_url: str, breaker: _Breaker) -> bool:
+        """返回本次调用是否是半开状态下的探测调用。"""
+        if breaker.state == CircuitState.CLOSED:
+            return False
+        now = time.monotonic()
+        if breaker.state == CircuitState.OPEN and now - breaker.opened_at >= self.reset_timeout:
+            breaker.state = CircuitState.HALF_OPEN
+        if breaker.state == CircuitState.HALF_OPEN and not breaker.probe_in_flight:
+            breaker.probe_in_flight = True
+            return True
+        breaker.rejected += 1
+        raise CircuitOpenError(target_url, max(0.0, breaker.opened_at + self.reset_timeout - now))
+
+    def _record_success(self, breaker: _Breaker) -> None:
+        breaker.state = CircuitState.CLOSED
+        breaker.consecutive_failures = 0
+        breaker.probe_in_flight = False
+
+    def _record_failure(self, breaker: _Breaker) -> None:
+        breaker.consecutive_failures += 1
+        if breaker.state == CircuitState.HALF_OPEN or breaker.consecutive_failures >= self.failure_threshold:
+            if breaker.state != CircuitState.OPEN:
+                breaker.opened += 1
+            breaker.state = CircuitState.OPEN
+            breaker.opened_at = time.monotonic()
+        breaker.probe_in_flight = False
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            target_url: {
+                "state": breaker.state.value,
+                "consecutive_failures": breaker.consecutive_failures,
+                "opened": breaker.opened,
+                "rejected": breaker.rejected,
+            }
+            for target_url, breaker in self._breakers.items()
+        }
+
+
+class _LatencyWindow:
+    def __init__(self, size: int):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.observed = 0
+        self.percentiles: Optional[Tuple[float, float, float]] = None  # p50, p95, p99
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.observed += 1
+        if self.observed % _RECOMPUTE_EVERY == 0 or (self.percentiles is None and len(self.samples) >= MIN_LATENCY_SAMPLES):
+            ordered = sorted(self.samples)
+            self.percentiles = tuple(ordered[min(len(ordered) - 1, int(len(ordered) * q))] for q in (0.50, 0.95, 0.99))
+
+
+class LatencyTracker:
+    """
+    Args:
+        min_timeout / max_timeout: 自适应读超时的下限和上限 (秒)
+        connect_timeout: 建立连接的超时 (秒)，不做自适应
+    """
+
+    def __init__(
+        self,
+        min_timeout: float = DEFAULT_MIN_TIMEOUT,
+        max_timeout: float = DEFAULT_MAX_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        window: int = LATENCY_WINDOW,
+    ):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.connect_timeout = connect_timeout
+        self.window = window
+        self._windows: Dict[Tuple[str, str], _LatencyWindow] = {}
+
+    def observe(self, target_url: str, method: str, seconds: float) -> None:
+        key = (target_url, method)
+        latency_window = self._windows.get(key)
+        if latency_window is None:
+            latency_window = self._windows[key] = _LatencyWindow(self.window)
+        latency_window.observe(seconds)
+
+    def percentile(self, target_url: str, method: str, q: int) -> Optional[float]:
+        """最近耗时的 p50/p95/p99 (q 为 50、95 或 99)，样本不足时返回 None。"""
+        latency_window = self._windows.get((target_url, method))
+        if latency_window is None or latency_window.percentiles is None:
+            return None
+        return latency_window.percentiles[(50, 95, 99).index(q)]
+
+    def read_timeout(self, target_url: str, method: str) -> float:
+        p99 = self.percentile(target_url, method, 99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * TIMEOUT_MULTIPLIER))
+
+    def timeout(self, target_url: str, method: str) -> httpx.Timeout:
+        return httpx.Timeout(self.max_timeout, connect=self.connect_timeout, read=self.read_timeout(target_url, method))
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        for (target_url, method), latency_window in self._windows.items():
+            p50, p95, p99 = latency_window.percentiles or (None, None, None)
+            stats[f"{method} {target_url}"] = {
+                "samples": len(latency_window.samples),
+                "p50_s": p50,
+                "p95_s": p95,
+                "p99_s": p99,
+                "read_timeout_s": self.read_timeout(target_url, method),
+            }
+        return stats
+
+
+def widest_timeout(timeouts: Iterable[Union[float, httpx.Timeout]]) -> httpx.Timeout:
+    """
+    一个请求承载多条调用 (JSON-RPC 批量) 时使用的超时: 连接、读、写、连接池各自取最大值，
+    None (不限时) 优先于任何数值，因此没有一条调用会比单独发送时更早超时。
+    """
+    timeouts = [t if isinstance(t, httpx.Timeout) else httpx.Timeout(t) for t in timeouts]
+
+    def widest(values: List[Optional[float]]) -> Optional[float]:
+        return None if any(v is None for v in values) else max(values)
+
+    return httpx.Timeout(
+        connect=widest([t.connect for t in timeouts]),
+        read=widest([t.read for t in timeouts]),
+        write=widest([t.write for t in timeouts]),
+        pool=widest([t.pool for t in timeouts]),
+    )
+
+
+def latency_key(method: str, params: Optional[dict]) -> str:
+    """延迟统计的方法键。tools/call 按工具名区分，因为不同工具的耗时可能相差几个数量级。"""
+    if method == "tools/call" and isinstance(params, dict) and isinstance(params.get("name"), str):
+        return f"tools/call:{params['name']}"
+    return method
+
+
+DEFAULT_RETRY_BUDGET_RATIO = 0.1
+DEFAULT_RETRY_BUDGET_INITIAL = 10.0
+DEFAULT_RETRY_BUDGET_MAX = 100.0
+DEFAULT_BACKOFF_BASE = 0.05
+DEFAULT_BACKOFF_MAX = 1.0
+
+
+class RetryBudget:
+    """
+    令牌桶形式的全局重试预算: 每个请求存入 ratio 个令牌 (不超过 max_tokens)，每次重试或对冲取出一个。
+    预算因此大约是请求量的 ratio 倍，目标大面积失败时重试不会成倍放大流量。
+    """
+
+    def __init__(
+        self,
+        ratio: float = DEFAULT_RETRY_BUDGET_RATIO,
+        initial: float = DEFAULT_RETRY_BUDGET_INITIAL,
+        max_tokens: float = DEFAULT_RETRY_BUDGET_MAX,
+    ):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = min(initial, max_tokens)
+        self.exhausted = 0
+
+    def record_request(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """可以重试的错误: 连接失败/连接超时，以及 5xx。读超时不重试 (请求可能已在目标上执行)。"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.is_server_error
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+@dataclass
+class HedgeStats:
+    retries: int = 0
+    hedges: int = 0  # 发出的对冲请求数
+    hedge_wins: int = 0  # 对冲请求先于首次尝试成功的次数
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class HedgePolicy:
+    """
+    Attributes:
+        hedge: 是否对幂等调用发出对冲请求
+        max_retries: 幂等调用遇到暂时性错误时的最大重试次数
+        budget: 对冲和重试共用的预算
+        replicas: mcp_target_url -> 可互换的副本 URL 列表；重试和对冲轮流使用主目标和副本
+        backoff_base / backoff_max: 第 n 次重试前等待 uniform(0, min(backoff_max, backoff_base * 2^(n-1))) 秒
+    """
+    hedge: bool = False
+    max_retries: int = 0
+    budget: RetryBudget = field(default_factory=RetryBudget)
+    replicas: Dict[str, List[str]] = field(default_factory=dict)
+    backoff_base: float = DEFAULT_BACKOFF_BASE
+    backoff_max: float = DEFAULT_BACKOFF_MAX
+    stats: HedgeStats = field(default_factory=HedgeStats)
+
+    def targets(self, target_url: str) -> List[str]:
+        return [target_url, *self.replicas.get(target_url, ())]
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
@@ -1,4 +1,8 @@
+import asyncio
+import functools
 import logging
+import time
+from dataclasses import dataclass, field, replace
 from typing import Any, Dict, Tuple, Optional, List, Union, AsyncIterable
 from uuid import uuid4
 import httpx
@@ -9,14 +13,19 @@ from vendor.MCP import types as mcp_types
 # 从本地 vendor 目录导入 A2A 类型定义
 from src.vendor.A2A.types import (
     Artifact,
+    CancelTaskRequest,
+    CancelTaskResponse,
     DataPart,
+    InvalidParamsError,
     JSONRPCError,
     Message,
     SendTaskRequest,
     SendTaskResponse,
     Task,
+    TaskArtifactUpdateEvent,
     TaskState,
     TaskStatus,
+    TaskStatusUpdateEvent,
     TextPart,
     SendTaskStreamingRequest,
     SendTaskStreamingResponse,
@@ -24,18 +33,190 @@ from src.vendor.A2A.types import (
 )
 
 from src.vendor.A2A.server.task_manager import InMemoryTaskManager
-from src.vendor.A2A.server.utils import new_not_implemented_error
+from src.vendor.A2A.server.retention import TERMINAL_STATES
+from src.vendor.A2A.server.metrics import Counter, Histogram, MetricsRegistry
+from src.vendor.A2A.server.tracing import TRACEPARENT_HEADER, current_traceparent, span
+from src.vendor.A2A.server.profiler import annotate_request
+from src.vendor.A2A.server.push import WebhookNotAllowedError
 
-from src.translator.mcp_client import send_mcp_request
+from src.translator.admission import AdmissionController, AdmissionError
+from src.translator.mcp_batching import MCPBatchDispatcher
+from src.translator.mcp_cache import CacheKey, MCPResponseCache, is_cacheable, request_key
+from src.translator.resilience import (
+    CircuitBreakers,
+    CircuitOpenError,
+    HedgePolicy,
+    LatencyTracker,
+    is_transient_error,
+    latency_key,
+    widest_timeout,
+)
+from src.translator.mcp_client import MCPClientRegistry, SingleFlight, send_mcp_batch, send_mcp_request
 
 logger = logging.getLogger(__name__)
 
+# JSON-RPC 实现自定义的服务器错误码: 调用因目标繁忙 (准入控制) 未发出
+SERVER_BUSY_ERROR = -32000
+# 调用因目标的熔断器打开而未发出
+TARGET_UNAVAILABLE_ERROR = -32001
+# 上游指标中 JSON-RPC 批量请求的 mcp_method 标签
+BATCH_METHOD_LABEL = "batch"
+
+
+def _upstream_outcome(error: BaseException) -> str:
+    """上游调用指标的 code 标签: 调用抛出异常时按异常类型归类。"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, AdmissionError):
+        return "admission_rejected"
+    if isinstance(error, asyncio.CancelledError):
+        return "canceled"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.TransportError):
+        return "transport_error"
+    return "exception"
+
+
+def _response_outcome(raw_response: Any) -> str:
+    """上游调用指标的 code 标签: 收到响应时为 ok 或 MCP 返回的 JSON-RPC 错误码。"""
+    error = raw_response.get("error") if isinstance(raw_response, dict) else None
+    if isinstance(error, dict):
+        return str(error.get("code", "error"))
+    return "ok"
+
+
+@dataclass
+class MCPCallContext:
+    """
+    单个 A2A 任务在 parse → call → format 流水线中的执行上下文。
+    每个 on_send_task 调用创建自己的实例，因此并发任务之间不会互相覆盖目标地址和请求 ID。
+    """
+    task_id: str
+    session_id: Optional[str] = None
+    mcp_target_url: str = ""
+    mcp_request_path: str = ""
+    mcp_method: str = ""
+    mcp_params: Dict[str, Any] = field(default_factory=dict)
+    mcp_request_id: Optional[str | int] = None
+    # 流式任务 (tasks/sendSubscribe): 状态/产物变更同时推送为 SSE 事件，并转发 MCP 进度通知
+    streaming: bool = False
+    # DataPart 中的 mcp_bypass_cache: 不读取响应缓存，总是请求目标 (成功结果仍会刷新缓存)
+    bypass_cache: bool = False
+    # DataPart 中的 mcp_idempotent: 调用方声明该调用可以安全地重复执行 (只读方法总是视为幂等)
+    idempotent: bool = False
+
+    @property
+    def full_mcp_url(self) -> str:
+        """组合 mcp_target_url 与 mcp_request_path (仅当后者非空时才拼接)。"""
+        if not self.mcp_request_path:
+            return self.mcp_target_url
+        processed_request_path = self.mcp_request_path
+        if not processed_request_path.startswith('/'):
+            processed_request_path = '/' + processed_request_path
+        return f"{self.mcp_target_url.rstrip('/')}{processed_request_path}"
+
+
 class MCPGatewayAgentTaskManager(InMemoryTaskManager):
     """
     管理 MCP Gateway Agent 的任务。它将 A2A 任务转换为 MCP 请求，
     发送到目标 MCP 服务，并将 MCP 响应格式化回 A2A 任务结果。
     """
 
+    def __init__(
+        self,
+        client_registry: Optional[MCPClientRegistry] = None,
+        response_cache: Optional[MCPResponseCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        batch_dispatcher: Optional[MCPBatchDispatcher] = None,
+        admission: Optional[AdmissionController] = None,
+        circuit_breakers: Optional[CircuitBreakers] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        async_execution: bool = False,
+        **store_options: Any,
+    ):
+        # store_options 原样传给 InMemoryTaskManager (retention_policy、replay_buffer_size、sse_queue_size 等)
+        super().__init__(**store_options)
+        # 按目标复用的长连接 HTTP 客户端，随服务器启动/关闭而打开/关闭
+        self.client_registry = client_registry if client_registry is not None else MCPClientRegistry()
+        # 只读 MCP 方法 (tools/list、resources/read 等) 的响应缓存
+        self.response_cache = response_cache if response_cache is not None else MCPResponseCache()
+        # 合并相同的并发只读调用 (例如编排器扇出的大量 resources/read)
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        # 可选: 把发往同一目标的并发调用合并为 JSON-RPC 批量请求 (默认关闭)
+        self.batch_dispatcher = batch_dispatcher
+        # 每个 MCP 目标的并发上限和按会话公平的等待队列 (默认不限制)
+        self.admission = admission if admission is not None else AdmissionController()
+        # 目标不可用时快速失败；读超时按每个 (目标, 方法) 的历史耗时自适应
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else CircuitBreakers()
+        self.latency_tracker = latency_tracker if latency_tracker is not None else LatencyTracker()
+        # 可选: 幂等调用的对冲请求和暂时性错误重试 (默认关闭)
+        self.hedge_policy = hedge_policy
+        # 为 True 时 tasks/send 不等待 MCP 调用，立即返回 SUBMITTED 状态的任务，调用在后台执行
+        self.async_execution = async_execution
+        # 正在后台执行的流水线，保留引用以免被垃圾回收
+        self._background_tasks: set[asyncio.Task] = set()
+        # 任务 ID -> 正在执行的流水线及其上下文，供 tasks/cancel 取消
+        self._running_pipelines: Dict[str, Tuple[asyncio.Task, MCPCallContext]] = {}
+        # 上游调用的指标，由 A2AServer 调用 register_metrics 后创建；未注册时不记录
+        self._upstream_calls: Optional[Counter] = None
+        self._upstream_latency: Optional[Histogram] = None
+
+    def register_metrics(self, metrics: MetricsRegistry) -> None:
+        super().register_metrics(metrics)
+        self._upstream_calls = metrics.counter(
+            "mcp_upstream_calls_total",
+            "发往 MCP 目标的调用 (每次尝试计一次)，code 为 ok、MCP 返回的 JSON-RPC 错误码、http_<状态码> 或本地错误类型。",
+            ("mcp_target_url", "mcp_method", "code"),
+        )
+        self._upstream_latency = metrics.histogram(
+            "mcp_upstream_duration_seconds",
+            "MCP 调用从发出请求到收到完整响应的耗时 (不含准入排队)。",
+            ("mcp_target_url", "mcp_method"),
+        )
+        metrics.callback_gauge(
+            "mcp_pipelines_running", "正在执行 MCP 调用流水线的任务数。", lambda: len(self._running_pipelines)
+        )
+
+    async def on_shutdown(self) -> None:
+        # 先取消仍在执行的流水线 (任务标记为 CANCELED)，再关闭任务存储和连接池
+        pipelines = [pipeline for pipeline, _ in self._running_pipelines.values()]
+        for pipeline in pipelines:
+            pipeline.cancel()
+        if pipelines:
+            await asyncio.gather(*pipelines, return_exceptions=True)
+        await super().on_shutdown()
+        if self.batch_dispatcher is not None:
+            await self.batch_dispatcher.aclose()
+        await self.client_registry.aclose()
+
+    def cache_stats(self) -> dict:
+        return {**self.response_cache.stats.as_dict(), "entries": len(self.response_cache)}
+
+    def coalescing_stats(self) -> dict:
+        return {**self.single_flight.stats.as_dict(), "in_flight": len(self.single_flight)}
+
+    def admission_stats(self) -> Dict[str, dict]:
+        return self.admission.stats()
+
+    def circuit_stats(self) -> Dict[str, dict]:
+        return self.circuit_breakers.stats()
+
+    def latency_stats(self) -> Dict[str, dict]:
+        return self.latency_tracker.stats()
+
+    def batching_stats(self) -> Optional[dict]:
+        return self.batch_dispatcher.stats.as_dict() if self.batch_dispatcher is not None else None
+
+    def hedging_stats(self) -> Optional[dict]:
+        if self.hedge_policy is None:
+            return None
+        budget = self.hedge_policy.budget
+        return {**self.hedge_policy.stats.as_dict(), "budget_tokens": round(budget.tokens, 3), "budget_exhausted": budget.exhausted}
+
     # 首先定义辅助方法
     def _format_a2a_error_response(self, request_id: Optional[str], code: int, message: str, data: Optional[Any] = None) -> JSONRPCError:
         """辅助方法，用于创建 JSONRPCError 对象。"""
@@ -44,19 +225,90 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
         return JSONRPCError(code=code, message=message, data=data)
 
     async def on_send_task(self, request: SendTaskRequest) -> A2AJSONRPCResponse:
-        self.task_id = request.params.id
-        self.session_id = request.params.sessionId
-        self.last_error = None # Reset last_error for this new task
+        # 每个请求的状态都保存在独立的上下文中，而不是共享的 manager 实例上，
+        # 以便同一个 manager 可以安全地并发处理多个任务
+        ctx = MCPCallContext(task_id=request.params.id, session_id=request.params.sessionId)
 
-        logger.info(f"任务 [{self.task_id}] (会话 [{self.session_id}]): 已接收")
+        logger.info(f"任务 [{ctx.task_id}] (会话 [{ctx.session_id}]): 已接收")
 
         # 步骤 1: 立即通过 upsert_task 创建或获取任务，确保它在后续操作中存在
+        init_error_response = await self._initialize_task(ctx, request)
+        if init_error_response is not None:
+            return init_error_response
+
+        if self.async_execution:
+            # 立即返回已提交的任务；客户端通过 tasks/get (或 tasks/resubscribe) 获取进度和结果
+            self._start_pipeline(ctx, self._run_background_pipeline(ctx, request))
+            return SendTaskResponse(id=request.id, result=self.tasks.get(ctx.task_id))
+
+        # 步骤 2-4: 解析输入、执行 MCP 调用并格式化结果
+        # 流水线同样作为可取消的后台任务执行，这里等待它完成
+        pipeline = self._start_pipeline(ctx, self._run_mcp_pipeline(ctx, request))
+        try:
+            task_result_obj, input_parsing_failed = await pipeline
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling():
+                raise
+            # 流水线被 tasks/cancel 取消，返回已标记为 CANCELED 的任务
+            return SendTaskResponse(id=request.id, result=self.tasks.get(ctx.task_id))
+
+        if input_parsing_failed:
+            send_task_response_payload = SendTaskResponse(result=task_result_obj)
+            return A2AJSONRPCResponse(id=request.id, result=send_task_response_payload.model_dump(exclude_none=True))
+
+        # 构建 SendTaskResponse 实例，其 id 为原始请求的 id，result 为 Task 对象
+        send_task_response_obj = SendTaskResponse(
+            id=request.id, # 使用原始请求的 ID
+            result=task_result_obj # result 是 Task 实例
+        )
+
+        # 使用 SendTaskResponse 实例自身的 model_dump_json 用于调试日志
+        # 仅在 DEBUG 级别启用时才序列化，避免对大型结果做一次完整的 JSON 拷贝
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"任务 [{ctx.task_id}]: 最终响应对象 (SendTaskResponse): {send_task_response_obj.model_dump_json(exclude_none=True, indent=2)}")
+        
+        #直接返回 SendTaskResponse 实例
+        return send_task_response_obj
+
+    async def on_send_task_subscribe(
+        self, request: SendTaskStreamingRequest
+    ) -> Union[AsyncIterable[SendTaskStreamingResponse], A2AJSONRPCResponse]:
+        """
+        流式执行任务: 立即返回 SSE 事件流，任务在后台执行。
+        任务各阶段以 TaskStatusUpdateEvent 推送，MCP notifications/progress 被转发为 WORKING 更新，
+        最终结果以 TaskArtifactUpdateEvent 推送，随后是 final=True 的状态事件。
+        """
+        ctx = MCPCallContext(task_id=request.params.id, session_id=request.params.sessionId, streaming=True)
+
+        logger.info(f"任务 [{ctx.task_id}] (会话 [{ctx.session_id}]): 已接收 (流式)")
+
+        init_error_response = await self._initialize_task(ctx, request)
+        if init_error_response is not None:
+            return init_error_response
+
+        sse_event_queue = await self.setup_sse_consumer(ctx.task_id)
+        await self.enqueue_events_for_sse(
+            ctx.task_id,
+            TaskStatusUpdateEvent(id=ctx.task_id, status=TaskStatus(state=TaskState.SUBMITTED))
+        )
+
+        self._start_pipeline(ctx, self._run_streaming_pipeline(ctx, request))
+
+        return self.dequeue_events_for_sse(request.id, ctx.task_id, sse_event_queue)
+
+    async def _initialize_task(self, ctx: MCPCallContext, request: Union[SendTaskRequest, SendTaskStreamingRequest]) -> Optional[A2AJSONRPCResponse]:
+        """通过 upsert_task 创建或获取任务。成功时返回 None，失败时返回要发送给客户端的错误响应。"""
         try:
             # InMemoryTaskManager.upsert_task 期望 TaskSendParams，并自行处理初始状态
-            await self.upsert_task(request.params) 
-            logger.info(f"任务 [{self.task_id}]: 已通过 upsert_task 创建/获取，初始状态为 SUBMITTED。")
+            with span("task.upsert"):
+                await self.upsert_task(request.params)
+            logger.info(f"任务 [{ctx.task_id}]: 已通过 upsert_task 创建/获取，初始状态为 SUBMITTED。")
+            return None
+        except WebhookNotAllowedError as e:
+            logger.warning(f"任务 [{ctx.task_id}]: 拒绝注册的推送 webhook: {e}")
+            return A2AJSONRPCResponse(id=request.id, error=InvalidParamsError(message=str(e)).model_dump(exclude_none=True))
         except Exception as e:
-            logger.error(f"任务 [{self.task_id}]: 在 upsert_task 时发生严重错误: {e}", exc_info=True)
+            logger.error(f"任务 [{ctx.task_id}]: 在 upsert_task 时发生严重错误: {e}", exc_info=True)
             json_rpc_error = self._format_a2a_error_response(
                 request_id=request.id, #传递以备将来使用，但当前不由_format_a2a_error_response使用
                 code=-32002, 
@@ -67,16 +319,127 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
                 error=json_rpc_error.model_dump(exclude_none=True)
             )
 
+    async def _run_streaming_pipeline(self, ctx: MCPCallContext, request: SendTaskStreamingRequest) -> None:
+        try:
+            await self._run_mcp_pipeline(ctx, request)
+        except Exception as e:
+            logger.error(f"任务 [{ctx.task_id}]: 流式任务执行时发生意外错误: {e}", exc_info=True)
+            # 与后台任务相同，任务被标记为 FAILED，tasks/get 和重新订阅的客户端都能看到终态；
+            # final=True 的状态事件同时结束 SSE 流
+            await self._update_task(ctx, TaskStatus(
+                state=TaskState.FAILED,
+                message=Message(role="agent", parts=[TextPart(text=f"An error occurred while streaming the response: {e}")])
+            ), [])
+
+    async def _run_background_pipeline(self, ctx: MCPCallContext, request: SendTaskRequest) -> None:
+        try:
+            await self._run_mcp_pipeline(ctx, request)
+        except Exception as e:
+            logger.error(f"任务 [{ctx.task_id}]: 后台任务执行时发生意外错误: {e}", exc_info=True)
+            await self._update_task(ctx, TaskStatus(
+                state=TaskState.FAILED,
+                message=Message(role="agent", parts=[TextPart(text=f"An error occurred while processing the task: {e}")])
+            ), [])
+
+    def _start_pipeline(self, ctx: MCPCallContext, pipeline_coro: Any) -> asyncio.Task:
+        """在独立的 asyncio.Task 中执行任务流水线并登记，以便 tasks/cancel 和关闭服务器时取消它。"""
+        pipeline = asyncio.create_task(self._run_cancelable(ctx, pipeline_coro))
+        # 保留对后台任务的引用，防止其在完成前被垃圾回收
+        self._background_tasks.add(pipeline)
+        pipeline.add_done_callback(self._background_tasks.discard)
+        self._running_pipelines[ctx.task_id] = (pipeline, ctx)
+        pipeline.add_done_callback(functools.partial(self._forget_pipeline, ctx.task_id))
+        return pipeline
+
+    def _forget_pipeline(self, task_id: str, pipeline: asyncio.Task) -> None:
+        # 同一任务 ID 可能已开始新一轮流水线
+        if self._running_pipelines.get(task_id, (None,))[0] is pipeline:
+            del self._running_pipelines[task_id]
+
+    async def _run_cancelable(self, ctx: MCPCallContext, pipeline_coro: Any) -> Any:
+        """
+        流水线被取消时 (tasks/cancel、客户端断开或服务器关闭)，取消沿 await 链传到进行中的 MCP 请求，
+        其连接和调用名额随之释放；任务在流水线结束前标记为 CANCELED，等待者因此总能读到终态。
+        """
+        try:
+            return await pipeline_coro
+        except asyncio.CancelledError:
+            await self._mark_canceled(ctx)
+            raise
+
+    async def _mark_canceled(self, ctx: MCPCallContext) -> Optional[Task]:
+        task = self.tasks.get(ctx.task_id)
+        if task is None or task.status.state in TERMINAL_STATES:
+            return task
+        logger.info(f"任务 [{ctx.task_id}]: 已取消")
+        return await self._update_task(ctx, TaskStatus(
+            state=TaskState.CANCELED,
+            message=Message(role="agent", parts=[TextPart(text="Task canceled.")])
+        ), [])
+
+    async def on_cancel_task(self, request: CancelTaskRequest) -> CancelTaskResponse:
+        """取消正在执行的任务: 中止进行中的 MCP 调用并将任务标记为 CANCELED。已结束的任务不可取消。"""
+        running = self._running_pipelines.get(request.params.id)
+        if running is None:
+            return await super().on_cancel_task(request)
+        pipeline, ctx = running
+        pipeline.cancel()
+        await asyncio.gather(pipeline, return_exceptions=True)
+        if not pipeline.cancelled():
+            # 取消请求到达时流水线已经完成
+            return await super().on_cancel_task(request)
+        # 流水线在开始执行前就被取消时，_run_cancelable 没有机会标记任务
+        task = await self._mark_canceled(ctx)
+        return CancelTaskResponse(id=request.id, result=task)
+
+    async def _update_task(self, ctx: MCPCallContext, status: TaskStatus, artifacts: List[Artifact]) -> Task:
+        """
+        更新任务存储并推送对应的 SSE 事件。
+        终态更新会先推送每个 artifact 的 TaskArtifactUpdateEvent，再推送 final=True 的状态事件。
+        非流式任务同样推送，以便通过 tasks/resubscribe 中途订阅的客户端也能收到后续事件；
+        注册了推送通知的任务，事件同时投递到其 webhook。
+        """
+        with span("task.update_store", state=status.state.value):
+            task = await self.update_store(task_id=ctx.task_id, status=status, artifacts=artifacts)
+        if ctx.streaming or ctx.task_id in self.task_sse_subscribers or ctx.task_id in self.push_notification_infos:
+            final = status.state in TERMINAL_STATES
+            if final:
+                for artifact in artifacts:
+                    await self.enqueue_events_for_sse(ctx.task_id, TaskArtifactUpdateEvent(id=ctx.task_id, artifact=artifact))
+            await self.enqueue_events_for_sse(ctx.task_id, TaskStatusUpdateEvent(id=ctx.task_id, status=status, final=final))
+        return task
+
+    def _history_message(self, ctx: MCPCallContext, request: Union[SendTaskRequest, SendTaskStreamingRequest], path_label: str) -> List[Message]:
+        # 对 history 中的 Message 进行 dump 和 re-validate
+        if not request.params.message:
+            return []
+        message_dict = request.params.message.model_dump(exclude_none=True, by_alias=True)
+        try:
+            return [Message.model_validate(message_dict)]
+        except Exception as e_val:
+            logger.error(f"任务 [{ctx.task_id}]: 重新验证 history message ({path_label}) 时出错: {e_val}", exc_info=True)
+            return [request.params.message] # Fallback
+
+    async def _run_mcp_pipeline(self, ctx: MCPCallContext, request: Union[SendTaskRequest, SendTaskStreamingRequest]) -> Tuple[Task, bool]:
+        """
+        执行 parse → call → format 流水线并更新任务存储。
+        返回 (最终 Task 对象, 是否因 A2A 输入解析失败而结束)。
+        """
         # 步骤 2: 解析输入
         # _parse_a2a_input 应该返回 Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]
         # 如果解析失败，它返回 (None, JSONRPCError_object)
         # 如果成功，它返回 (parsed_params_dict, None)
-        # 我们需要将这些解析后的参数存储在实例变量中，供后续方法使用
+        # 解析后的参数会被记录到本任务的 ctx 中，供后续方法使用
         
-        parsed_params_dict, parsing_json_rpc_error = await self._parse_a2a_input(request)
+        batch_payloads = self._batch_command_payloads(request)
+        if batch_payloads is not None:
+            return await self._run_mcp_batch_pipeline(ctx, request, batch_payloads), False
+
+        with span("a2a.parse_input"):
+            parsed_params_dict, parsing_json_rpc_error = await self._parse_a2a_input(request)
 
         if parsing_json_rpc_error:
-            logger.warning(f"任务 [{self.task_id}]: A2A 输入解析失败: {parsing_json_rpc_error.message}")
+            logger.warning(f"任务 [{ctx.task_id}]: A2A 输入解析失败: {parsing_json_rpc_error.message}")
             
             # 使用现有的 _format_a2a_result_on_error
             # 它期望一个包含 "code", "message", "data" 的字典作为 error_details
@@ -87,86 +450,59 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
                 mcp_call_error_details=error_details_for_formatter,
                 mcp_request_id_echo=None # No MCP request was made yet
             )
-            
-            # 尝试的修改: 对 history 中的 Message 进行 dump 和 re-validate
-            re_validated_message_on_parse_error = None
-            if request.params.message:
-                message_dict_on_parse_error = request.params.message.model_dump(exclude_none=True, by_alias=True)
-                try:
-                    re_validated_message_on_parse_error = Message.model_validate(message_dict_on_parse_error)
-                except Exception as e_val:
-                    logger.error(f"任务 [{self.task_id}]: 重新验证 history message (解析错误路径) 时出错: {e_val}", exc_info=True)
-                    re_validated_message_on_parse_error = request.params.message # Fallback
-            
-            task_history_on_parse_error = [re_validated_message_on_parse_error] if re_validated_message_on_parse_error else []
 
             # 创建 Task 对象
             task_result_obj = Task(
-                id=self.task_id,
-                sessionId=self.session_id,
+                id=ctx.task_id,
+                sessionId=ctx.session_id,
                 status=failed_status,
                 artifacts=failed_artifacts,
-                history=task_history_on_parse_error
+                history=self._history_message(ctx, request, "解析错误路径")
             )
             
-            await self.update_store(
-                 task_id=task_result_obj.id,
-                 status=task_result_obj.status,
-                 artifacts=task_result_obj.artifacts if task_result_obj.artifacts else []
-            )
-            send_task_response_payload = SendTaskResponse(result=task_result_obj)
-            return A2AJSONRPCResponse(id=request.id, result=send_task_response_payload.model_dump(exclude_none=True))
+            await self._update_task(ctx, task_result_obj.status, task_result_obj.artifacts if task_result_obj.artifacts else [])
+            return task_result_obj, True
         
-        # 如果解析成功，设置实例变量供后续方法（如 _execute_mcp_call, _build_mcp_request_body）使用
-        self.mcp_target_url = parsed_params_dict["mcp_target_url"]
-        self.mcp_request_path = parsed_params_dict["mcp_request_path"]
-        self.mcp_method = parsed_params_dict["mcp_method"]
-        self.mcp_params = parsed_params_dict["mcp_params"]
-        self.mcp_request_id = parsed_params_dict.get("mcp_request_id") # .get 因为它是可选的
-
-        logger.info(f"任务 [{self.task_id}]: A2A 输入成功解析。准备执行 MCP 调用。")
+        # 如果解析成功，将 MCP 调用参数记录到本任务的上下文中，供后续方法（如 _execute_mcp_call）使用
+        self._apply_mcp_command(ctx, parsed_params_dict)
+        annotate_request("mcp", ctx.mcp_target_url)
+
+        logger.info(f"任务 [{ctx.task_id}]: A2A 输入成功解析。准备执行 MCP 调用。")
         status_after_parse = TaskStatus(
             state=TaskState.WORKING,
             progress=0.1,
             message=Message(role="agent", parts=[TextPart(text="A2A input parsed. Preparing MCP call.")])
         )
-        await self.update_store(task_id=self.task_id, status=status_after_parse, artifacts=[])
+        await self._update_task(ctx, status_after_parse, [])
 
         # 步骤 3: 执行 MCP 调用
-        mcp_result, mcp_error_details = await self._execute_mcp_call()
+        with span("mcp.call", mcp_target_url=ctx.mcp_target_url, mcp_method=ctx.mcp_method):
+            mcp_result, mcp_error_details = await self._execute_mcp_call(ctx)
         mcp_call_successful = mcp_result is not None and mcp_error_details is None
 
         if mcp_call_successful:
-            logger.info(f"任务 [{self.task_id}]: MCP 调用成功。")
+            logger.info(f"任务 [{ctx.task_id}]: MCP 调用成功。")
             status_after_mcp_success = TaskStatus(
                 state=TaskState.WORKING,
                 progress=0.7, 
                 message=Message(role="agent", parts=[TextPart(text="MCP call successful, formatting A2A result.")])
             )
-            await self.update_store(task_id=self.task_id, status=status_after_mcp_success, artifacts=[])
-            successful_status, successful_artifacts = self._format_a2a_result_from_mcp_response(mcp_result, self.mcp_request_id)
-            
-            # 尝试的修改: 对 history 中的 Message 进行 dump 和 re-validate
-            re_validated_message_on_success = None
-            if request.params.message:
-                message_dict_on_success = request.params.message.model_dump(exclude_none=True, by_alias=True)
-                try:
-                    re_validated_message_on_success = Message.model_validate(message_dict_on_success)
-                except Exception as e_val:
-                    logger.error(f"任务 [{self.task_id}]: 重新验证 history message (成功路径) 时出错: {e_val}", exc_info=True)
-                    re_validated_message_on_success = request.params.message # Fallback
-
-            task_history_on_success = [re_validated_message_on_success] if re_validated_message_on_success else []
+            await self._update_task(ctx, status_after_mcp_success, [])
+            with span("a2a.format_result"):
+                successful_status, successful_artifacts = self._format_a2a_result_from_mcp_response(mcp_result, ctx.mcp_request_id)
             
             task_result_obj = Task(
-                id=self.task_id,
-                sessionId=self.session_id,
+                id=ctx.task_id,
+                sessionId=ctx.session_id,
                 status=successful_status,
                 artifacts=successful_artifacts,
-                history=task_history_on_success
+                history=self._history_message(ctx, request, "成功路径")
             )
         else:
-            logger.error(f"任务 [{self.task_id}]: MCP 调用失败或返回错误。详细信息: {mcp_error_details}")
+            logger.error(f"任务 [{ctx.task_id}]: MCP 调用失败或返回错误。详细信息: {mcp_error_details}")
+            if isinstance(mcp_error_details, JSONRPCError):
+                # 保留错误码和 data (例如熔断器的 retry_after)，而不是只留下字符串形式
+                mcp_error_details = mcp_error_details.model_dump()
             error_code = "mcp_call_failed"
             error_message = str(mcp_error_details)
             error_data = None
@@ -177,72 +513,103 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
             
             status_on_mcp_fail, artifacts_on_mcp_fail = self._format_a2a_result_on_error(
                  mcp_call_error_details=mcp_error_details if isinstance(mcp_error_details, dict) else {"code": error_code, "message": error_message, "data": error_data},
-                 mcp_request_id_echo=self.mcp_request_id
+                 mcp_request_id_echo=ctx.mcp_request_id
             )
-            await self.update_store(task_id=self.task_id, status=status_on_mcp_fail, artifacts=artifacts_on_mcp_fail)
-            task_result_obj = await self.get_task(self.task_id)
+            # 失败结果在此一次性写入存储，步骤 4 不再重复写入 (否则 artifacts 会被追加两次)
+            task_result_obj = await self._update_task(ctx, status_on_mcp_fail, artifacts_on_mcp_fail)
             if task_result_obj is None: # Should not happen if update_store succeeded
-                # 尝试的修改: 对 history 中的 Message 进行 dump 和 re-validate (错误路径中的 fallback)
-                re_validated_message_on_mcp_fail_fallback = None
-                if request.params.message: # request 可能不存在于此更深层的作用域，假设它仍然可访问或使用类属性
-                    message_dict_on_mcp_fail_fallback = request.params.message.model_dump(exclude_none=True, by_alias=True)
-                    try:
-                        re_validated_message_on_mcp_fail_fallback = Message.model_validate(message_dict_on_mcp_fail_fallback)
-                    except Exception as e_val:
-                        logger.error(f"任务 [{self.task_id}]: 重新验证 history message (MCP失败回退路径) 时出错: {e_val}", exc_info=True)
-                        re_validated_message_on_mcp_fail_fallback = request.params.message # Fallback
-                
-                task_history_on_mcp_fail_fallback = [re_validated_message_on_mcp_fail_fallback] if re_validated_message_on_mcp_fail_fallback else []
-
-                task_result_obj = Task(id=self.task_id, sessionId=self.session_id, status=status_on_mcp_fail, artifacts=artifacts_on_mcp_fail, history=task_history_on_mcp_fail_fallback)
-
-        if task_result_obj is None: # Fallback
-            logger.error(f"任务 [{self.task_id}]: 未能格式化有效的 Task 对象。使用通用错误。")
-            # 为了安全，如果进入此分支，history 保持为空。
-            
-            # 修正：下面的调用是错误的，_format_a2a_result_on_error 期望字典
-            # general_failed_status, general_failed_artifacts = self._format_a2a_result_on_error(
-            #     {"code": "internal_formatting_error", "message": "Internal error: Failed to format A2A result."} # 示例错误字典
-            # )
-            # task_result_obj = Task(
-            #     id=self.task_id, 
-            #     sessionId=self.session_id, 
-            #     status=general_failed_status, 
-            #     artifacts=general_failed_artifacts, 
-            #     history=[] # 在这种通用错误情况下，history 为空
-            # )
-
-            # 保持原有逻辑，仅在task_result_obj已存在但history可能需要处理时考虑
-            # 但如果 task_result_obj 本身是 None，则创建它，此时 history 保持为空
-            general_failed_status = TaskStatus(state=TaskState.FAILED, message=Message(role="agent", parts=[TextPart(text="Internal error: Failed to format A2A result.")]))
-            task_result_obj = Task(
-                id=self.task_id,
-                sessionId=self.session_id,
-                status=general_failed_status,
-                artifacts=[], # No specific artifacts for this generic error
-                history=[] # Keep history empty for this very generic fallback
-            )
-        
-        # 步骤 4: 更新存储并返回最终响应
+                task_result_obj = Task(
+                    id=ctx.task_id,
+                    sessionId=ctx.session_id,
+                    status=status_on_mcp_fail,
+                    artifacts=artifacts_on_mcp_fail,
+                    history=self._history_message(ctx, request, "MCP失败回退路径")
+                )
+            logger.info(f"任务 [{ctx.task_id}]: 最终任务状态为 {status_on_mcp_fail.state.value}。")
+            return task_result_obj, False
+
+        # 步骤 4: 更新存储并返回最终结果
         final_status_to_log = task_result_obj.status.state.value if task_result_obj.status else TaskState.UNKNOWN.value
-        logger.info(f"任务 [{self.task_id}]: 最终任务状态为 {final_status_to_log}。准备更新存储并发送响应。")
-        await self.update_store(
-            task_id=task_result_obj.id, 
-            status=task_result_obj.status, 
-            artifacts=task_result_obj.artifacts if task_result_obj.artifacts else []
-        )
-        
-        # 构建 SendTaskResponse 实例，其 id 为原始请求的 id，result 为 Task 对象
-        send_task_response_obj = SendTaskResponse(
-            id=request.id, # 使用原始请求的 ID
-            result=task_result_obj # result 是 Task 实例
+        logger.info(f"任务 [{ctx.task_id}]: 最终任务状态为 {final_status_to_log}。准备更新存储并发送响应。")
+        await self._update_task(
+            ctx,
+            task_result_obj.status, 
+            task_result_obj.artifacts if task_result_obj.artifacts else []
         )
+        return task_result_obj, False
 
-        # 使用 SendTaskResponse 实例自身的 model_dump_json 用于调试日志
-        logger.debug(f"任务 [{self.task_id}]: 最终响应对象 (SendTaskResponse): {send_task_response_obj.model_dump_json(exclude_none=True, indent=2)}")
-        
-        #直接返回 SendTaskResponse 实例
-        return send_task_response_obj
+    @staticmethod
+    def _apply_mcp_command(ctx: MCPCallContext, parsed_params_dict: Dict[str, Any]) -> None:
+        ctx.mcp_target_url = parsed_params_dict["mcp_target_url"]
+        ctx.mcp_request_path = parsed_params_dict["mcp_request_path"]
+        ctx.mcp_method = parsed_params_dict["mcp_method"]
+        ctx.mcp_params = parsed_params_dict["mcp_params"]
+        ctx.mcp_request_id = parsed_params_dict.get("mcp_request_id") # .get 因为它是可选的
+        ctx.bypass_cache = parsed_params_dict.get("mcp_bypass_cache", False)
+        ctx.idempotent = parsed_params_dict.get("mcp_idempotent", False)
+
+    def _batch_command_payloads(self, request: Union[SendTaskRequest, SendTaskStreamingRequest]) -> Optional[List[Dict[str, Any]]]:
+        """
+        消息包含多个 DataPart 时为批量形式: 每个 DataPart 是一条独立的 MCP 命令 (字段同单条形式)。
+        返回各命令的 data 字典 (按出现顺序)；不是批量形式时返回 None。
+        """
+        message = request.params.message
+        payloads = [part.data for part in (message.parts if message else []) if isinstance(part, DataPart)]
+        return payloads if len(payloads) > 1 else None
+
+    async def _run_mcp_batch_pipeline(
+        self, ctx: MCPCallContext, request: Union[SendTaskRequest, SendTaskStreamingRequest], payloads: List[Dict[str, Any]]
+    ) -> Task:
+        """
+        执行批量形式的任务。发往同一目标的命令合并为一个 JSON-RPC 批量请求，不同目标并发请求。
+        每条命令产生一个 Artifact (index 为命令在消息中的序号)；单条命令失败 (包括参数无效)
+        只体现在它自己的 Artifact 中。全部命令失败时任务为 FAILED，否则为 COMPLETED。
+        """
+        commands: List[Optional[MCPCallContext]] = []
+        outcomes: List[Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]] = []
+        for payload in payloads:
+            parsed_params_dict, parsing_json_rpc_error = self._validate_mcp_command(payload)
+            if parsing_json_rpc_error is not None:
+                commands.append(None)
+                outcomes.append((None, parsing_json_rpc_error))
+                continue
+            command_ctx = MCPCallContext(task_id=ctx.task_id, session_id=ctx.session_id, streaming=ctx.streaming)
+            self._apply_mcp_command(command_ctx, parsed_params_dict)
+            commands.append(command_ctx)
+            outcomes.append((None, None))
+
+        valid_commands = [(i, command) for i, command in enumerate(commands) if command is not None]
+        annotate_request("mcp", ",".join(sorted({command.mcp_target_url for _, command in valid_commands})))
+        logger.info(f"任务 [{ctx.task_id}]: 批量输入包含 {len(payloads)} 条 MCP 命令，其中 {len(valid_commands)} 条有效。")
+        await self._update_task(ctx, TaskStatus(
+            state=TaskState.WORKING,
+            progress=0.1,
+            message=Message(role="agent", parts=[TextPart(text=f"A2A batch input parsed. Preparing {len(valid_commands)} MCP calls.")])
+        ), [])
+
+        batch_outcomes = await self._execute_mcp_batch([command for _, command in valid_commands])
+        for (i, _), outcome in zip(valid_commands, batch_outcomes):
+            outcomes[i] = outcome
+
+        artifacts = []
+        failed = 0
+        for index, (command, (mcp_result, mcp_error)) in enumerate(zip(commands, outcomes)):
+            mcp_request_id_echo = command.mcp_request_id if command is not None else None
+            if mcp_error is None:
+                _, command_artifacts = self._format_a2a_result_from_mcp_response(mcp_result, mcp_request_id_echo)
+            else:
+                failed += 1
+                _, command_artifacts = self._format_a2a_result_on_error(mcp_error.model_dump(), mcp_request_id_echo)
+            artifacts.extend(artifact.model_copy(update={"index": index}) for artifact in command_artifacts)
+
+        final_status = TaskStatus(
+            state=TaskState.FAILED if failed == len(payloads) else TaskState.COMPLETED,
+            message=Message(role="agent", parts=[TextPart(
+                text=f"MCP batch processed: {len(payloads) - failed} of {len(payloads)} calls succeeded."
+            )])
+        )
+        logger.info(f"任务 [{ctx.task_id}]: 批量任务最终状态为 {final_status.state.value} ({failed} 条命令失败)。")
+        return await self._update_task(ctx, final_status, artifacts)
 
     async def _parse_a2a_input(self, request: SendTaskRequest) -> Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]:
         """
@@ -254,6 +621,8 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
             - "mcp_params": dict (必需)
             - "mcp_request_path": str (可选, 默认为 "/messages/")
             - "mcp_request_id": str | int (可选)
+            - "mcp_bypass_cache": bool (可选, 为 True 时不使用响应缓存)
+            - "mcp_idempotent": bool (可选, 为 True 时允许对冲和重试该调用)
         """
         try:
             if not request.params.message.parts or len(request.params.message.parts) == 0:
@@ -282,61 +651,7 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
                 )
             
             # 现在 data_payload 是 first_part.data，并且我们知道它是一个字典
-            data_payload: Dict[str, Any] = first_part_data_attr
-            
-            required_fields = ["mcp_target_url", "mcp_method", "mcp_params"]
-            for field in required_fields:
-                if field not in data_payload: # 检查 data_payload
-                    return None, JSONRPCError(
-                        code=-32602,
-                        message=f"缺少必需字段: {field}",
-                        data={"detail": f"Missing required field: {field}"}
-                    )
-                
-            if not isinstance(data_payload["mcp_target_url"], str):
-                return None, JSONRPCError(
-                    code=-32602,
-                    message="mcp_target_url 必须是字符串",
-                    data={"detail": "mcp_target_url must be a string"}
-                )
-            
-            if not isinstance(data_payload["mcp_method"], str):
-                return None, JSONRPCError(
-                    code=-32602,
-                    message="mcp_method 必须是字符串",
-                    data={"detail": "mcp_method must be a string"}
-                )
-            
-            if not isinstance(data_payload["mcp_params"], dict):
-                return None, JSONRPCError(
-                    code=-32602,
-                    message="mcp_params 必须是字典",
-                    data={"detail": "mcp_params must be a dictionary"}
-                )
-            
-            # 检查可选字段的类型 (如果存在)
-            if "mcp_request_path" in data_payload and not isinstance(data_payload["mcp_request_path"], str):
-                return None, JSONRPCError(
-                    code=-32602,
-                    message="如果提供，mcp_request_path 必须是字符串",
-                    data={"detail": "mcp_request_path must be a string if provided"}
-                )
-
-            if "mcp_request_id" in data_payload and not isinstance(data_payload["mcp_request_id"], (str, int)):
-                 return None, JSONRPCError(
-                    code=-32602,
-                    message="如果提供，mcp_request_id 必须是字符串或整数",
-                    data={"detail": "mcp_request_id must be a string or integer if provided"}
-                )
-            
-            params = {
-                "mcp_target_url": data_payload["mcp_target_url"],
-                "mcp_method": data_payload["mcp_method"],
-                "mcp_params": data_payload["mcp_params"],
-                "mcp_request_path": data_payload.get("mcp_request_path", ""),
-                "mcp_request_id": data_payload.get("mcp_request_id")
-            }
-            return params, None
+            return self._validate_mcp_command(first_part_data_attr)
 
         except Exception as e:
             logger.error(f"解析 A2A 输入时发生错误: {str(e)}", exc_info=True)
@@ -345,7 +660,78 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
                 message="解析 A2A 输入时发生内部错误",
                 data={"detail": str(e)}
             )
+
+    def _validate_mcp_command(self, data_payload: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]:
+        """校验一个命令 DataPart 的 data 字典 (字段见 _parse_a2a_input)，返回参数字典或 JSONRPCError。"""
+        required_fields = ["mcp_target_url", "mcp_method", "mcp_params"]
+        for field in required_fields:
+            if field not in data_payload: # 检查 data_payload
+                return None, JSONRPCError(
+                    code=-32602,
+                    message=f"缺少必需字段: {field}",
+                    data={"detail": f"Missing required field: {field}"}
+                )
             
+        if not isinstance(data_payload["mcp_target_url"], str):
+            return None, JSONRPCError(
+                code=-32602,
+                message="mcp_target_url 必须是字符串",
+                data={"detail": "mcp_target_url must be a string"}
+            )
+        
+        if not isinstance(data_payload["mcp_method"], str):
+            return None, JSONRPCError(
+                code=-32602,
+                message="mcp_method 必须是字符串",
+                data={"detail": "mcp_method must be a string"}
+            )
+        
+        if not isinstance(data_payload["mcp_params"], dict):
+            return None, JSONRPCError(
+                code=-32602,
+                message="mcp_params 必须是字典",
+                data={"detail": "mcp_params must be a dictionary"}
+            )
+        
+        # 检查可选字段的类型 (如果存在)
+        if "mcp_request_path" in data_payload and not isinstance(data_payload["mcp_request_path"], str):
+            return None, JSONRPCError(
+                code=-32602,
+                message="如果提供，mcp_request_path 必须是字符串",
+                data={"detail": "mcp_request_path must be a string if provided"}
+            )
+
+        if "mcp_request_id" in data_payload and not isinstance(data_payload["mcp_request_id"], (str, int)):
+             return None, JSONRPCError(
+                code=-32602,
+                message="如果提供，mcp_request_id 必须是字符串或整数",
+                data={"detail": "mcp_request_id must be a string or integer if provided"}
+            )
+        
+        if "mcp_bypass_cache" in data_payload and not isinstance(data_payload["mcp_bypass_cache"], bool):
+            return None, JSONRPCError(
+                code=-32602,
+                message="如果提供，mcp_bypass_cache 必须是布尔值",
+                data={"detail": "mcp_bypass_cache must be a boolean if provided"}
+            )
+
+        if "mcp_idempotent" in data_payload and not isinstance(data_payload["mcp_idempotent"], bool):
+            return None, JSONRPCError(
+                code=-32602,
+                message="如果提供，mcp_idempotent 必须是布尔值",
+                data={"detail": "mcp_idempotent must be a boolean if provided"}
+            )
+
+        params = {
+            "mcp_target_url": data_payload["mcp_target_url"],
+            "mcp_method": data_payload["mcp_method"],
+            "mcp_params": data_payload["mcp_params"],
+            "mcp_request_path": data_payload.get("mcp_request_path", ""),
+            "mcp_request_id": data_payload.get("mcp_request_id"),
+            "mcp_bypass_cache": data_payload.get("mcp_bypass_cache", False),
+            "mcp_idempotent": data_payload.get("mcp_idempotent", False)
+        }
+        return params, None
 
     def _build_mcp_request_body(self, method: str, params: Dict[str, Any], request_id: Optional[str | int]) -> Dict[str, Any]:
         """
@@ -363,126 +749,416 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
         # exclude_none=True 确保可选字段为 None 时不包含在输出字典中
         return mcp_req_obj.model_dump(exclude_none=True)
 
-    async def _execute_mcp_call(self) -> Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]:
+    async def _handle_mcp_notification(self, ctx: MCPCallContext, notification: Dict[str, Any]) -> None:
+        """
+        处理 MCP 服务在调用过程中发出的通知:
+        列表变更/资源更新通知使该目标的响应缓存失效；
+        流式任务的 notifications/progress 转发为 WORKING 状态的 SSE 事件 (只推送给订阅者，不写入任务存储)。
+        """
+        self.response_cache.handle_notification(ctx.full_mcp_url, notification)
+        if not ctx.streaming or notification.get("method") != "notifications/progress":
+            logger.debug(f"任务 [{ctx.task_id}]: 忽略 MCP 通知 {notification.get('method')}")
+            return
+        try:
+            progress = mcp_types.ProgressNotification.model_validate(notification).params
+        except Exception as val_err:
+            logger.warning(f"任务 [{ctx.task_id}]: 无效的 MCP 进度通知: {val_err}")
+            return
+
+        progress_text = f"MCP progress: {progress.progress:g}" + (f"/{progress.total:g}" if progress.total is not None else "")
+        status_event = TaskStatusUpdateEvent(
+            id=ctx.task_id,
+            status=TaskStatus(
+                state=TaskState.WORKING,
+                message=Message(role="agent", parts=[TextPart(text=progress_text)])
+            ),
+            metadata={"progress": progress.progress, "total": progress.total}
+        )
+        await self.enqueue_events_for_sse(ctx.task_id, status_event)
+
+    async def _execute_mcp_call(self, ctx: MCPCallContext) -> Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]:
         """
         使用 mcp_client 发送 MCP 请求并处理 HTTP/网络错误。
+        所有调用参数都从传入的任务上下文 ctx 中读取，不依赖 manager 实例上的状态。
         返回 MCP 响应的 result 部分 (字典) 或一个用于 A2A 的 JSONRPCError。
+        只读方法先查询响应缓存，未命中时非流式调用与相同的并发调用合并。
         """
-        # 这些 self. 属性应该由 on_send_task 在调用此方法前通过 _parse_a2a_input 的结果设置
-        current_mcp_target_url = self.mcp_target_url 
-        current_mcp_request_path = self.mcp_request_path
-
-        full_mcp_url = current_mcp_target_url 
-        if current_mcp_request_path: # 仅当 current_mcp_request_path 非空时才进行拼接
-            processed_target_url = current_mcp_target_url.rstrip('/')
-            processed_request_path = current_mcp_request_path
-            if not processed_request_path.startswith('/'):
-                processed_request_path = '/' + processed_request_path
-            full_mcp_url = f"{processed_target_url}{processed_request_path}"
-        
-        # mcp_request_body 也应从 self. 属性或参数获取，这里假设 on_send_task 会准备好 self.mcp_request_body
-        # 或者 _build_mcp_request_body 使用 self. 属性
-        # 为了与现有代码兼容，我们假设 _build_mcp_request_body 使用 self.mcp_method, self.mcp_params, self.mcp_request_id
-        # 而这些 self. 属性是在 on_send_task 中，在调用 _execute_mcp_call 之前，从 _parse_a2a_input 的结果中设置的。
-        # 注意: 原代码中 _build_mcp_request_body 接收参数，_execute_mcp_call 中并没有直接使用 self.mcp_request_body
-        # 这里我们需要确保 mcp_request_body 被正确构建并传递给 send_mcp_request
-        # 假设 on_send_task 的逻辑是: 
-        #   parsed_data = await self._parse_a2a_input(...)
-        #   self.mcp_target_url = parsed_data["mcp_target_url"]
-        #   ...
-        #   self.mcp_request_body_dict = self._build_mcp_request_body(self.mcp_method, self.mcp_params, self.mcp_request_id)
-        #   result, error = await self._execute_mcp_call() <-- _execute_mcp_call 现在可以不接收参数，直接用 self. 属性
-        # 或者，保持 _execute_mcp_call 接收参数，但 on_send_task 要正确传递它们。
-        # 为了最小化改动并与您提供的 _execute_mcp_call 签名一致，它不接收这些参数。
-        # 因此，它必须依赖于 self.mcp_method, self.mcp_params, self.mcp_request_id 被设置。
-        
-        # 构建请求体，这里假设 _build_mcp_request_body 使用实例变量
-        # (这与您当前代码中 _build_mcp_request_body 的签名不同，它接收参数)
-        # 为了匹配 _execute_mcp_call 的逻辑，我们需要在 on_send_task 中先调用 _build_mcp_request_body
-        # 并将其结果 (一个字典) 传递给 _execute_mcp_call，或者让 _execute_mcp_call 内部调用它。
-        
-        # 我们将遵循 _execute_mcp_call 内部构建 request_body 的模式，假设相关 self 属性已设置
+        full_mcp_url = ctx.full_mcp_url
+        if not is_cacheable(ctx.mcp_method):
+            return await self._call_mcp_service(ctx)
+
+        cache_key = request_key(full_mcp_url, ctx.mcp_method, ctx.mcp_params)
+        if ctx.bypass_cache:
+            return await self._call_mcp_service(ctx, cache_key)
+        cached_result = self.response_cache.get(cache_key)
+        if cached_result is not None:
+            logger.info(f"任务 [{ctx.task_id}]: 命中 MCP 响应缓存 ({ctx.mcp_method} @ {full_mcp_url})")
+            return cached_result, None
+        if ctx.streaming:
+            # 进度通知的 progressToken 和转发目标都是发起调用的任务，
+            # 流式任务因此总是自己发出请求，既不加入也不接受其他任务的合并
+            return await self._call_mcp_service(ctx, cache_key)
+        # 相同的并发只读调用共享一次上游请求及其解析结果；
+        # 产物由每个任务自己格式化，因此 mcp_request_id_echo 仍是各自的请求 ID。
+        # 加入者不发请求，也不占用准入名额，这次请求只计入发起者的会话
+        return await self.single_flight.do(cache_key, functools.partial(self._call_mcp_service, ctx, cache_key))
+
+    async def _execute_mcp_batch(
+        self, commands: List[MCPCallContext]
+    ) -> List[Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]]:
+        """执行多条命令: 命中缓存的直接返回，其余按目标 URL 分组，每组一个 JSON-RPC 批量请求。返回与 commands 对应的结果。"""
+        outcomes: List[Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]] = [(None, None)] * len(commands)
+        groups: Dict[str, List[int]] = {}
+        for i, command in enumerate(commands):
+            if is_cacheable(command.mcp_method) and not command.bypass_cache:
+                cached_result = self.response_cache.get(request_key(command.full_mcp_url, command.mcp_method, command.mcp_params))
+                if cached_result is not None:
+                    outcomes[i] = (cached_result, None)
+                    continue
+            groups.setdefault(command.full_mcp_url, []).append(i)
+
+        async def run_group(indices: List[int]) -> None:
+            group = [commands[i] for i in indices]
+            if len(group) == 1:
+                command = group[0]
+                cache_key = request_key(command.full_mcp_url, command.mcp_method, command.mcp_params) if is_cacheable(command.mcp_method) else None
+                group_outcomes = [await self._call_mcp_service(command, cache_key)]
+            else:
+                group_outcomes = await self._call_mcp_service_batch(group)
+            for i, outcome in zip(indices, group_outcomes):
+                outcomes[i] = outcome
+
+        await asyncio.gather(*(run_group(indices) for indices in groups.values()))
+        return outcomes
+
+    async def _call_mcp_service_batch(
+        self, commands: List[MCPCallContext]
+    ) -> List[Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]]:
+        """将发往同一目标的多条命令作为一个 JSON-RPC 批量请求发送，按 id 把响应对应回各条命令。"""
+        full_mcp_url = commands[0].full_mcp_url
+        cache_generation = self.response_cache.generation(full_mcp_url)
+        request_bodies = []
+        used_ids = set()
+        for command in commands:
+            # 批量内的 id 必须唯一，才能把响应对应回命令；未提供或重复的 id 由网关生成 (回显的仍是任务提供的 id)
+            request_id = command.mcp_request_id
+            if request_id is None or request_id in used_ids:
+                request_id = str(uuid4())
+            used_ids.add(request_id)
+            request_bodies.append(self._build_mcp_request_body(command.mcp_method, command.mcp_params, request_id))
+
+        target_url = commands[0].mcp_target_url
+        started = None
+        try:
+            # 一个批量请求占用一个调用名额
+            async with self.circuit_breakers.guard(target_url), self.admission.slot(target_url, commands[0].session_id):
+                started = time.monotonic()
+                traceparent = current_traceparent()
+                raw_responses = await send_mcp_batch(
+                    full_mcp_url,
+                    request_bodies,
+                    client=self.client_registry.get_client(full_mcp_url),
+                    timeout=widest_timeout(
+                        self.latency_tracker.timeout(full_mcp_url, latency_key(command.mcp_method, command.mcp_params))
+                        for command in commands
+                    ),
+                    headers={TRACEPARENT_HEADER: traceparent} if traceparent is not None else None,
+                )
+        except BaseException as e:
+            self._record_upstream(target_url, BATCH_METHOD_LABEL, started, _upstream_outcome(e))
+            if not isinstance(e, Exception):
+                raise
+            return [(None, self._mcp_exception_error(e, full_mcp_url))] * len(commands)
+        self._record_upstream(
+            target_url, BATCH_METHOD_LABEL, started, "ok" if isinstance(raw_responses, list) else _response_outcome(raw_responses)
+        )
+
+        if not isinstance(raw_responses, list):
+            # 目标拒绝了整个批量请求 (例如不支持 JSON-RPC 批量)，通常返回单个错误对象
+            _, mcp_error = self._parse_mcp_response(raw_responses if isinstance(raw_responses, dict) else {}, full_mcp_url)
+            mcp_error = mcp_error or JSONRPCError(
+                code=mcp_types.INTERNAL_ERROR,
+                message="MCP 服务没有对批量请求返回响应数组",
+                data={"url": full_mcp_url}
+            )
+            return [(None, mcp_error)] * len(commands)
+
+        responses_by_id = {response.get("id"): response for response in raw_responses if isinstance(response, dict)}
+        outcomes = []
+        for command, request_body in zip(commands, request_bodies):
+            raw_response_dict = responses_by_id.get(request_body["id"])
+            if raw_response_dict is None:
+                outcomes.append((None, JSONRPCError(
+                    code=mcp_types.INTERNAL_ERROR,
+                    message="MCP 批量响应中缺少该请求的响应",
+                    data={"url": full_mcp_url, "mcp_request_id": request_body["id"]}
+                )))
+                continue
+            mcp_result, mcp_error = self._parse_mcp_response(raw_response_dict, full_mcp_url)
+            cache_key = request_key(full_mcp_url, command.mcp_method, command.mcp_params) if is_cacheable(command.mcp_method) else None
+            self._cache_mcp_result(command, cache_key, cache_generation, raw_response_dict, mcp_result, mcp_error)
+            outcomes.append((mcp_result, mcp_error))
+        return outcomes
+
+    async def _call_mcp_service(
+        self, ctx: MCPCallContext, cache_key: Optional[CacheKey] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]:
+        """发出一次 MCP 请求并解析响应。给出 cache_key 时，成功结果写入响应缓存。"""
+        full_mcp_url = ctx.full_mcp_url
+        cache_generation = self.response_cache.generation(full_mcp_url)
+        mcp_params = ctx.mcp_params
+        if ctx.streaming:
+            # 请求 MCP 服务通过 notifications/progress 报告进度，progressToken 使用 A2A 任务 ID
+            mcp_params = {**(mcp_params or {})}
+            mcp_params["_meta"] = {**mcp_params.get("_meta", {}), "progressToken": ctx.task_id}
+        # 始终接收通知，以便目标声明的变更能使响应缓存失效
+        on_notification = functools.partial(self._handle_mcp_notification, ctx)
         mcp_http_request_body = self._build_mcp_request_body(
-            method=self.mcp_method, 
-            params=self.mcp_params, 
-            request_id=self.mcp_request_id
+            method=ctx.mcp_method, 
+            params=mcp_params, 
+            request_id=ctx.mcp_request_id
         )
 
         try:
-            raw_response_dict = await send_mcp_request(full_mcp_url, mcp_http_request_body)
-
-            # 尝试将响应解析为 MCP JSON-RPC 错误或成功响应
-            # MCP 服务对于 JSON-RPC 级别的错误通常也返回 HTTP 200 OK
-            if "error" in raw_response_dict and "id" in raw_response_dict:
-                try:
-                    mcp_error_obj = mcp_types.JSONRPCError.model_validate(raw_response_dict)
-                    error_dict_for_a2a = {
-                        "code": mcp_error_obj.error.code,
-                        "message": mcp_error_obj.error.message,
-                        "data": mcp_error_obj.error.data
-                    }
-                    return None, JSONRPCError.model_validate(error_dict_for_a2a)
-                except Exception as val_err: 
-                    logger.warning(f"MCP响应看似错误, 但mcp_types.JSONRPCError验证失败: {val_err}. 回退到原始解析。URL: {full_mcp_url}")
-                    error_payload = raw_response_dict.get("error", {})
-                    fallback_error_dict = {
-                        "code": error_payload.get("code", mcp_types.INTERNAL_ERROR),
-                        "message": error_payload.get("message", "未知的MCP错误结构"),
-                        "data": error_payload.get("data")
-                    }
-                    return None, JSONRPCError.model_validate(fallback_error_dict)
-            elif "result" in raw_response_dict and "id" in raw_response_dict:
-                try:
-                    mcp_success_obj = mcp_types.JSONRPCResponse.model_validate(raw_response_dict)
-                    # 返回 MCP 响应中的 'result' 部分，它本身应该是一个字典
-                    if isinstance(mcp_success_obj.result, dict):
-                        return mcp_success_obj.result, None
+            raw_response_dict = await self._send_with_retries(ctx, mcp_http_request_body, on_notification)
+        except Exception as e:
+            return None, self._mcp_exception_error(e, full_mcp_url)
+
+        with span("mcp.validate_response"):
+            mcp_result, mcp_error = self._parse_mcp_response(raw_response_dict, full_mcp_url)
+        self._cache_mcp_result(ctx, cache_key, cache_generation, raw_response_dict, mcp_result, mcp_error)
+        return mcp_result, mcp_error
+
+    async def _send_with_retries(
+        self, ctx: MCPCallContext, mcp_http_request_body: Dict[str, Any], on_notification: Any
+    ) -> Dict[str, Any]:
+        """
+        发送请求并返回原始响应字典。幂等调用 (只读方法或 mcp_idempotent) 在配置了 hedge_policy 时
+        会对冲慢请求，并在暂时性错误后按带抖动的退避重试；第 n 次重试轮流发往主目标和各副本。
+        最后一次尝试的异常原样抛出，由调用方转换为 JSONRPCError。
+        """
+        policy = self.hedge_policy
+        if policy is None or not (ctx.idempotent or is_cacheable(ctx.mcp_method)):
+            return await self._send_attempt(ctx, ctx.mcp_target_url, mcp_http_request_body, on_notification)
+
+        policy.budget.record_request()
+        targets = policy.targets(ctx.mcp_target_url)
+        attempt = 0
+        while True:
+            target_url = targets[attempt % len(targets)]
+            try:
+                if policy.hedge and not ctx.streaming:
+                    # 流式任务的进度通知来自单个请求，不对冲
+                    hedge_target_url = targets[(attempt + 1) % len(targets)]
+                    return await self._send_hedged(ctx, target_url, hedge_target_url, mcp_http_request_body, on_notification)
+                return await self._send_attempt(ctx, target_url, mcp_http_request_body, on_notification)
+            except Exception as e:
+                # 熔断器打开时换一个副本重试是有意义的，只有一个目标时则没有
+                retryable = is_transient_error(e) or (isinstance(e, CircuitOpenError) and len(targets) > 1)
+                if attempt >= policy.max_retries or not retryable or not policy.budget.try_spend():
+                    raise
+                attempt += 1
+                policy.stats.retries += 1
+                logger.info(f"任务 [{ctx.task_id}]: MCP 调用 {ctx.mcp_method} @ {target_url} 失败 ({e!r})，第 {attempt} 次重试")
+                await asyncio.sleep(policy.backoff(attempt))
+
+    async def _send_hedged(
+        self,
+        ctx: MCPCallContext,
+        target_url: str,
+        hedge_target_url: str,
+        mcp_http_request_body: Dict[str, Any],
+        on_notification: Any,
+    ) -> Dict[str, Any]:
+        """发出一次尝试；若在目标的 p95 耗时内没有完成，向 hedge_target_url 再发一次，返回先成功的响应。"""
+        policy = self.hedge_policy
+        attempt_ctx = ctx if target_url == ctx.mcp_target_url else replace(ctx, mcp_target_url=target_url)
+        hedge_delay = self.latency_tracker.percentile(attempt_ctx.full_mcp_url, latency_key(ctx.mcp_method, ctx.mcp_params), 95)
+        if hedge_delay is None:
+            # 没有足够的耗时样本，无法判断什么算慢
+            return await self._send_attempt(ctx, target_url, mcp_http_request_body, on_notification)
+
+        first = asyncio.ensure_future(self._send_attempt(ctx, target_url, mcp_http_request_body, on_notification))
+        attempts = [first]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_delay)
+            if done or not policy.budget.try_spend():
+                return await first
+            policy.stats.hedges += 1
+            logger.debug(f"任务 [{ctx.task_id}]: {ctx.mcp_method} 超过 p95 ({hedge_delay:.3f}s) 未完成，向 {hedge_target_url} 发出对冲请求")
+            attempts.append(asyncio.ensure_future(self._send_attempt(ctx, hedge_target_url, mcp_http_request_body, on_notification)))
+
+            pending = set(attempts)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt_task in done:
+                    if attempt_task.exception() is None:
+                        if attempt_task is not first:
+                            policy.stats.hedge_wins += 1
+                        return attempt_task.result()
+                    last_error = attempt_task.exception()
+            raise last_error
+        finally:
+            # 输掉的 (或因任务被取消而放弃的) 尝试被取消，释放其准入名额和连接
+            losers = [attempt_task for attempt_task in attempts if not attempt_task.done()]
+            for attempt_task in losers:
+                attempt_task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    async def _send_attempt(
+        self, ctx: MCPCallContext, target_url: str, mcp_http_request_body: Dict[str, Any], on_notification: Any
+    ) -> Dict[str, Any]:
+        """向 target_url (ctx.mcp_target_url 或其副本) 发出一次请求，受该目标的熔断器和准入控制保护，并记录耗时。"""
+        attempt_ctx = ctx if target_url == ctx.mcp_target_url else replace(ctx, mcp_target_url=target_url)
+        full_mcp_url = attempt_ctx.full_mcp_url
+        method_key = latency_key(ctx.mcp_method, ctx.mcp_params)
+        started = None
+        try:
+            # 先检查熔断器，目标不可用时不必在准入队列中等待
+            # 熔断器和准入排队的等待时间是 mcp.call 与 mcp.http 两个 span 起点之间的间隔
+            async with self.circuit_breakers.guard(target_url), self.admission.slot(target_url, ctx.session_id):
+                started = time.monotonic()
+                with span("mcp.http", url=full_mcp_url) as http_span:
+                    timeout = self.latency_tracker.timeout(full_mcp_url, method_key)
+                    if self.batch_dispatcher is not None and not ctx.streaming:
+                        # 微批处理以普通 JSON 响应发送，不接收通知；流式任务需要进度通知，总是单独发送
+                        # 一个批量请求包含多个任务的调用，因此不携带 traceparent，超时取批内最宽松的值
+                        raw_response_dict = await self.batch_dispatcher.submit(
+                            full_mcp_url,
+                            mcp_http_request_body,
+                            client=self.client_registry.get_client(full_mcp_url),
+                            timeout=timeout
+                        )
                     else:
-                        # 如果 result 不是字典，可能需要根据具体业务调整
-                        # 例如，如果允许其他类型，或将其包装在字典中
-                        logger.warning(f"MCP响应的result字段不是预期的字典类型。URL: {full_mcp_url}, Result: {mcp_success_obj.result}")
-                        # 作为一种容错，如果result不是None，但也不是字典，我们将其作为data传递，但这可能需要进一步处理
-                        return {"non_dict_result": mcp_success_obj.result} if mcp_success_obj.result is not None else {}, None
-                except Exception as val_err: # Pydantic validation error
-                    logger.warning(f"MCP成功响应验证失败: {val_err}. 直接返回原始字典。URL: {full_mcp_url}")
-                    # 如果验证失败，但包含 result，仍返回原始字典（这部分是传给 _format_a2a_result_from_mcp_response）
-                    return raw_response_dict, None 
-            else:
-                # 响应既不完全符合JSONRPCError也不完全符合JSONRPCResponse的结构，但HTTP成功
-                logger.warning(f"MCP响应结构未知，但HTTP调用成功。URL: {full_mcp_url}, Response: {raw_response_dict}")
-                # 仍然将其视为成功传递给格式化函数，让它决定如何处理
-                return raw_response_dict, None
+                        traceparent = current_traceparent()
+                        raw_response_dict = await send_mcp_request(
+                            full_mcp_url,
+                            mcp_http_request_body,
+                            client=self.client_registry.get_client(full_mcp_url),
+                            on_notification=on_notification,
+                            timeout=timeout,
+                            headers={TRACEPARENT_HEADER: traceparent} if traceparent is not None else None
+                        )
+                    if http_span is not None:
+                        http_span.set_attribute("code", _response_outcome(raw_response_dict))
+                self.latency_tracker.observe(full_mcp_url, method_key, time.monotonic() - started)
+        except BaseException as e:
+            self._record_upstream(target_url, ctx.mcp_method, started, _upstream_outcome(e))
+            raise
+        self._record_upstream(target_url, ctx.mcp_method, started, _response_outcome(raw_response_dict))
+        return raw_response_dict
+
+    def _record_upstream(self, target_url: str, mcp_method: str, started: Optional[float], code: str) -> None:
+        """记录一次上游调用的结果；started 为 None 表示请求没有发出 (熔断、准入拒绝等)，不计入耗时。"""
+        if self._upstream_calls is None:
+            return
+        self._upstream_calls.inc(target_url, mcp_method, code)
+        if started is not None:
+            self._upstream_latency.observe(time.monotonic() - started, target_url, mcp_method)
+
+    def _cache_mcp_result(
+        self,
+        ctx: MCPCallContext,
+        cache_key: Optional[CacheKey],
+        cache_generation: int,
+        raw_response_dict: Dict[str, Any],
+        mcp_result: Optional[Dict[str, Any]],
+        mcp_error: Optional[JSONRPCError],
+    ) -> None:
+        if cache_key is not None and mcp_error is None and isinstance(raw_response_dict.get("result"), dict):
+            self.response_cache.put(cache_key, mcp_result, ctx.mcp_params, generation=cache_generation)
+
+    def _parse_mcp_response(self, raw_response_dict: Dict[str, Any], full_mcp_url: str) -> Tuple[Optional[Dict[str, Any]], Optional[JSONRPCError]]:
+        """将单个 MCP JSON-RPC 响应解析为 result 部分 (字典) 或一个用于 A2A 的 JSONRPCError。"""
+        # 尝试将响应解析为 MCP JSON-RPC 错误或成功响应
+        # MCP 服务对于 JSON-RPC 级别的错误通常也返回 HTTP 200 OK
+        if "error" in raw_response_dict and "id" in raw_response_dict:
+            try:
+                mcp_error_obj = mcp_types.JSONRPCError.model_validate(raw_response_dict)
+                error_dict_for_a2a = {
+                    "code": mcp_error_obj.error.code,
+                    "message": mcp_error_obj.error.message,
+                    "data": mcp_error_obj.error.data
+                }
+                return None, JSONRPCError.model_validate(error_dict_for_a2a)
+            except Exception as val_err: 
+                logger.warning(f"MCP响应看似错误, 但mcp_types.JSONRPCError验证失败: {val_err}. 回退到原始解析。URL: {full_mcp_url}")
+                error_payload = raw_response_dict.get("error", {})
+                fallback_error_dict = {
+                    "code": error_payload.get("code", mcp_types.INTERNAL_ERROR),
+                    "message": error_payload.get("message", "未知的MCP错误结构"),
+                    "data": error_payload.get("data")
+                }
+                return None, JSONRPCError.model_validate(fallback_error_dict)
+        elif "result" in raw_response_dict and "id" in raw_response_dict:
+            try:
+                mcp_success_obj = mcp_types.JSONRPCResponse.model_validate(raw_response_dict)
+                # 返回 MCP 响应中的 'result' 部分，它本身应该是一个字典
+                if isinstance(mcp_success_obj.result, dict):
+                    return mcp_success_obj.result, None
+                else:
+                    # 如果 result 不是字典，可能需要根据具体业务调整
+                    # 例如，如果允许其他类型，或将其包装在字典中
+                    logger.warning(f"MCP响应的result字段不是预期的字典类型。URL: {full_mcp_url}, Result: {mcp_success_obj.result}")
+                    # 作为一种容错，如果result不是None，但也不是字典，我们将其作为data传递，但这可能需要进一步处理
+                    return {"non_dict_result": mcp_success_obj.result} if mcp_success_obj.result is not None else {}, None
+            except Exception as val_err: # Pydantic validation error
+                logger.warning(f"MCP成功响应验证失败: {val_err}. 直接返回原始字典。URL: {full_mcp_url}")
+                # 如果验证失败，但包含 result，仍返回原始字典（这部分是传给 _format_a2a_result_from_mcp_response）
+                return raw_response_dict, None 
+        else:
+            # 响应既不完全符合JSONRPCError也不完全符合JSONRPCResponse的结构，但HTTP成功
+            logger.warning(f"MCP响应结构未知，但HTTP调用成功。URL: {full_mcp_url}, Response: {raw_response_dict}")
+            # 仍然将其视为成功传递给格式化函数，让它决定如何处理
+            return raw_response_dict, None
 
-        except httpx.HTTPError as e:
+    def _mcp_exception_error(self, e: Exception, full_mcp_url: str) -> JSONRPCError:
+        """将调用 MCP 服务时抛出的 HTTP/网络/解码异常转换为用于 A2A 的 JSONRPCError。"""
+        if isinstance(e, CircuitOpenError):
+            logger.warning(f"MCP 调用被熔断器拒绝 {full_mcp_url}: {e}")
+            return JSONRPCError(
+                code=TARGET_UNAVAILABLE_ERROR,
+                message=str(e),
+                data={"details": "MCP 目标连续失败，熔断器已打开", "url": full_mcp_url, "retry_after": round(e.retry_after, 3)}
+            )
+        if isinstance(e, AdmissionError):
+            logger.warning(f"MCP 调用未被准入 {full_mcp_url}: {e}")
+            return JSONRPCError(
+                code=SERVER_BUSY_ERROR,
+                message=str(e),
+                data={"details": "MCP 目标的并发名额已用尽", "url": full_mcp_url}
+            )
+        if isinstance(e, httpx.HTTPError):
             error_message = str(e)
             status_code = None
             # 安全地访问 e.response 和 e.response.status_code
             if hasattr(e, 'response') and e.response is not None:
                 status_code = e.response.status_code
             
-            logger.error(f"MCP HTTPError (状态码: {status_code if status_code else 'N/A'}) 调用 {full_mcp_url}: {error_message}", exc_info=True)
+            logger.error(f"MCP HTTPError (状态码: {status_code if status_code else 'N/A'}) 调用 {full_mcp_url}: {error_message}", exc_info=e)
             http_error_dict = {
                 "code": status_code or mcp_types.INTERNAL_ERROR,
                 "message": error_message, 
                 "data": {"details": f"MCP调用期间发生HTTP/网络层错误 (URL: {full_mcp_url})"}
             }
-            return None, JSONRPCError.model_validate(http_error_dict)
-        except ValueError as e: 
-            logger.error(f"MCP ValueError (JSON解码) 调用 {full_mcp_url}: {str(e)}", exc_info=True)
+            return JSONRPCError.model_validate(http_error_dict)
+        if isinstance(e, ValueError): 
+            logger.error(f"MCP ValueError (JSON解码) 调用 {full_mcp_url}: {str(e)}", exc_info=e)
             value_error_dict = {
                 "code": mcp_types.PARSE_ERROR,
                 "message": "MCP服务返回非JSON响应或格式错误的JSON。",
                 "data": {"details": str(e), "url": full_mcp_url}
             }
-            return None, JSONRPCError.model_validate(value_error_dict)
-        except Exception as e: 
-            logger.error(f"MCP调用期间发生意外错误 {full_mcp_url}: {str(e)}", exc_info=True)
-            unexpected_error_dict = {
-                "code": mcp_types.INTERNAL_ERROR,
-                "message": "与MCP服务通信时发生意外错误。",
-                "data": {"details": str(e), "url": full_mcp_url}
-            }
-            return None, JSONRPCError.model_validate(unexpected_error_dict)
+            return JSONRPCError.model_validate(value_error_dict)
+        logger.error(f"MCP调用期间发生意外错误 {full_mcp_url}: {str(e)}", exc_info=e)
+        unexpected_error_dict = {
+            "code": mcp_types.INTERNAL_ERROR,
+            "message": "与MCP服务通信时发生意外错误。",
+            "data": {"details": str(e), "url": full_mcp_url}
+        }
+        return JSONRPCError.model_validate(unexpected_error_dict)
 
     def _format_a2a_result_from_mcp_response(self, mcp_response_data: Dict[str, Any], mcp_request_id_echo: Optional[str | int]) -> Tuple[TaskStatus, List[Artifact]]:
         """
@@ -550,18 +1226,3 @@ class MCPGatewayAgentTaskManager(InMemoryTaskManager):
         )
         
         return final_task_status, [error_artifact]
-
-    async def on_send_task_subscribe(
-        self, request: SendTaskStreamingRequest
-    ) -> Union[AsyncIterable[SendTaskStreamingResponse], A2AJSONRPCResponse]:
-        """
-        此 Agent 不支持流式任务订阅。
-        """
-        logger.warning(
-            f"任务 [{request.params.id}] (会话 [{request.params.sessionId}]): "
-            f"尝试订阅流式任务，但此 Agent 不支持。"
-        )
-        return new_not_implemented_error(request.id)
-
-    
-    
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+多进程运行 MCPGatewayAgent，并保证任务 ID 亲和性。
+
+单个 uvicorn 进程只能使用一个 CPU 核心，而简单地开启多个 worker 会使
+tasks/get、tasks/cancel 等请求落到从未见过该任务的进程上。这里的做法是:
+
+  - 所有 worker 共享同一个监听 TCP 套接字，由内核在它们之间分配连接;
+  - 每个 worker 拥有 task ID 哈希空间中的一个分区 (crc32(task_id) % workers)，
+    只有所属 worker 的 InMemoryTaskManager 保存该任务;
+  - worker 收到不属于自己的任务请求时，将原始请求体通过本机 Unix 域套接字
+    转发给所属 worker，并把其响应 (包括 SSE 流) 原样返回给客户端。
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import zlib
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+import httpx
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from src.vendor.A2A.server.tracing import TRACEPARENT_HEADER, current_traceparent
+
+if TYPE_CHECKING:
+    from vendor.A2A.server import A2AServer
+
+logger = logging.getLogger(__name__)
+
+# 标记已转发的请求，所属 worker 收到后直接在本地处理，避免循环转发
+FORWARDED_HEADER = "x-a2a-forwarded-by"
+# 转发时保留的请求头
+_FORWARDED_REQUEST_HEADERS = ("content-type", "last-event-id")
+
+
+def task_owner(task_id: str, workers: int) -> int:
+    """返回拥有 task_id 的 worker 序号。使用 crc32 而非 hash()，以保证各进程结果一致。"""
+    return zlib.crc32(task_id.encode()) % workers
+
+
+def worker_socket_path(ipc_dir: str, worker_index: int) -> str:
+    return os.path.join(ipc_dir, f"worker-{worker_index}.sock")
+
+
+class WorkerRouter:
+    """
+    A2AServer 的 task_router: 决定请求在本 worker 处理还是转发给所属 worker。
+    每个目标 worker 使用一个经 Unix 域套接字连接的长连接客户端。
+    """
+
+    def __init__(self, worker_index: int, workers: int, ipc_dir: str):
+        self.worker_index = worker_index
+        self.workers = workers
+        self.ipc_dir = ipc_dir
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+
+    def is_local(self, task_id: str) -> bool:
+        return task_owner(task_id, self.workers) == self.worker_index
+
+    def _client(self, worker_index: int) -> httpx.AsyncClient:
+        client = self._clients.get(worker_index)
+        if client is None:
+            client = httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=worker_socket_path(self.ipc_dir, worker_index)),
+                base_url="http://a2a-worker",
+                # 所属 worker 会执行完整的 MCP 调用或保持 SSE 流，这里不设超时
+                timeout=None,
+            )
+            self._clients[worker_index] = client
+        return client
+
+    async def route(self, task_id: str, body: bytes, request: Request) -> Optional[Response]:
+        """本 worker 拥有该任务 (或请求已被转发过) 时返回 None，否则返回所属 worker 的响应。"""
+        if request.headers.get(FORWARDED_HEADER) is not None or self.is_local(task_id):
+            return None
+        owner = task_owner(task_id, self.workers)
+        headers = {name: request.headers[name] for name in _FORWARDED_REQUEST_HEADERS if name in request.headers}
+        headers[FORWARDED_HEADER] = str(self.worker_index)
+        # 所属 worker 的 span 接在本 worker 的请求 span 之下 (未追踪时原样转发客户端的 traceparent)
+        traceparent = current_traceparent()
+        if traceparent is not None:
+            headers[TRACEPARENT_HEADER] = traceparent
+
+        client = self._client(owner)
+        upstream = await client.send(client.build_request("POST", "/", content=body, headers=headers), stream=True)
+        response_headers = {"content-type": upstream.headers.get("content-type", "application/json")}
+        if response_headers["content-type"].startswith("text/event-stream"):
+            return StreamingResponse(
+                upstream.aiter_raw(),
+                status_code=upstream.status_code,
+                headers={**response_headers, "cache-control": "no-store"},
+                background=BackgroundTask(upstream.aclose),
+            )
+        try:
+            content = await upstream.aread()
+        finally:
+            await upstream.aclose()
+        return Response(content, status_code=upstream.status_code, headers=response_headers)
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+def serve_workers(
+    server_factory: Callable[[Optional[WorkerRouter]], "A2AServer"],
+    host: str,
+    port: int,
+    workers: int,
+    log_level: str = "info",
+) -> None:
+    """
+    以 workers 个进程运行 server_factory 创建的 A2AServer。
+    workers <= 1 时直接在当前进程中运行，不启用路由。
+    """
+    if workers <= 1:
+        server_factory(None).start()
+        return
+
+    listen_socket = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((host, port))
+    listen_socket.listen(2048)
+    listen_socket.set_inheritable(True)
+
+    ipc_dir = tempfile.mkdtemp(prefix="a2a-workers-")
+    # 在启动任何 worker 之前绑定所有 IPC 套接字，这样较早启动的 worker
+    # 转发给尚未就绪的 worker 时，连接会在 backlog 中等待而不是失败
+    ipc_sockets = []
+    for worker_index in range(workers):
+        ipc_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        ipc_socket.bind(worker_socket_path(ipc_dir, worker_index))
+        ipc_socket.listen(2048)
+        ipc_sockets.append(ipc_socket)
+
+    # fork: server_factory 通常是一个闭包，无需 pickle 即可传给子进程
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=_run_worker,
+            args=(server_factory, worker_index, workers, ipc_dir, listen_socket, ipc_sockets[worker_index], log_level),
+            name=f"a2a-worker-{worker_index}",
+        )
+        for worker_index in range(workers)
+    ]
+    logger.info(f"启动 {workers} 个 worker 进程于 http://{host}:{port} (IPC 目录: {ipc_dir})")
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        listen_socket.close()
+        for ipc_socket in ipc_sockets:
+            ipc_socket.close()
+        shutil.rmtree(ipc_dir, ignore_errors=True)
+
+
+def _run_worker(
+    server_factory: Callable[[Optional[WorkerRouter]], "A2AServer"],
+    worker_index: int,
+    workers: int,
+    ipc_dir: str,
+    listen_socket: socket.socket,
+    ipc_socket: socket.socket,
+    log_level: str,
+) -> None:
+    import uvicorn
+
+    router = WorkerRouter(worker_index, workers, ipc_dir)
+    server = server_factory(router)
+    config = uvicorn.Config(server.app, log_level=log_level)
+    logger.info(f"worker {worker_index}/{workers} (pid {os.getpid()}) 已启动")
+    uvicorn.Server(config).run(sockets=[listen_socket, ipc_socket])
@@ -0,0 +1,16 @@
+from src.vendor.A2A.server.task_manager import InMemoryTaskManager
+from src.vendor.A2A.types import Message, TaskSendParams, TextPart
+
+
+class StubTaskManager(InMemoryTaskManager):
+    """只用于测试存储、锁和事件分发的 InMemoryTaskManager：不实现任务执行。"""
+
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def send_params(task_id: str) -> TaskSendParams:
+    return TaskSendParams(id=task_id, message=Message(role="user", parts=[TextPart(text="hi")]))
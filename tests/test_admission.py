@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from src.translator.admission import AdmissionController, QueueFullError, QueueTimeoutError
+
+TARGET = "http://mcp-service.com"
+
+
+@pytest.mark.asyncio
+async def test_limits_concurrent_calls_per_target():
+    controller = AdmissionController(max_in_flight=2)
+    running = 0
+    peak = 0
+
+    async def call(target):
+        nonlocal running, peak
+        async with controller.slot(target):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    await asyncio.gather(*(call(TARGET) for _ in range(10)))
+    assert peak == 2
+    stats = controller.stats()[TARGET]
+    assert stats["admitted"] == 10 and stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    assert stats["queued"] == 8
+
+    # 另一个目标有自己的名额
+    peak = 0
+    await asyncio.gather(call(TARGET), call("http://other.com"))
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_queued_calls_are_admitted_round_robin_across_sessions():
+    controller = AdmissionController(max_in_flight=1)
+    order = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.slot(TARGET, "busy"):
+            await release.wait()
+
+    async def call(session_id, n):
+        async with controller.slot(TARGET, session_id):
+            order.append(f"{session_id}{n}")
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    # 会话 a 先排入 3 个调用，随后 b、c 各 1 个
+    waiters = [asyncio.create_task(call("a", n)) for n in range(3)]
+    waiters += [asyncio.create_task(call("b", 0)), asyncio.create_task(call("c", 0))]
+    await asyncio.sleep(0)
+    assert controller.stats()[TARGET]["queue_depth"] == 5
+    assert controller.stats()[TARGET]["queued_sessions"] == 3
+
+    release.set()
+    await asyncio.gather(holder, *waiters)
+    assert order == ["a0", "b0", "c0", "a1", "a2"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_queue_timeout_fail_fast():
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.slot(TARGET):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(controller.slot(TARGET).__aenter__())
+    await asyncio.sleep(0)
+
+    with pytest.raises(QueueFullError):
+        async with controller.slot(TARGET):
+            pass
+    with pytest.raises(QueueTimeoutError):
+        await waiter
+
+    release.set()
+    await holder
+    stats = controller.stats()[TARGET]
+    assert stats["rejected"] == 1 and stats["timed_out"] == 1
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+    assert stats["wait_time_max_s"] >= 0.01
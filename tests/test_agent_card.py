@@ -20,7 +20,7 @@ def test_def_get_mcp_gateway_agent_card_default_version():
     assert agent_card.version == DEFAULT_AGENT_VERSION # 验证默认版本
     
     assert isinstance(agent_card.capabilities, AgentCapabilities)
-    assert agent_card.capabilities.streaming is False
+    assert agent_card.capabilities.streaming is True
     assert agent_card.capabilities.pushNotifications is False
     
     assert isinstance(agent_card.provider, AgentProvider)
@@ -57,4 +57,10 @@ def test_def_get_mcp_gateway_agent_card_custom_version():
     assert agent_card.version == custom_version # 验证自定义版本
     # 其他字段的断言与默认版本测试类似，这里可以省略以保持简洁，
     # 除非版本变化会影响其他字段的生成逻辑（当前不会）。
-    assert agent_card.name == "MCP Gateway Agent" # 确保其他部分不变 
\ No newline at end of file
+    assert agent_card.name == "MCP Gateway Agent" # 确保其他部分不变 
+
+
+def test_def_get_mcp_gateway_agent_card_with_push_notifications():
+    agent_card = def_get_mcp_gateway_agent_card(host="localhost", port=8080, push_notifications=True)
+    assert agent_card.capabilities.pushNotifications is True
+
@@ -0,0 +1,328 @@
+import asyncio
+
+import pytest
+
+from src.vendor.A2A.server.task_manager import InMemoryTaskManager
+from src.vendor.A2A.server.retention import RetentionPolicy
+from src.vendor.A2A.server.sse import OverflowPolicy
+from src.vendor.A2A.types import (
+    Artifact,
+    DataPart,
+    GetTaskRequest,
+    PushNotificationConfig,
+    Message,
+    TaskArtifactUpdateEvent,
+    TaskIdParams,
+    TaskQueryParams,
+    TaskResubscriptionRequest,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+from tests.conftest import StubTaskManager, send_params
+
+
+@pytest.mark.asyncio
+async def test_task_locks_do_not_block_unrelated_tasks_or_readers():
+    """
+    一个任务的写锁被长时间持有时，其他任务的写入和所有读取都不应被阻塞。
+    """
+    manager = StubTaskManager(lock_stripes=2)
+    await manager.upsert_task(send_params("task-a"))
+    await manager.upsert_task(send_params("task-b"))
+
+    # 找一个与 task-a 不在同一分片的任务 ID
+    other_id = next(f"task-{i}" for i in range(100) if manager.task_lock(f"task-{i}") is not manager.task_lock("task-a"))
+    await manager.upsert_task(send_params(other_id))
+
+    async with manager.task_lock("task-a"):
+        updated = await asyncio.wait_for(
+            manager.update_store(other_id, TaskStatus(state=TaskState.WORKING), []), timeout=1
+        )
+        assert updated.status.state == TaskState.WORKING
+
+        response = await asyncio.wait_for(
+            manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id="task-a"))), timeout=1
+        )
+        assert response.result.id == "task-a"
+
+        # 同一任务的写入必须等待锁释放
+        blocked_write = asyncio.create_task(
+            manager.update_store("task-a", TaskStatus(state=TaskState.COMPLETED), [])
+        )
+        await asyncio.sleep(0.01)
+        assert not blocked_write.done()
+
+    await blocked_write
+    assert manager.tasks["task-a"].status.state == TaskState.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test_contended_task_lock_is_traced_as_lock_wait():
+    """追踪中的写入需要等待任务锁时记录 task.lock_wait span；锁空闲时不记录。"""
+    from src.vendor.A2A.server.tracing import InMemorySpanExporter, Tracer
+
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(sample_rate=1.0, exporter=exporter)
+    manager = StubTaskManager()
+    await manager.upsert_task(send_params("task-a"))
+
+    with tracer.start_span("a2a tasks/send"):
+        await manager.update_store("task-a", TaskStatus(state=TaskState.WORKING), [])
+        assert [s.name for s in exporter.finished_spans()] == []
+
+        async with manager.task_lock("task-a"):
+            blocked_write = asyncio.create_task(
+                manager.update_store("task-a", TaskStatus(state=TaskState.COMPLETED), [])
+            )
+            await asyncio.sleep(0.01)
+        await blocked_write
+
+    lock_wait, _ = exporter.finished_spans()
+    assert lock_wait.name == "task.lock_wait"
+    assert lock_wait.end_ns - lock_wait.start_ns >= 5_000_000
+
+
+async def _finish(manager: InMemoryTaskManager, task_id: str, artifacts=None):
+    await manager.upsert_task(send_params(task_id))
+    await manager.update_store(task_id, TaskStatus(state=TaskState.COMPLETED), artifacts or [])
+
+
+@pytest.mark.asyncio
+async def test_sweep_expires_terminal_tasks_after_ttl():
+    """
+    已结束任务超过 TTL 后被清理 (连同 push 配置)，进行中的任务永远保留。
+    """
+    manager = StubTaskManager(retention_policy=RetentionPolicy(terminal_ttl=0.05, max_tasks=None))
+    await _finish(manager, "done")
+    await manager.set_push_notification_info("done", PushNotificationConfig(url="http://hook.local"))
+    await manager.upsert_task(send_params("running"))
+
+    assert await manager.sweep_tasks() == 0
+    await asyncio.sleep(0.06)
+    assert await manager.sweep_tasks() == 1
+
+    assert "done" not in manager.tasks
+    assert "done" not in manager.push_notification_infos
+    assert "running" in manager.tasks
+    stats = manager.eviction_stats()
+    assert stats["expired"] == 1
+    assert stats["tasks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_sweep_enforces_lru_cap_on_terminal_tasks_only():
+    """
+    超过 max_tasks 时按 LRU 淘汰已结束任务；最近被读取的任务最后淘汰，进行中的任务不被淘汰。
+    """
+    manager = StubTaskManager(retention_policy=RetentionPolicy(terminal_ttl=None, max_tasks=2))
+    await manager.upsert_task(send_params("running"))
+    for task_id in ("old", "middle", "new"):
+        await _finish(manager, task_id)
+
+    # 读取 old 使其成为最近使用
+    await manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id="old")))
+
+    assert await manager.sweep_tasks() == 2
+    assert set(manager.tasks) == {"running", "old"}
+    assert manager.eviction_stats()["evicted_lru"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sweep_enforces_byte_budget():
+    """
+    超过近似字节预算时淘汰最久未使用的已结束任务。
+    """
+    big_artifact = Artifact(parts=[DataPart(data={"blob": "x" * 10_000})])
+    manager = StubTaskManager(retention_policy=RetentionPolicy(terminal_ttl=None, max_tasks=None, max_bytes=15_000))
+    await _finish(manager, "first", [big_artifact])
+    await _finish(manager, "second", [big_artifact])
+
+    assert await manager.sweep_tasks() == 1
+    assert set(manager.tasks) == {"second"}
+    stats = manager.eviction_stats()
+    assert stats["evicted_budget"] == 1
+    assert 10_000 < stats["approx_bytes"] <= 15_000
+
+
+@pytest.mark.asyncio
+async def test_background_sweeper_runs_between_startup_and_shutdown():
+    manager = StubTaskManager(retention_policy=RetentionPolicy(terminal_ttl=0, max_tasks=None, sweep_interval=0.01))
+    await manager.on_startup()
+    try:
+        await _finish(manager, "done")
+        await asyncio.sleep(0.05)
+        assert "done" not in manager.tasks
+        assert manager.eviction_stats()["sweeps"] > 0
+    finally:
+        await manager.on_shutdown()
+    assert manager._sweeper is None
+
+
+@pytest.mark.asyncio
+async def test_update_store_returns_stable_snapshots_without_deep_copy():
+    """
+    update_store 采用写时复制: 旧快照在后续更新后保持不变，
+    新快照与旧快照共享未改变的 artifact 对象 (未发生深拷贝)。
+    """
+    manager = StubTaskManager()
+    await manager.upsert_task(send_params("task-a"))
+    artifact = Artifact(parts=[DataPart(data={"rows": list(range(1000))})])
+
+    working = await manager.update_store("task-a", TaskStatus(state=TaskState.WORKING), [artifact])
+    status_message = Message(role="agent", parts=[TextPart(text="done")])
+    completed = await manager.update_store(
+        "task-a", TaskStatus(state=TaskState.COMPLETED, message=status_message), []
+    )
+
+    assert working.status.state == TaskState.WORKING
+    assert len(working.history) == 1
+    assert completed.status.state == TaskState.COMPLETED
+    assert len(completed.history) == 2
+    assert completed.artifacts[0] is artifact
+    assert manager.tasks["task-a"] is completed
+
+    response = await manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id="task-a", historyLength=1)))
+    assert response.result.history == [status_message]
+    assert response.result.artifacts[0] is artifact
+    assert len(manager.tasks["task-a"].history) == 2
+
+
+def _status_event(task_id: str, state: TaskState, final: bool = False) -> TaskStatusUpdateEvent:
+    return TaskStatusUpdateEvent(id=task_id, status=TaskStatus(state=state), final=final)
+
+
+@pytest.mark.asyncio
+async def test_resubscribe_replays_missed_events_then_follows_live_stream():
+    """
+    SSE 连接中断后重新订阅: 先补发断开期间错过的事件，再无缝衔接实时事件，且不重复。
+    """
+    manager = StubTaskManager()
+    await manager.upsert_task(send_params("task-r"))
+    queue = await manager.setup_sse_consumer("task-r")
+    first_stream = manager.dequeue_events_for_sse("req-1", "task-r", queue)
+
+    await manager.enqueue_events_for_sse("task-r", _status_event("task-r", TaskState.SUBMITTED))
+    first = await first_stream.__anext__()
+    seen_seq = first.result.metadata["seq"]
+    await first_stream.aclose()  # 客户端断开
+
+    await manager.enqueue_events_for_sse("task-r", _status_event("task-r", TaskState.WORKING))
+    await manager.enqueue_events_for_sse(
+        "task-r", TaskArtifactUpdateEvent(id="task-r", artifact=Artifact(parts=[TextPart(text="out")]))
+    )
+
+    resubscribed = await manager.on_resubscribe_to_task(
+        TaskResubscriptionRequest(id="req-2", params=TaskIdParams(id="task-r", metadata={"lastEventSeq": seen_seq}))
+    )
+    replayed = [await resubscribed.__anext__(), await resubscribed.__anext__()]
+    assert [r.result.metadata["seq"] for r in replayed] == [seen_seq + 1, seen_seq + 2]
+    assert replayed[0].result.status.state == TaskState.WORKING
+    assert replayed[1].result.artifact.parts[0].text == "out"
+
+    await manager.enqueue_events_for_sse("task-r", _status_event("task-r", TaskState.COMPLETED, final=True))
+    remaining = [r async for r in resubscribed]
+    assert len(remaining) == 1
+    assert remaining[0].id == "req-2"
+    assert remaining[0].result.final is True
+    assert manager.task_sse_subscribers["task-r"] == []
+
+
+@pytest.mark.asyncio
+async def test_resubscribe_after_buffer_expiry_returns_stored_outcome():
+    """
+    任务结束且超过宽限期后回放缓冲区被释放；此时重新订阅从存储的任务快照生成最终事件。
+    """
+    manager = StubTaskManager(replay_buffer_size=2, replay_grace=0.05)
+    await manager.upsert_task(send_params("task-e"))
+    await manager.setup_sse_consumer("task-e")
+    for state in (TaskState.SUBMITTED, TaskState.WORKING):
+        await manager.enqueue_events_for_sse("task-e", _status_event("task-e", state))
+    await manager.update_store("task-e", TaskStatus(state=TaskState.COMPLETED), [Artifact(parts=[TextPart(text="out")])])
+    await manager.enqueue_events_for_sse("task-e", _status_event("task-e", TaskState.COMPLETED, final=True))
+
+    # 缓冲区只保留最近的事件
+    buffered = manager.task_event_buffers["task-e"].since(0)
+    assert [e.metadata["seq"] for e in buffered] == [2, 3]
+
+    assert manager.prune_event_buffers() == 0
+    await asyncio.sleep(0.06)
+    await manager.sweep_tasks()
+    assert "task-e" not in manager.task_event_buffers
+
+    stream = await manager.on_resubscribe_to_task(TaskResubscriptionRequest(params=TaskIdParams(id="task-e")))
+    events = [r.result async for r in stream]
+    assert isinstance(events[0], TaskArtifactUpdateEvent)
+    assert events[-1].final is True
+    assert events[-1].status.state == TaskState.COMPLETED
+
+    missing = await manager.on_resubscribe_to_task(TaskResubscriptionRequest(params=TaskIdParams(id="unknown")))
+    assert missing.error.code == -32001
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "policy, expected_states, stat",
+    [
+        # 旧的状态更新被新的取代，artifact 保留
+        (OverflowPolicy.COALESCE, ["artifact", TaskState.INPUT_REQUIRED, TaskState.COMPLETED], "coalesced"),
+        # 丢弃最旧的非最终事件
+        (OverflowPolicy.DROP_OLDEST, ["artifact", TaskState.INPUT_REQUIRED, TaskState.COMPLETED], "dropped"),
+    ],
+)
+async def test_slow_subscriber_queue_is_bounded_by_overflow_policy(policy, expected_states, stat):
+    """
+    慢速订阅者的队列不会无限增长；发布者从不等待，最终事件总能送达。
+    """
+    manager = StubTaskManager(sse_queue_size=2, sse_overflow=policy)
+    await manager.upsert_task(send_params("task-s"))
+    queue = await manager.setup_sse_consumer("task-s")
+
+    await manager.enqueue_events_for_sse("task-s", _status_event("task-s", TaskState.WORKING))
+    await manager.enqueue_events_for_sse(
+        "task-s", TaskArtifactUpdateEvent(id="task-s", artifact=Artifact(parts=[TextPart(text="out")]))
+    )
+    await manager.enqueue_events_for_sse("task-s", _status_event("task-s", TaskState.INPUT_REQUIRED))
+    assert manager.sse_stats()["depth"] == 2
+
+    await manager.enqueue_events_for_sse("task-s", _status_event("task-s", TaskState.COMPLETED, final=True))
+
+    events = [r.result async for r in manager.dequeue_events_for_sse("req", "task-s", queue)]
+    states = ["artifact" if isinstance(e, TaskArtifactUpdateEvent) else e.status.state for e in events]
+    assert states == expected_states
+    stats = manager.sse_stats()
+    assert stats[stat] == 1
+    assert stats["max_depth"] == 3  # 最终事件可以超出容量
+    assert stats["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_disconnected_and_can_resubscribe():
+    """
+    DISCONNECT 策略关闭落后的流，不影响其他订阅者；客户端可以通过 resubscribe 补齐事件。
+    """
+    manager = StubTaskManager(sse_queue_size=1, sse_overflow=OverflowPolicy.DISCONNECT)
+    await manager.upsert_task(send_params("task-d"))
+    slow = await manager.setup_sse_consumer("task-d")
+    fast = await manager.setup_sse_consumer("task-d")
+    fast_stream = manager.dequeue_events_for_sse("req-fast", "task-d", fast)
+
+    await manager.enqueue_events_for_sse("task-d", _status_event("task-d", TaskState.SUBMITTED))
+    assert (await fast_stream.__anext__()).result.status.state == TaskState.SUBMITTED
+    await manager.enqueue_events_for_sse("task-d", _status_event("task-d", TaskState.WORKING))
+
+    assert slow.disconnected
+    assert manager.task_sse_subscribers["task-d"] == [fast]
+    assert [r async for r in manager.dequeue_events_for_sse("req-slow", "task-d", slow)] == []
+    assert manager.sse_stats()["disconnected"] == 1
+    assert (await fast_stream.__anext__()).result.status.state == TaskState.WORKING
+
+    resubscribed = await manager.on_resubscribe_to_task(
+        TaskResubscriptionRequest(params=TaskIdParams(id="task-d", metadata={"lastEventSeq": 0}))
+    )
+    await manager.enqueue_events_for_sse("task-d", _status_event("task-d", TaskState.COMPLETED, final=True))
+    await fast_stream.aclose()
+    states = [r.result.status.state async for r in resubscribed]
+    assert states == [TaskState.SUBMITTED, TaskState.WORKING, TaskState.COMPLETED]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.translator.mcp_batching import MCPBatchDispatcher
+from src.translator.mcp_client import MCPClientRegistry
+
+TARGET = "http://fake-mcp-service.com/mcp"
+
+
+def _request(request_id, method="tools/list"):
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": {}}
+
+
+def _registry(handler):
+    return MCPClientRegistry(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_batch_request():
+    seen_bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        seen_bodies.append(body)
+        return httpx.Response(200, json=[{"jsonrpc": "2.0", "id": item["id"], "result": {"echo": item["id"]}} for item in reversed(body)])
+
+    registry = _registry(handler)
+    dispatcher = MCPBatchDispatcher(window=0.01, max_batch_size=32)
+    # 不同任务可能使用相同的请求 id
+    request_ids = ["a", "b", "a", 7, "c"]
+    responses = await asyncio.gather(*(
+        dispatcher.submit(TARGET, _request(request_id), client=registry.get_client(TARGET)) for request_id in request_ids
+    ))
+
+    assert len(seen_bodies) == 1 and len(seen_bodies[0]) == 5
+    assert [response["id"] for response in responses] == request_ids
+    # 每个调用拿到的是自己那条请求的结果
+    assert [response["result"]["echo"] for response in responses] == [0, 1, 2, 3, 4]
+    stats = dispatcher.stats.as_dict()
+    assert stats["batches"] == 1 and stats["calls"] == 5
+    assert stats["size_histogram"]["le_8"] == 1
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_without_waiting_for_the_window():
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        return httpx.Response(200, json=[{"jsonrpc": "2.0", "id": item["id"], "result": {}} for item in body])
+
+    registry = _registry(handler)
+    dispatcher = MCPBatchDispatcher(window=60.0, max_batch_size=2)
+    responses = await asyncio.wait_for(asyncio.gather(
+        dispatcher.submit(TARGET, _request(1), client=registry.get_client(TARGET)),
+        dispatcher.submit(TARGET, _request(2), client=registry.get_client(TARGET)),
+    ), timeout=5)
+    assert [response["id"] for response in responses] == [1, 2]
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_single_requests_when_target_rejects_batches():
+    seen_bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        seen_bodies.append(body)
+        if isinstance(body, list):
+            return httpx.Response(400, json={"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Batch not supported"}})
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": {}})
+
+    registry = _registry(handler)
+    dispatcher = MCPBatchDispatcher(window=0.01)
+    responses = await asyncio.gather(*(
+        dispatcher.submit(TARGET, _request(i), client=registry.get_client(TARGET)) for i in range(3)
+    ))
+    assert [response["id"] for response in responses] == [0, 1, 2]
+    assert dispatcher.stats.fallbacks == 1
+
+    # 之后发往该目标的调用直接单独发送
+    seen_bodies.clear()
+    await dispatcher.submit(TARGET, _request(9), client=registry.get_client(TARGET))
+    assert seen_bodies == [_request(9)]
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_batch_request_uses_the_widest_timeout_of_its_calls():
+    """每条调用的 (自适应) 超时都会传下去: 批量请求取批内最宽松的读超时，单独发送时用自己的超时。"""
+    seen_read_timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_read_timeouts.append(request.extensions["timeout"]["read"])
+        body = json.loads(request.content)
+        if isinstance(body, list):
+            return httpx.Response(200, json=[{"jsonrpc": "2.0", "id": item["id"], "result": {}} for item in body])
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": {}})
+
+    registry = _registry(handler)
+    dispatcher = MCPBatchDispatcher(window=0.01)
+    await asyncio.gather(
+        dispatcher.submit(TARGET, _request(1), client=registry.get_client(TARGET), timeout=httpx.Timeout(30, read=1.5)),
+        dispatcher.submit(TARGET, _request(2), client=registry.get_client(TARGET), timeout=httpx.Timeout(30, read=4.0)),
+    )
+    await dispatcher.submit(TARGET, _request(3), client=registry.get_client(TARGET), timeout=httpx.Timeout(30, read=2.5))
+
+    assert seen_read_timeouts == [4.0, 2.5]
+    await registry.aclose()
@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+from src.translator.mcp_cache import MCPResponseCache, canonical_params, request_key
+
+TARGET = "http://mcp-service.com/mcp"
+
+
+def test_canonical_params_ignore_key_order_and_meta():
+    assert canonical_params({"b": 1, "a": {"y": 2, "x": 1}}) == canonical_params({"a": {"x": 1, "y": 2}, "b": 1})
+    assert canonical_params({"a": 1, "_meta": {"progressToken": "t"}}) == canonical_params({"a": 1})
+    assert canonical_params(None) == canonical_params({})
+
+
+def test_only_read_only_methods_are_cached():
+    cache = MCPResponseCache()
+    cache.put(request_key(TARGET, "tools/call", {"name": "x"}), {"content": []})
+    cache.put(request_key(TARGET, "tools/list", {}), {"tools": []})
+    assert len(cache) == 1
+
+
+def test_lru_eviction_and_ttl():
+    cache = MCPResponseCache(max_entries=2, ttl=10.0)
+    keys = [request_key(TARGET, "prompts/get", {"name": str(i)}) for i in range(3)]
+    with patch("src.translator.mcp_cache.time.monotonic", return_value=100.0):
+        cache.put(keys[0], {"i": 0})
+        cache.put(keys[1], {"i": 1})
+        assert cache.get(keys[0]) == {"i": 0}  # keys[1] 成为最久未使用
+        cache.put(keys[2], {"i": 2})
+        assert cache.get(keys[1]) is None
+        assert cache.stats.evictions == 1
+    with patch("src.translator.mcp_cache.time.monotonic", return_value=110.0):
+        assert cache.get(keys[0]) is None
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+
+
+def test_notifications_invalidate_matching_entries():
+    cache = MCPResponseCache()
+    tools = request_key(TARGET, "tools/list", {})
+    other_target = request_key("http://other.com/mcp", "tools/list", {})
+    readme = request_key(TARGET, "resources/read", {"uri": "file:///docs/readme.md"})
+    logo = request_key(TARGET, "resources/read", {"uri": "file:///img/logo.png"})
+    for key, params in ((tools, {}), (other_target, {}), (readme, {"uri": "file:///docs/readme.md"}), (logo, {"uri": "file:///img/logo.png"})):
+        cache.put(key, {"ok": True}, params)
+
+    assert cache.handle_notification(TARGET, {"method": "notifications/tools/list_changed"}) == 1
+    assert cache.get(tools) is None
+    assert cache.get(other_target) is not None
+
+    # 目录的更新通知使其下的资源失效
+    assert cache.handle_notification(TARGET, {"method": "notifications/resources/updated", "params": {"uri": "file:///docs/"}}) == 1
+    assert cache.get(readme) is None
+    assert cache.get(logo) is not None
+    assert cache.handle_notification(TARGET, {"method": "notifications/progress", "params": {}}) == 0
+
+
+def test_result_fetched_before_invalidation_is_not_stored():
+    cache = MCPResponseCache()
+    key = request_key(TARGET, "resources/list", {})
+    generation = cache.generation(TARGET)
+    cache.handle_notification(TARGET, {"method": "notifications/resources/list_changed"})
+    cache.put(key, {"resources": []}, generation=generation)
+    assert cache.get(key) is None
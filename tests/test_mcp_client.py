@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 import httpx
@@ -5,7 +6,7 @@ import json # 确保导入 json 以便在测试中使用 json.JSONDecodeError
 
 # 从你的项目中导入被测试的函数
 # 假设 src 目录在 PYTHONPATH 中，或者使用相对导入路径（如果测试文件在特定结构下）
-from src.translator.mcp_client import send_mcp_request
+from src.translator.mcp_client import send_mcp_request, send_mcp_batch, MCPClientRegistry, MCPClientPoolConfig, SingleFlight
 
 @pytest.mark.asyncio
 @patch("src.translator.mcp_client.httpx.AsyncClient")
@@ -223,8 +224,179 @@ async def test_send_mcp_request_response_not_json(mock_async_client_constructor:
     mock_response.raise_for_status.assert_called_once()
     mock_response.json.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_client_registry_reuses_client_per_origin():
+    """
+    测试 MCPClientRegistry 对同一源 (scheme, host, port) 复用同一个客户端，
+    对不同源创建独立客户端，并在 aclose 后关闭所有客户端。
+    """
+    registry = MCPClientRegistry(MCPClientPoolConfig(max_connections=7, max_keepalive_connections=3, keepalive_expiry=5.0))
+
+    client_a = registry.get_client("http://service-a.com:8001/mcp")
+    client_a_other_path = registry.get_client("http://service-a.com:8001/other/")
+    client_b = registry.get_client("http://service-b.com:8001/mcp")
+
+    assert client_a is client_a_other_path
+    assert client_a is not client_b
+    assert len(registry) == 2
+
+    await registry.aclose()
+    assert client_a.is_closed
+    assert client_b.is_closed
+    assert len(registry) == 0
+
+    # 关闭后再次获取时惰性创建新的客户端
+    reopened = registry.get_client("http://service-a.com:8001/mcp")
+    assert reopened is not client_a
+    assert not reopened.is_closed
+    await registry.aclose()
+
+@pytest.mark.asyncio
+async def test_send_mcp_request_with_shared_client_keeps_it_open():
+    """
+    测试通过 client 参数传入共享客户端时，send_mcp_request 使用该客户端发送请求，
+    不会构造新的 AsyncClient，也不会在调用结束后关闭共享客户端。
+    """
+    seen_requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_requests.append(request)
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": {"ok": True}})
+
+    registry = MCPClientRegistry(transport=httpx.MockTransport(handler))
+    client = registry.get_client("http://fake-mcp-service.com/mcp")
+
+    with patch("src.translator.mcp_client.httpx.AsyncClient") as mock_async_client_constructor:
+        for request_id in (1, 2):
+            response = await send_mcp_request(
+                "http://fake-mcp-service.com/mcp",
+                {"jsonrpc": "2.0", "method": "tools/list", "id": request_id},
+                headers={"X-Custom-Header": "TestValue"},
+                client=client,
+            )
+            assert response["id"] == request_id
+        mock_async_client_constructor.assert_not_called()
+
+    assert len(seen_requests) == 2
+    assert seen_requests[0].headers["X-Custom-Header"] == "TestValue"
+    assert not client.is_closed
+    await registry.aclose()
+
+@pytest.mark.asyncio
+async def test_send_mcp_request_streams_notifications_before_response():
+    """
+    测试提供 on_notification 时，SSE 响应中的通知逐条传给回调，
+    与请求 ID 匹配的消息作为返回值。
+    """
+    seen_accept = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_accept.append(request.headers["Accept"])
+        body = json.loads(request.content)
+        progress_token = body["params"]["_meta"]["progressToken"]
+        events = [
+            {"jsonrpc": "2.0", "method": "notifications/progress", "params": {"progressToken": progress_token, "progress": 1, "total": 2}},
+            {"jsonrpc": "2.0", "method": "notifications/progress", "params": {"progressToken": progress_token, "progress": 2, "total": 2}},
+            {"jsonrpc": "2.0", "id": body["id"], "result": {"ok": True}},
+        ]
+        stream_body = "".join(f"event: message\ndata: {json.dumps(event)}\n\n" for event in events)
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream_body.encode())
+
+    registry = MCPClientRegistry(transport=httpx.MockTransport(handler))
+    notifications = []
+
+    async def on_notification(message):
+        notifications.append(message)
+
+    response = await send_mcp_request(
+        "http://fake-mcp-service.com/mcp",
+        {"jsonrpc": "2.0", "method": "tools/call", "params": {"name": "slow", "_meta": {"progressToken": "task-1"}}, "id": 7},
+        client=registry.get_client("http://fake-mcp-service.com/mcp"),
+        on_notification=on_notification,
+    )
+
+    assert response == {"jsonrpc": "2.0", "id": 7, "result": {"ok": True}}
+    assert [n["params"]["progress"] for n in notifications] == [1, 2]
+    assert "text/event-stream" in seen_accept[0]
+    await registry.aclose()
+
 # 后续可以添加更多测试用例，例如：
 # - test_send_mcp_request_http_status_error_with_json_error_body
 # - test_send_mcp_request_http_status_error_non_json_body
 # - test_send_mcp_request_connect_error
-# - test_send_mcp_request_response_not_json 
\ No newline at end of file
+# - test_send_mcp_request_response_not_json 
+
+
+@pytest.mark.asyncio
+async def test_send_mcp_batch_posts_one_json_rpc_array():
+    seen_bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        seen_bodies.append(body)
+        return httpx.Response(200, json=[{"jsonrpc": "2.0", "id": item["id"], "result": {}} for item in reversed(body)])
+
+    registry = MCPClientRegistry(transport=httpx.MockTransport(handler))
+    requests = [{"jsonrpc": "2.0", "method": "tools/list", "id": request_id} for request_id in ("a", "b")]
+    responses = await send_mcp_batch("http://fake-mcp-service.com/mcp", requests, client=registry.get_client("http://fake-mcp-service.com/mcp"))
+
+    assert seen_bodies == [requests]
+    assert [response["id"] for response in responses] == ["b", "a"]
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_call_between_concurrent_callers():
+    single_flight = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"tools": []}
+
+    waiters = [asyncio.create_task(single_flight.do("key", call)) for _ in range(5)]
+    await asyncio.sleep(0)
+    # 发起调用的等待者被取消，不影响其他等待者
+    waiters[0].cancel()
+    release.set()
+    results = await asyncio.gather(*waiters[1:])
+
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert single_flight.stats.as_dict() == {"calls": 1, "shared": 4}
+    assert len(single_flight) == 0
+
+    # 调用结束后，相同的键会发起新的调用；异常同样被共享
+    async def failing_call():
+        raise httpx.ConnectError("connection refused")
+
+    outcomes = await asyncio.gather(*(single_flight.do("key", failing_call) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(outcome, httpx.ConnectError) for outcome in outcomes)
+    assert single_flight.stats.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancels_call_when_every_waiter_is_cancelled():
+    single_flight = SingleFlight()
+    call_cancelled = asyncio.Event()
+
+    async def call():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            call_cancelled.set()
+            raise
+
+    waiters = [asyncio.create_task(single_flight.do("key", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.wait_for(call_cancelled.wait(), 1)
+    await asyncio.sleep(0)
+    assert len(single_flight) == 0
+
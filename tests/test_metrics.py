@@ -0,0 +1,38 @@
+import pytest
+
+from src.vendor.A2A.server.metrics import MetricsRegistry
+
+
+def test_counters_and_histograms_render_in_prometheus_text_format():
+    metrics = MetricsRegistry(const_labels={"worker": "0"})
+    requests = metrics.counter("requests_total", "Requests.", ("method",))
+    latency = metrics.histogram("latency_seconds", "Latency.", ("method",), buckets=(0.1, 1.0))
+    metrics.callback_gauge("tasks", "Tasks.", lambda: 3)
+
+    requests.inc("tasks/send")
+    requests.inc("tasks/send")
+    requests.inc('odd"method')
+    latency.observe(0.05, "tasks/send")
+    latency.observe(0.1, "tasks/send")  # 边界值计入 le="0.1"
+    latency.observe(5.0, "tasks/send")
+
+    lines = metrics.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{method="tasks/send",worker="0"} 2' in lines
+    assert 'requests_total{method="odd\\"method",worker="0"} 1' in lines
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{method="tasks/send",worker="0",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{method="tasks/send",worker="0",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{method="tasks/send",worker="0",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{method="tasks/send",worker="0"} 3' in lines
+    assert 'latency_seconds_sum{method="tasks/send",worker="0"} 5.15' in lines
+    assert 'tasks{worker="0"} 3' in lines
+
+
+def test_registering_the_same_metric_twice_returns_the_existing_one():
+    """同名同标签的指标只注册一次 (例如多个组件注册同一个指标)；类型或标签不同时报错。"""
+    metrics = MetricsRegistry()
+    counter = metrics.counter("calls_total", "Calls.", ("code",))
+    assert metrics.counter("calls_total", "Calls.", ("code",)) is counter
+    with pytest.raises(ValueError):
+        metrics.histogram("calls_total", "Calls.", ("code",))
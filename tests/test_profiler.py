@@ -0,0 +1,82 @@
+import asyncio
+import signal
+import threading
+import time
+
+from src.vendor.A2A.server.profiler import SamplingProfiler, annotate_request
+
+
+def _burn_cpu(seconds: float) -> None:
+    deadline = time.process_time() + seconds
+    while time.process_time() < deadline:
+        pass
+
+
+def test_profile_attributes_samples_to_request_and_writes_collapsed_stacks(tmp_path):
+    """
+    采样按请求归属 (A2A 方法和 MCP 目标) 折叠为 collapsed stack，结束后恢复 SIGPROF；
+    结果在内存中返回，文件在工作线程中写入。
+    """
+    profiler = SamplingProfiler(output_dir=str(tmp_path), interval=0.001)
+    write_threads = []
+    write = profiler._write
+
+    def recording_write(collapsed):
+        write_threads.append(threading.current_thread() is threading.main_thread())
+        return write(collapsed)
+
+    profiler._write = recording_write
+
+    async def scenario():
+        annotate_request("mcp", "http://ignored")  # 未在采样时是空操作
+        done = profiler.start(requests=1)
+        token = profiler.enter_request("tasks/send")
+        annotate_request("mcp", "http://mcp.local/mcp")
+        _burn_cpu(0.2)
+        profiler.exit_request(token)
+        return await done
+
+    result = asyncio.run(scenario())
+    assert not profiler.active
+    assert signal.getitimer(signal.ITIMER_PROF) == (0.0, 0.0)
+    assert signal.getsignal(signal.SIGPROF) in (signal.SIG_DFL, None)
+
+    assert write_threads == [False]
+    with open(result.path, encoding="utf-8") as f:
+        assert f.read() == result.collapsed
+    lines = result.collapsed.splitlines()
+    attributed = [line for line in lines if "_burn_cpu" in line]
+    assert attributed and all(line.startswith("a2a:tasks/send;mcp:http://mcp.local/mcp;") for line in attributed)
+    stack, count = attributed[0].rsplit(" ", 1)
+    assert int(count) > 0
+    # 根在前: 调用 _burn_cpu 的协程帧在它之前
+    assert stack.index("scenario") < stack.index("_burn_cpu")
+
+
+def test_profile_stops_after_duration_without_traffic(tmp_path):
+    profiler = SamplingProfiler(output_dir=str(tmp_path), interval=0.001)
+
+    async def scenario():
+        done = profiler.start(duration=0.05)
+        started = time.monotonic()
+        result = await done
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert elapsed < 1 and not profiler.active
+    assert result.path.endswith(".collapsed")
+
+
+def test_profile_is_returned_even_if_the_file_cannot_be_written(tmp_path):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    profiler = SamplingProfiler(output_dir=str(blocker / "profiles"), interval=0.001)
+
+    async def scenario():
+        done = profiler.start(duration=0.05)
+        _burn_cpu(0.05)
+        return await done
+
+    result = asyncio.run(scenario())
+    assert result.path is None
+    assert "_burn_cpu" in result.collapsed
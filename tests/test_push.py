@@ -0,0 +1,164 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from src.vendor.A2A.server.push import NOTIFICATION_TOKEN_HEADER, PushNotificationSender, WebhookNotAllowedError
+from src.vendor.A2A.types import (
+    Artifact,
+    AuthenticationInfo,
+    Message,
+    PushNotificationConfig,
+    SetTaskPushNotificationRequest,
+    TaskArtifactUpdateEvent,
+    TaskPushNotificationConfig,
+    TaskSendParams,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+from tests.conftest import StubTaskManager
+
+
+class _WebhookReceiver:
+    """本地替身 webhook: 记录收到的请求，可以先返回若干个错误状态码。"""
+
+    def __init__(self, failures: tuple = ()):
+        self.requests = []
+        self.failures = list(failures)
+        self.app = Starlette(routes=[Route("/hook", self.handle, methods=["POST"])])
+
+    async def handle(self, request: Request):
+        if self.failures:
+            return JSONResponse({}, status_code=self.failures.pop(0))
+        self.requests.append((dict(request.headers), await request.json()))
+        return JSONResponse({"ok": True})
+
+    def sender(self, **kwargs) -> PushNotificationSender:
+        # client.local 不是公网主机，需要显式允许
+        kwargs.setdefault("allowed_hosts", ("client.local",))
+        return PushNotificationSender(transport=httpx.ASGITransport(app=self.app), **kwargs)
+
+
+def _status(task_id: str, state: TaskState, final: bool = False) -> TaskStatusUpdateEvent:
+    return TaskStatusUpdateEvent(id=task_id, status=TaskStatus(state=state), final=final)
+
+
+@pytest.mark.asyncio
+async def test_events_are_batched_coalesced_and_authenticated():
+    receiver = _WebhookReceiver()
+    sender = receiver.sender(batch_window=0.01)
+    config = PushNotificationConfig(
+        url="http://client.local/hook",
+        token="task-token",
+        authentication=AuthenticationInfo(schemes=["Bearer"], credentials="secret"),
+    )
+
+    sender.send(config, _status("t1", TaskState.SUBMITTED))
+    sender.send(config, _status("t1", TaskState.WORKING))  # 取代尚未发送的 SUBMITTED
+    sender.send(config, TaskArtifactUpdateEvent(id="t1", artifact=Artifact(parts=[TextPart(text="result")])))
+    sender.send(config, _status("t1", TaskState.COMPLETED, final=True))
+    await sender.aclose()
+
+    assert len(receiver.requests) == 1
+    headers, body = receiver.requests[0]
+    assert headers[NOTIFICATION_TOKEN_HEADER.lower()] == "task-token"
+    assert headers["authorization"] == "Bearer secret"
+    assert [event.get("status", {}).get("state") for event in body] == ["working", None, "completed"]
+    assert body[1]["artifact"]["parts"][0]["text"] == "result"
+    assert sender.stats.as_dict() == {
+        "queued": 4, "coalesced": 1, "dropped": 0, "delivered": 3, "requests": 1, "retries": 0, "failed": 0, "rejected": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried_and_permanent_errors_dropped():
+    receiver = _WebhookReceiver(failures=(503, 429))
+    sender = receiver.sender(batch_window=0, backoff_base=0.001)
+    config = PushNotificationConfig(url="http://client.local/hook")
+
+    sender.send(config, _status("t1", TaskState.COMPLETED, final=True))
+    while sender.pending() or sender.stats.delivered == 0:
+        await asyncio.sleep(0.001)
+    assert sender.stats.retries == 2
+    assert len(receiver.requests) == 1
+
+    receiver.failures = [400]
+    sender.send(config, _status("t2", TaskState.COMPLETED, final=True))
+    await sender.aclose()
+    assert sender.stats.failed == 1
+    assert sender.stats.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_task_manager_pushes_events_for_tasks_with_push_config():
+    """TaskSendParams.pushNotification 注册的 webhook 收到任务事件；未注册的任务不推送。"""
+    receiver = _WebhookReceiver()
+
+    manager = StubTaskManager(push_sender=receiver.sender(batch_window=0))
+    message = Message(role="user", parts=[TextPart(text="hi")])
+    await manager.upsert_task(TaskSendParams(
+        id="pushed", message=message, pushNotification=PushNotificationConfig(url="http://client.local/hook")
+    ))
+    await manager.upsert_task(TaskSendParams(id="silent", message=message))
+
+    for task_id in ("pushed", "silent"):
+        await manager.enqueue_events_for_sse(task_id, _status(task_id, TaskState.COMPLETED, final=True))
+    await manager.on_shutdown()
+
+    assert [event["id"] for _, body in receiver.requests for event in body] == ["pushed"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:8080/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://10.0.0.5/hook",
+    "http://0.0.0.0/hook",
+    "http://224.0.0.1/hook",
+    "ftp://client.local/hook",
+    "/hook",
+])
+async def test_webhook_urls_must_be_http_and_resolve_to_public_addresses(url):
+    sender = PushNotificationSender()
+    with pytest.raises(WebhookNotAllowedError):
+        await sender.check_url(url)
+    await sender.check_url("https://93.184.216.34/hook")
+    await PushNotificationSender(allowed_hosts=["LocalHost"]).check_url("http://localhost:8080/hook")
+    await PushNotificationSender(allow_private_networks=True).check_url("http://10.0.0.5/hook")
+    await sender.aclose()
+
+
+@pytest.mark.asyncio
+async def test_disallowed_webhooks_are_rejected_at_registration_and_delivery():
+    """注册时拒绝指向内网的 webhook (不记录配置)；发送前再次检查，检查不通过的事件不会发出。"""
+    receiver = _WebhookReceiver()
+    manager = StubTaskManager(push_sender=receiver.sender(batch_window=0))
+    message = Message(role="user", parts=[TextPart(text="hi")])
+    metadata_config = PushNotificationConfig(url="http://169.254.169.254/latest/meta-data")
+
+    with pytest.raises(WebhookNotAllowedError):
+        await manager.upsert_task(TaskSendParams(id="t1", message=message, pushNotification=metadata_config))
+    assert "t1" not in manager.tasks
+
+    await manager.upsert_task(TaskSendParams(id="t1", message=message))
+    response = await manager.on_set_task_push_notification(SetTaskPushNotificationRequest(
+        id="req-1", params=TaskPushNotificationConfig(id="t1", pushNotificationConfig=metadata_config)
+    ))
+    assert response.error.code == -32602
+    assert not await manager.has_push_notification_info("t1")
+
+    # 绕过注册检查的配置在发送前仍会被拦下
+    manager.push_sender.send(PushNotificationConfig(url="http://127.0.0.1/hook"), _status("t1", TaskState.COMPLETED, final=True))
+    await manager.on_shutdown()
+    assert receiver.requests == []
+    assert manager.push_sender.stats.rejected == 1
@@ -0,0 +1,127 @@
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from src.translator.resilience import (
+    CircuitBreakers,
+    CircuitOpenError,
+    CircuitState,
+    HedgePolicy,
+    LatencyTracker,
+    RetryBudget,
+    is_transient_error,
+    latency_key,
+)
+
+TARGET = "http://mcp-service.com"
+_CONNECT_ERROR = httpx.ConnectError("connection refused")
+
+
+async def _call(breakers, error=None):
+    async with breakers.guard(TARGET):
+        if error is not None:
+            raise error
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_consecutive_failures_and_recovers_through_half_open():
+    breakers = CircuitBreakers(failure_threshold=3, reset_timeout=10.0)
+    with patch("src.translator.resilience.time.monotonic", return_value=100.0):
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await _call(breakers, _CONNECT_ERROR)
+        await _call(breakers)  # 成功调用清零连续失败计数
+        for _ in range(3):
+            with pytest.raises(httpx.ConnectError):
+                await _call(breakers, _CONNECT_ERROR)
+        assert breakers.state(TARGET) == CircuitState.OPEN
+        with pytest.raises(CircuitOpenError) as excinfo:
+            await _call(breakers)
+        assert excinfo.value.retry_after == 10.0
+
+    with patch("src.translator.resilience.time.monotonic", return_value=111.0):
+        # 半开: 探测失败后重新打开
+        with pytest.raises(httpx.ConnectError):
+            await _call(breakers, _CONNECT_ERROR)
+        assert breakers.state(TARGET) == CircuitState.OPEN
+
+    with patch("src.translator.resilience.time.monotonic", return_value=122.0):
+        await _call(breakers)
+        assert breakers.state(TARGET) == CircuitState.CLOSED
+    assert breakers.stats()[TARGET]["opened"] == 2
+    assert breakers.stats()[TARGET]["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_only_target_failures_count():
+    breakers = CircuitBreakers(failure_threshold=1)
+    request = httpx.Request("POST", TARGET)
+    with pytest.raises(httpx.HTTPStatusError):
+        await _call(breakers, httpx.HTTPStatusError("bad request", request=request, response=httpx.Response(400, request=request)))
+    with pytest.raises(ValueError):
+        await _call(breakers, ValueError("not json"))
+    assert breakers.state(TARGET) == CircuitState.CLOSED
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await _call(breakers, httpx.HTTPStatusError("unavailable", request=request, response=httpx.Response(503, request=request)))
+    assert breakers.state(TARGET) == CircuitState.OPEN
+
+
+def test_read_timeout_follows_latency_within_bounds():
+    tracker = LatencyTracker(min_timeout=0.5, max_timeout=30.0, connect_timeout=2.0)
+    # 样本不足时使用上限
+    assert tracker.read_timeout(TARGET, "tools/list") == 30.0
+
+    for _ in range(64):
+        tracker.observe(TARGET, "tools/list", 0.2)
+    assert tracker.percentile(TARGET, "tools/list", 99) == pytest.approx(0.2)
+    assert tracker.read_timeout(TARGET, "tools/list") == pytest.approx(0.6)
+    timeout = tracker.timeout(TARGET, "tools/list")
+    assert timeout.connect == 2.0 and timeout.read == pytest.approx(0.6)
+
+    for _ in range(64):
+        tracker.observe(TARGET, "resources/list", 0.01)
+    assert tracker.read_timeout(TARGET, "resources/list") == 0.5
+
+    for _ in range(64):
+        tracker.observe(TARGET, "tools/call:slow", 20.0)
+    assert tracker.read_timeout(TARGET, "tools/call:slow") == 30.0
+
+
+def test_latency_key_separates_tools():
+    assert latency_key("tools/call", {"name": "search"}) == "tools/call:search"
+    assert latency_key("resources/read", {"uri": "file:///a"}) == "resources/read"
+
+
+def test_retry_budget_is_a_fraction_of_requests():
+    budget = RetryBudget(ratio=0.5, initial=1.0, max_tokens=2.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_spend()
+    for _ in range(10):
+        budget.record_request()
+    assert budget.tokens == 2.0
+    assert budget.exhausted == 1
+
+
+def test_only_connect_errors_and_5xx_are_transient():
+    request = httpx.Request("POST", TARGET)
+    assert is_transient_error(_CONNECT_ERROR)
+    assert is_transient_error(httpx.ConnectTimeout("timed out"))
+    assert is_transient_error(httpx.HTTPStatusError("unavailable", request=request, response=httpx.Response(503, request=request)))
+    # 读超时时请求可能已在目标上执行
+    assert not is_transient_error(httpx.ReadTimeout("timed out"))
+    assert not is_transient_error(httpx.HTTPStatusError("bad request", request=request, response=httpx.Response(400, request=request)))
+
+
+def test_hedge_policy_targets_and_jittered_backoff():
+    policy = HedgePolicy(replicas={TARGET: ["http://replica.com"]}, backoff_base=0.1, backoff_max=0.3)
+    assert policy.targets(TARGET) == [TARGET, "http://replica.com"]
+    assert policy.targets("http://other.com") == ["http://other.com"]
+    for attempt, cap in ((1, 0.1), (2, 0.2), (5, 0.3)):
+        delays = [policy.backoff(attempt) for _ in range(50)]
+        assert all(0 <= delay <= cap for delay in delays)
+
@@ -0,0 +1,255 @@
+import asyncio
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from src.translator.agent_card import def_get_mcp_gateway_agent_card
+from src.translator.task_manager import MCPGatewayAgentTaskManager
+from src.vendor.A2A.server import A2AServer
+from src.vendor.A2A.types import Message, TaskSendParams, TaskState, TaskStatus, TaskStatusUpdateEvent, TextPart
+
+
+def test_server_lifespan_opens_and_closes_task_manager():
+    """
+    测试 A2AServer 在启动/关闭时调用 task manager 的 on_startup/on_shutdown，
+    关闭时应释放 MCP 客户端注册表中的所有连接。
+    """
+    task_manager = MCPGatewayAgentTaskManager()
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=task_manager,
+    )
+
+    with TestClient(server.app) as client:
+        shared_client = task_manager.client_registry.get_client("http://fake-mcp-service.com/mcp")
+        response = client.get("/.well-known/agent.json")
+        assert response.status_code == 200
+        assert not shared_client.is_closed
+
+    assert shared_client.is_closed
+    assert len(task_manager.client_registry) == 0
+
+
+@pytest.fixture
+def client():
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=MCPGatewayAgentTaskManager(),
+    )
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+def test_process_request_returns_serialized_json_rpc_response(client: TestClient):
+    """
+    请求体一次性解码和校验后分派到 task manager，响应直接以 JSON 字节写出。
+    """
+    response = client.post(
+        "/",
+        content=b'{"jsonrpc": "2.0", "id": "req-1", "method": "tasks/get", "params": {"id": "missing-task"}}',
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    body = response.json()
+    assert body["id"] == "req-1"
+    assert body["error"]["code"] == -32001  # TaskNotFoundError
+    assert "result" not in body  # exclude_none
+
+
+def test_process_request_maps_malformed_json_to_parse_error(client: TestClient):
+    response = client.post("/", content=b'{"jsonrpc": "2.0", "id": ')
+
+    assert response.status_code == 400
+    body = response.json()
+    assert body["error"]["code"] == -32700
+    assert body["error"]["message"] == "Invalid JSON payload"
+
+
+def test_process_request_maps_invalid_request_to_validation_error(client: TestClient):
+    response = client.post("/", content=b'{"jsonrpc": "2.0", "id": 1, "method": "tasks/unknown", "params": {}}')
+
+    assert response.status_code == 400
+    body = response.json()
+    assert body["error"]["code"] == -32600
+    assert isinstance(body["error"]["data"], list)
+
+
+def test_get_agent_card(client: TestClient):
+    response = client.get("/.well-known/agent.json")
+
+    assert response.status_code == 200
+    assert response.json()["name"] == "MCP Gateway Agent"
+
+
+def test_resubscribe_maps_last_event_id_and_sets_sse_ids():
+    """
+    tasks/resubscribe: Last-Event-ID 请求头映射为 lastEventSeq，补发的每个事件都带有 SSE id。
+    """
+    task_manager = MCPGatewayAgentTaskManager()
+
+    async def publish_finished_task():
+        await task_manager.upsert_task(
+            TaskSendParams(id="task-1", message=Message(role="user", parts=[TextPart(text="hi")]))
+        )
+        await task_manager.setup_sse_consumer("task-1")
+        for state, final in ((TaskState.SUBMITTED, False), (TaskState.WORKING, False), (TaskState.COMPLETED, True)):
+            await task_manager.enqueue_events_for_sse(
+                "task-1", TaskStatusUpdateEvent(id="task-1", status=TaskStatus(state=state), final=final)
+            )
+
+    asyncio.run(publish_finished_task())
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=task_manager,
+    )
+
+    with TestClient(server.app) as client:
+        response = client.post(
+            "/",
+            content=b'{"jsonrpc": "2.0", "id": "req-1", "method": "tasks/resubscribe", "params": {"id": "task-1"}}',
+            headers={"Last-Event-ID": "1"},
+        )
+
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert [line for line in lines if line.startswith("id:")] == ["id: 2", "id: 3"]
+    events = [json.loads(line[len("data:"):]) for line in lines if line.startswith("data:")]
+    assert [e["result"]["status"]["state"] for e in events] == ["working", "completed"]
+
+
+def test_metrics_endpoint_reports_requests_and_task_gauges(client: TestClient):
+    """/metrics 按 A2A 方法报告请求数和耗时直方图，并在抓取时读取任务数、SSE 订阅数等实时状态。"""
+    client.post("/", content=b'{"jsonrpc": "2.0", "id": "req-1", "method": "tasks/get", "params": {"id": "missing-task"}}')
+    client.post("/", content=b'{"jsonrpc": "2.0", "id": ')
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert 'a2a_requests_total{method="tasks/get",outcome="error"} 1' in lines
+    assert 'a2a_requests_total{method="invalid",outcome="error"} 1' in lines
+    assert 'a2a_request_duration_seconds_count{method="tasks/get"} 1' in lines
+    assert 'a2a_requests_in_flight{method="tasks/get"} 0' in lines
+    assert "a2a_tasks 0" in lines
+    assert "a2a_tasks_in_flight 0" in lines
+    assert "a2a_sse_subscribers 0" in lines
+    assert "mcp_pipelines_running 0" in lines
+
+
+def test_metrics_endpoint_can_be_disabled():
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=MCPGatewayAgentTaskManager(),
+        metrics_path=None,
+    )
+    with TestClient(server.app) as test_client:
+        assert test_client.get("/metrics").status_code == 404
+
+
+def test_tasks_send_is_traced_per_phase_and_propagates_traceparent_to_mcp():
+    """采样的 tasks/send 为每个阶段生成 span，发往 MCP 的请求携带 mcp.http span 的 traceparent。"""
+    import httpx
+
+    from src.translator.mcp_client import MCPClientRegistry
+    from src.vendor.A2A.server.tracing import InMemorySpanExporter, Tracer
+
+    mcp_headers = []
+
+    def mcp_service(request: httpx.Request) -> httpx.Response:
+        mcp_headers.append(request.headers)
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": {"content": []}})
+
+    exporter = InMemorySpanExporter()
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=MCPGatewayAgentTaskManager(client_registry=MCPClientRegistry(transport=httpx.MockTransport(mcp_service))),
+        tracer=Tracer(sample_rate=1.0, exporter=exporter),
+    )
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    body = {
+        "jsonrpc": "2.0", "id": "req-1", "method": "tasks/send",
+        "params": {"id": "traced-task", "message": {"role": "user", "parts": [{"type": "data", "data": {
+            "mcp_target_url": "http://mcp.local/mcp", "mcp_method": "tools/call", "mcp_params": {"name": "echo"},
+        }}]}},
+    }
+    with TestClient(server.app) as test_client:
+        response = test_client.post("/", json=body, headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+    assert response.json()["result"]["status"]["state"] == "completed"
+
+    spans = {s.name: s for s in exporter.finished_spans(trace_id)}
+    assert {"a2a tasks/send", "task.upsert", "a2a.parse_input", "mcp.call", "mcp.http",
+            "mcp.validate_response", "a2a.format_result", "task.update_store"} <= set(spans)
+    root = spans["a2a tasks/send"]
+    assert root.parent_id == "00f067aa0ba902b7" and root.attributes["outcome"] == "ok"
+    assert spans["mcp.http"].parent_id == spans["mcp.call"].context.span_id
+    assert spans["mcp.http"].attributes["code"] == "ok"
+    assert mcp_headers[0]["traceparent"] == f"00-{trace_id}-{spans['mcp.http'].context.span_id}-01"
+
+
+def test_admin_profile_endpoint_requires_token_and_attributes_requests(tmp_path):
+    """POST /admin/profile 需要管理令牌；返回的 collapsed stack 按 A2A 方法和 MCP 目标归属。"""
+    import time
+
+    import httpx
+
+    from src.translator.mcp_client import MCPClientRegistry
+    from src.vendor.A2A.server.profiler import SamplingProfiler
+
+    def slow_mcp_service(request: httpx.Request) -> httpx.Response:
+        deadline = time.process_time() + 0.2
+        while time.process_time() < deadline:
+            pass
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": {"content": []}})
+
+    task_manager = MCPGatewayAgentTaskManager(client_registry=MCPClientRegistry(transport=httpx.MockTransport(slow_mcp_service)))
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=task_manager,
+        profiler=SamplingProfiler(output_dir=str(tmp_path), interval=0.001),
+        admin_token="secret",
+    )
+    body = {
+        "jsonrpc": "2.0", "id": "req-1", "method": "tasks/send",
+        "params": {"id": "profiled-task", "message": {"role": "user", "parts": [{"type": "data", "data": {
+            "mcp_target_url": "http://mcp.local/mcp", "mcp_method": "tools/call", "mcp_params": {"name": "echo"},
+        }}]}},
+    }
+
+    async def scenario():
+        # 信号处理和 SIGPROF 只能在主线程中使用，所以不用 TestClient (它在另一个线程中运行应用)
+        await task_manager.on_startup()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://gateway.local") as client:
+            assert (await client.post("/admin/profile?requests=1")).status_code == 401
+            assert (await client.post("/admin/profile?requests=0", headers={"Authorization": "Bearer secret"})).status_code == 400
+            profile = asyncio.create_task(client.post("/admin/profile?requests=1", headers={"Authorization": "Bearer secret"}))
+            while not server.profiler.active:
+                await asyncio.sleep(0)
+            assert (await client.post("/", json=body)).json()["result"]["status"]["state"] == "completed"
+            response = await profile
+        await task_manager.on_shutdown()
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["x-profile-file"].startswith(str(tmp_path))
+    with open(response.headers["x-profile-file"], encoding="utf-8") as f:
+        assert f.read() == response.text
+    lines = [line for line in response.text.splitlines() if "slow_mcp_service" in line]
+    assert lines and all(line.startswith("a2a:tasks/send;mcp:http://mcp.local/mcp;") for line in lines)
+    assert not server.profiler.active
+
+
+def test_admin_profile_endpoint_is_absent_without_token():
+    from src.vendor.A2A.server.profiler import SamplingProfiler
+
+    server = A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=MCPGatewayAgentTaskManager(),
+        profiler=SamplingProfiler(),
+    )
+    with TestClient(server.app) as test_client:
+        assert test_client.post("/admin/profile", headers={"Authorization": "Bearer "}).status_code in (404, 405)
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 import uuid
@@ -16,7 +18,10 @@ from src.vendor.A2A.types import (
     TaskState,
     Artifact,
     JSONRPCError as A2AJSONRPCError,
-    TaskSendParams
+    TaskSendParams,
+    SendTaskStreamingRequest,
+    TaskStatusUpdateEvent,
+    TaskArtifactUpdateEvent
 )
 from src.vendor.MCP import types as mcp_types
 
@@ -510,6 +515,26 @@ async def test_on_send_task_mcp_network_error(task_manager: MCPGatewayAgentTaskM
     # 6. 断言 send_mcp_request 被正确调用
     mock_send_mcp_request.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_on_send_task_mcp_failure_is_written_to_the_store_once(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """MCP 调用失败时失败结果只写入存储一次: 1 个 artifact，失败状态消息在 history 中只出现一次。"""
+    mcp_target_url = "http://unreachable-mcp-service.com"
+    request = SendTaskRequest(id="req-fail-once", params=TaskSendParams(id="task-fail-once", message=Message(role="user", parts=[DataPart(data={
+        "mcp_target_url": mcp_target_url, "mcp_method": "tools/call", "mcp_params": {"name": "any_tool"},
+    })])))
+    mock_send_mcp_request.side_effect = httpx.ConnectError(
+        "Connection refused", request=httpx.Request(method="POST", url=mcp_target_url)
+    )
+
+    await task_manager.on_send_task(request)
+
+    stored_task = task_manager.tasks["task-fail-once"]
+    assert stored_task.status.state == TaskState.FAILED
+    assert len(stored_task.artifacts) == 1
+    # 用户消息、"A2A input parsed" 状态消息、失败状态消息
+    assert len(stored_task.history) == 3
+    assert sum(message == stored_task.status.message for message in stored_task.history) == 1
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "missing_field", ["mcp_target_url", "mcp_method", "mcp_params"]
@@ -653,7 +678,600 @@ async def test_on_send_task_invalid_a2a_input_wrong_type(
     assert not returned_task.artifacts
     mock_send_mcp_request.assert_not_called()
 
+@pytest.mark.asyncio
+async def test_on_send_task_concurrent_tasks_do_not_share_state(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """
+    并发压力测试: 同一个 TaskManager 在同一事件循环上同时处理数百个任务。
+    模拟的 MCP 服务以随机延迟返回，使任务在 await 期间交错执行。
+    每个响应都必须对应它自己的请求 (目标 URL、MCP 请求 ID、参数)。
+    """
+    import asyncio
+    import random
+
+    num_tasks = 300
+
+    async def fake_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        await asyncio.sleep(random.uniform(0, 0.01))
+        return {
+            "jsonrpc": "2.0",
+            "id": mcp_json_rpc_request_dict["id"],
+            "result": {
+                "echo_url": target_url,
+                "echo_params": mcp_json_rpc_request_dict["params"],
+            },
+        }
+
+    mock_send_mcp_request.side_effect = fake_mcp_service
+
+    def build_request(i: int) -> SendTaskRequest:
+        input_data_payload = {
+            "mcp_target_url": f"http://mcp-service-{i % 7}.com",
+            "mcp_request_path": f"/mcp/{i}",
+            "mcp_method": "tools/call",
+            "mcp_params": {"name": "echo", "arguments": {"index": i}},
+            "mcp_request_id": f"mcp-req-{i}",
+        }
+        a2a_message = Message(role="user", parts=[DataPart(data=input_data_payload)])
+        task_send_params_obj = TaskSendParams(id=f"task-{i}", sessionId=f"session-{i}", message=a2a_message)
+        return SendTaskRequest(id=f"a2a-req-{i}", params=task_send_params_obj)
+
+    responses = await asyncio.gather(*(task_manager.on_send_task(build_request(i)) for i in range(num_tasks)))
+
+    assert mock_send_mcp_request.await_count == num_tasks
+    for i, a2a_response in enumerate(responses):
+        assert a2a_response.id == f"a2a-req-{i}"
+        returned_task = a2a_response.result
+        assert returned_task.id == f"task-{i}"
+        assert returned_task.sessionId == f"session-{i}"
+        assert returned_task.status.state == TaskState.COMPLETED
+
+        output_data_part = returned_task.artifacts[0].parts[0]
+        assert output_data_part.metadata["mcp_request_id_echo"] == f"mcp-req-{i}"
+        assert output_data_part.data["echo_url"] == f"http://mcp-service-{i % 7}.com/mcp/{i}"
+        assert output_data_part.data["echo_params"]["arguments"]["index"] == i
+
+        stored_task = task_manager.tasks[f"task-{i}"]
+        assert stored_task.status.state == TaskState.COMPLETED
+        assert stored_task.artifacts[-1].parts[0].metadata["mcp_request_id_echo"] == f"mcp-req-{i}"
+
+def _streaming_request(task_id: str, input_data_payload: dict) -> SendTaskStreamingRequest:
+    a2a_message = Message(role="user", parts=[DataPart(data=input_data_payload)])
+    task_send_params_obj = TaskSendParams(id=task_id, sessionId=f"session-{task_id}", message=a2a_message)
+    return SendTaskStreamingRequest(id=f"a2a-{task_id}", params=task_send_params_obj)
+
+async def _collect_stream(stream) -> list:
+    return [event async for event in stream]
+
+@pytest.mark.asyncio
+async def test_on_send_task_subscribe_streams_progress_and_result(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """流式任务: MCP 进度通知被转发为 WORKING 事件，最终产物先于 final=True 的状态事件推送。"""
+    async def fake_mcp_service(target_url, mcp_json_rpc_request_dict, on_notification=None, **kwargs):
+        progress_token = mcp_json_rpc_request_dict["params"]["_meta"]["progressToken"]
+        for step in (1, 2):
+            await on_notification({
+                "jsonrpc": "2.0",
+                "method": "notifications/progress",
+                "params": {"progressToken": progress_token, "progress": step, "total": 2},
+            })
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"content": [{"type": "text", "text": "done"}]}}
+
+    mock_send_mcp_request.side_effect = fake_mcp_service
+
+    request = _streaming_request("stream-task-1", {
+        "mcp_target_url": "http://mcp-service.com",
+        "mcp_method": "tools/call",
+        "mcp_params": {"name": "slow_tool", "arguments": {}},
+        "mcp_request_id": "mcp-stream-1",
+    })
+    stream = await task_manager.on_send_task_subscribe(request)
+    responses = await _collect_stream(stream)
+    events = [response.result for response in responses]
+
+    assert all(response.id == request.id for response in responses)
+    assert events[0].status.state == TaskState.SUBMITTED
+
+    progress_events = [e for e in events if isinstance(e, TaskStatusUpdateEvent) and "progress" in (e.metadata or {})]
+    assert [e.metadata["progress"] for e in progress_events] == [1, 2]
+    assert all(e.status.state == TaskState.WORKING for e in progress_events)
+    assert progress_events[0].metadata["total"] == 2
+
+    artifact_event, final_event = events[-2], events[-1]
+    assert isinstance(artifact_event, TaskArtifactUpdateEvent)
+    assert artifact_event.artifact.parts[0].metadata["mcp_request_id_echo"] == "mcp-stream-1"
+    assert isinstance(final_event, TaskStatusUpdateEvent)
+    assert final_event.final is True
+    assert final_event.status.state == TaskState.COMPLETED
+    assert sum(1 for e in events if getattr(e, "final", False)) == 1
+
+    # 进度只推送给订阅者，不写入任务存储；用户参数中不会出现 _meta
+    stored_task = task_manager.tasks["stream-task-1"]
+    assert stored_task.status.state == TaskState.COMPLETED
+    assert len(stored_task.artifacts) == 1
+    assert "_meta" not in task_manager.tasks["stream-task-1"].history[0].parts[0].data["mcp_params"]
+
+@pytest.mark.asyncio
+async def test_on_send_task_subscribe_streams_mcp_failure(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    mock_send_mcp_request.side_effect = httpx.ConnectError("connection refused", request=httpx.Request("POST", "http://mcp-service.com"))
+
+    request = _streaming_request("stream-task-2", {
+        "mcp_target_url": "http://mcp-service.com",
+        "mcp_method": "tools/call",
+        "mcp_params": {"name": "broken_tool"},
+    })
+    events = [response.result for response in await _collect_stream(await task_manager.on_send_task_subscribe(request))]
+
+    assert isinstance(events[-1], TaskStatusUpdateEvent)
+    assert events[-1].final is True
+    assert events[-1].status.state == TaskState.FAILED
+    assert isinstance(events[-2], TaskArtifactUpdateEvent)
+    # 失败结果只写入一次
+    assert len(task_manager.tasks["stream-task-2"].artifacts) == 1
+
+@pytest.mark.asyncio
+async def test_on_send_task_subscribe_marks_task_failed_on_unexpected_error(task_manager: MCPGatewayAgentTaskManager):
+    """流式流水线抛出意外异常时，任务在存储中被标记为 FAILED，流以 final=True 的 FAILED 状态事件结束。"""
+    from src.vendor.A2A.types import GetTaskRequest, TaskQueryParams
+
+    request = _streaming_request("stream-task-3", {
+        "mcp_target_url": "http://mcp-service.com",
+        "mcp_method": "tools/call",
+        "mcp_params": {"name": "echo"},
+    })
+    with patch.object(task_manager, "_execute_mcp_call", side_effect=RuntimeError("boom")):
+        events = [response.result for response in await _collect_stream(await task_manager.on_send_task_subscribe(request))]
+
+    assert isinstance(events[-1], TaskStatusUpdateEvent)
+    assert events[-1].final is True and events[-1].status.state == TaskState.FAILED
+    stored = await task_manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id="stream-task-3")))
+    assert stored.result.status.state == TaskState.FAILED
+    assert "boom" in stored.result.status.message.parts[0].text
+
+def _send_request(task_id: str, input_data_payload: dict) -> SendTaskRequest:
+    message = Message(role="user", parts=[DataPart(data=input_data_payload)])
+    return SendTaskRequest(id=f"req-{task_id}", params=TaskSendParams(id=task_id, message=message))
+
+@pytest.mark.asyncio
+async def test_on_send_task_caches_read_only_methods(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """只读方法 (tools/list) 的结果被缓存；每个任务仍回显自己的 mcp_request_id；bypass 和列表变更通知绕过/失效缓存。"""
+    async def fake_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"tools": [{"name": "echo", "inputSchema": {}}]}}
+
+    mock_send_mcp_request.side_effect = fake_mcp_service
+    payload = {"mcp_target_url": "http://mcp-service.com", "mcp_method": "tools/list", "mcp_params": {}}
+
+    first = await task_manager.on_send_task(_send_request("cache-1", {**payload, "mcp_request_id": "a"}))
+    second = await task_manager.on_send_task(_send_request("cache-2", {**payload, "mcp_request_id": "b"}))
+    assert mock_send_mcp_request.await_count == 1
+    assert task_manager.cache_stats()["hits"] == 1
+    assert second.result.status.state == TaskState.COMPLETED
+    assert second.result.artifacts[0].parts[0].data == first.result.artifacts[0].parts[0].data
+    assert second.result.artifacts[0].parts[0].metadata["mcp_request_id_echo"] == "b"
+
+    await task_manager.on_send_task(_send_request("cache-3", {**payload, "mcp_bypass_cache": True}))
+    assert mock_send_mcp_request.await_count == 2
+
+    # 其他调用中收到的 tools/list_changed 通知使缓存失效
+    async def notifying_mcp_service(target_url, mcp_json_rpc_request_dict, on_notification=None, **kwargs):
+        await on_notification({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"})
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"content": []}}
+
+    mock_send_mcp_request.side_effect = notifying_mcp_service
+    await task_manager.on_send_task(_send_request("cache-4", {**payload, "mcp_method": "tools/call", "mcp_params": {"name": "echo"}}))
+    mock_send_mcp_request.side_effect = fake_mcp_service
+    await task_manager.on_send_task(_send_request("cache-5", payload))
+    assert mock_send_mcp_request.await_count == 4
+    assert task_manager.cache_stats()["invalidations"] == 1
+
+@pytest.mark.asyncio
+async def test_on_send_task_rejects_non_boolean_bypass_cache(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    await task_manager.on_send_task(_send_request("cache-bad", {
+        "mcp_target_url": "http://mcp-service.com",
+        "mcp_method": "tools/list",
+        "mcp_params": {},
+        "mcp_bypass_cache": "yes",
+    }))
+    failed_task = task_manager.tasks["cache-bad"]
+    assert failed_task.status.state == TaskState.FAILED
+    assert "mcp_bypass_cache" in failed_task.status.message.parts[0].text
+    mock_send_mcp_request.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_reads_share_one_mcp_call(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """相同的并发 resources/read 只向目标发出一次请求，每个任务的产物回显自己的 mcp_request_id。"""
+    async def slow_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        await asyncio.sleep(0.01)
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"contents": [{"uri": "file:///a.txt", "text": "a"}]}}
+
+    mock_send_mcp_request.side_effect = slow_mcp_service
+    task_manager.response_cache.max_entries = 0  # 只验证合并，不使用缓存
+
+    responses = await asyncio.gather(*(
+        task_manager.on_send_task(_send_request(f"read-{i}", {
+            "mcp_target_url": "http://mcp-service.com",
+            "mcp_method": "resources/read",
+            "mcp_params": {"uri": "file:///a.txt"},
+            "mcp_request_id": f"read-req-{i}",
+        }))
+        for i in range(10)
+    ))
+
+    assert mock_send_mcp_request.await_count == 1
+    assert task_manager.coalescing_stats() == {"calls": 1, "shared": 9, "in_flight": 0}
+    for i, response in enumerate(responses):
+        assert response.result.status.state == TaskState.COMPLETED
+        assert response.result.artifacts[0].parts[0].metadata["mcp_request_id_echo"] == f"read-req-{i}"
+
+@pytest.mark.asyncio
+async def test_streaming_reads_are_not_coalesced_with_other_tasks(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """流式任务不加入也不接受合并：每个流式任务自己发出请求，只收到以自己任务 ID 为 progressToken 的进度。"""
+    progress_tokens = []
+
+    async def slow_mcp_service(target_url, mcp_json_rpc_request_dict, on_notification=None, **kwargs):
+        progress_token = mcp_json_rpc_request_dict["params"].get("_meta", {}).get("progressToken")
+        progress_tokens.append(progress_token)
+        await asyncio.sleep(0.01)
+        if progress_token is not None:
+            await on_notification({
+                "jsonrpc": "2.0",
+                "method": "notifications/progress",
+                "params": {"progressToken": progress_token, "progress": 1, "total": 1},
+            })
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"contents": [{"uri": "file:///a.txt", "text": "a"}]}}
+
+    mock_send_mcp_request.side_effect = slow_mcp_service
+    task_manager.response_cache.max_entries = 0  # 只验证合并，不使用缓存
+    payload = {"mcp_target_url": "http://mcp-service.com", "mcp_method": "resources/read", "mcp_params": {"uri": "file:///a.txt"}}
+
+    async def stream(task_id):
+        return [response.result for response in await _collect_stream(
+            await task_manager.on_send_task_subscribe(_streaming_request(task_id, payload))
+        )]
+
+    plain, first_events, second_events = await asyncio.gather(
+        task_manager.on_send_task(_send_request("plain-read", payload)), stream("stream-a"), stream("stream-b")
+    )
+
+    assert sorted(progress_tokens, key=str) == sorted([None, "stream-a", "stream-b"], key=str)
+    assert task_manager.coalescing_stats()["shared"] == 0
+    assert plain.result.status.state == TaskState.COMPLETED
+    for task_id, events in (("stream-a", first_events), ("stream-b", second_events)):
+        progress_events = [e for e in events if isinstance(e, TaskStatusUpdateEvent) and "progress" in (e.metadata or {})]
+        assert len(progress_events) == 1 and progress_events[0].id == task_id
+        assert events[-1].final is True and events[-1].status.state == TaskState.COMPLETED
+
+@pytest.mark.asyncio
+async def test_on_send_task_batch_of_command_data_parts(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """多个命令 DataPart: 同一目标的命令合并为一个 JSON-RPC 批量请求，每条命令一个按 index 排列的 Artifact，单条失败不影响其他命令。"""
+    async def fake_batch_service(target_url, mcp_json_rpc_requests, **kwargs):
+        first, second = mcp_json_rpc_requests
+        # 响应顺序与请求不同，网关应按 id 对应
+        return [
+            {"jsonrpc": "2.0", "id": second["id"], "error": {"code": -32601, "message": "Method not found"}},
+            {"jsonrpc": "2.0", "id": first["id"], "result": {"tools": []}},
+        ]
+
+    async def fake_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"content": [{"type": "text", "text": "b"}]}}
+
+    mock_send_mcp_request.side_effect = fake_mcp_service
+    commands = [
+        {"mcp_target_url": "http://a.com", "mcp_method": "tools/list", "mcp_params": {}, "mcp_request_id": "a-1"},
+        {"mcp_target_url": "http://b.com", "mcp_method": "tools/call", "mcp_params": {"name": "echo"}, "mcp_request_id": "b-1"},
+        {"mcp_target_url": "http://a.com", "mcp_method": "tools/unknown", "mcp_params": {}, "mcp_request_id": "a-2"},
+        {"mcp_target_url": "http://a.com", "mcp_method": "tools/call"},
+    ]
+    message = Message(role="user", parts=[DataPart(data=command) for command in commands])
+    request = SendTaskRequest(id="req-batch", params=TaskSendParams(id="batch-task", message=message))
+
+    with patch("src.translator.task_manager.send_mcp_batch", new_callable=AsyncMock, side_effect=fake_batch_service) as mock_send_mcp_batch:
+        response = await task_manager.on_send_task(request)
+
+    mock_send_mcp_batch.assert_awaited_once()
+    assert [body["method"] for body in mock_send_mcp_batch.call_args.args[1]] == ["tools/list", "tools/unknown"]
+    mock_send_mcp_request.assert_awaited_once()
+
+    task = response.result
+    assert task.status.state == TaskState.COMPLETED
+    assert [artifact.index for artifact in task.artifacts] == [0, 1, 2, 3]
+    assert task.artifacts[0].parts[0].data == {"tools": []}
+    assert task.artifacts[0].parts[0].metadata["mcp_request_id_echo"] == "a-1"
+    assert task.artifacts[1].parts[0].metadata["mcp_request_id_echo"] == "b-1"
+    assert task.artifacts[2].name == "MCP Call Communication Error"
+    assert task.artifacts[2].parts[0].data["source_error"]["code"] == -32601
+    assert task.artifacts[2].parts[0].data["mcp_request_id_echo"] == "a-2"
+    assert "mcp_params" in task.artifacts[3].parts[0].data["source_error"]["message"]
+
+@pytest.mark.asyncio
+async def test_on_send_task_fails_cleanly_when_target_queue_times_out(mock_send_mcp_request: AsyncMock):
+    """目标的并发名额用尽且排队超时时，任务以 FAILED 结束，且不向目标发送请求。"""
+    from src.translator.admission import AdmissionController
+
+    task_manager = MCPGatewayAgentTaskManager(admission=AdmissionController(max_in_flight=1, queue_timeout=0.01))
+    release = asyncio.Event()
+
+    async def slow_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        await release.wait()
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"content": []}}
+
+    mock_send_mcp_request.side_effect = slow_mcp_service
+    payload = {"mcp_target_url": "http://slow.com", "mcp_method": "tools/call", "mcp_params": {"name": "slow"}}
+    first = asyncio.create_task(task_manager.on_send_task(_send_request("slow-1", payload)))
+    await asyncio.sleep(0.001)
+    second = await task_manager.on_send_task(_send_request("slow-2", payload))
+    release.set()
+    await first
+
+    assert second.result.status.state == TaskState.FAILED
+    assert "调用名额" in second.result.status.message.parts[0].text
+    assert second.result.artifacts[0].parts[0].data["source_error"]["code"] == -32000
+    assert mock_send_mcp_request.await_count == 1
+    assert task_manager.admission_stats()["http://slow.com"]["timed_out"] == 1
+
+@pytest.mark.asyncio
+async def test_on_send_task_fails_fast_when_target_circuit_is_open(mock_send_mcp_request: AsyncMock):
+    """目标连续连接失败后熔断器打开，之后的任务立即失败 (错误码 -32001)，不再请求目标。"""
+    from src.translator.resilience import CircuitBreakers
+
+    task_manager = MCPGatewayAgentTaskManager(circuit_breakers=CircuitBreakers(failure_threshold=2, reset_timeout=60))
+    mock_send_mcp_request.side_effect = httpx.ConnectError("connection refused", request=httpx.Request("POST", "http://down.com"))
+    payload = {"mcp_target_url": "http://down.com", "mcp_method": "tools/list", "mcp_params": {}, "mcp_bypass_cache": True}
+
+    for i in range(3):
+        response = await task_manager.on_send_task(_send_request(f"down-{i}", payload))
+        assert response.result.status.state == TaskState.FAILED
+
+    assert mock_send_mcp_request.await_count == 2
+    source_error = response.result.artifacts[0].parts[0].data["source_error"]
+    assert source_error["code"] == -32001
+    assert source_error["data"]["retry_after"] > 0
+    assert task_manager.circuit_stats()["http://down.com"]["state"] == "open"
+    # 读超时由延迟统计决定，连接超时单独设置
+    timeout = mock_send_mcp_request.call_args.kwargs["timeout"]
+    assert isinstance(timeout, httpx.Timeout) and timeout.connect < timeout.read
+
 # Placeholder for more tests
+@pytest.mark.asyncio
+async def test_idempotent_calls_retry_transient_errors_on_replicas(mock_send_mcp_request: AsyncMock):
+    """幂等调用遇到连接错误时换副本重试；非幂等调用不重试。"""
+    from src.translator.resilience import HedgePolicy
+
+    task_manager = MCPGatewayAgentTaskManager(hedge_policy=HedgePolicy(
+        max_retries=2, replicas={"http://primary.com": ["http://replica.com"]}, backoff_base=0.001
+    ))
+
+    async def flaky_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        if target_url.startswith("http://primary.com"):
+            raise httpx.ConnectError("connection refused", request=httpx.Request("POST", target_url))
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"content": []}}
+
+    mock_send_mcp_request.side_effect = flaky_mcp_service
+    payload = {"mcp_target_url": "http://primary.com", "mcp_request_path": "/mcp", "mcp_method": "tools/call", "mcp_params": {"name": "lookup"}}
+
+    response = await task_manager.on_send_task(_send_request("retry-1", {**payload, "mcp_idempotent": True}))
+    assert response.result.status.state == TaskState.COMPLETED
+    assert [call.args[0] for call in mock_send_mcp_request.call_args_list] == ["http://primary.com/mcp", "http://replica.com/mcp"]
+    assert task_manager.hedging_stats()["retries"] == 1
+
+    response = await task_manager.on_send_task(_send_request("retry-2", payload))
+    assert response.result.status.state == TaskState.FAILED
+    assert mock_send_mcp_request.await_count == 3
+
+@pytest.mark.asyncio
+async def test_slow_idempotent_call_is_hedged_and_first_answer_wins(mock_send_mcp_request: AsyncMock):
+    """首次尝试超过目标的 p95 仍未完成时发出对冲请求，先返回的结果胜出，另一个尝试被取消。"""
+    from src.translator.resilience import HedgePolicy, LatencyTracker
+
+    latency_tracker = LatencyTracker()
+    for _ in range(32):
+        latency_tracker.observe("http://primary.com", "resources/read", 0.005)
+    task_manager = MCPGatewayAgentTaskManager(
+        latency_tracker=latency_tracker,
+        hedge_policy=HedgePolicy(hedge=True, replicas={"http://primary.com": ["http://replica.com"]}),
+    )
+    cancelled = []
+
+    async def slow_primary_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        try:
+            await asyncio.sleep(1.0 if target_url == "http://primary.com" else 0.0)
+        except asyncio.CancelledError:
+            cancelled.append(target_url)
+            raise
+        return {"jsonrpc": "2.0", "id": mcp_json_rpc_request_dict["id"], "result": {"contents": [{"uri": "file:///a", "text": target_url}]}}
+
+    mock_send_mcp_request.side_effect = slow_primary_service
+    response = await task_manager.on_send_task(_send_request("hedge-1", {
+        "mcp_target_url": "http://primary.com", "mcp_method": "resources/read", "mcp_params": {"uri": "file:///a"},
+    }))
+
+    assert response.result.status.state == TaskState.COMPLETED
+    assert response.result.artifacts[0].parts[0].data["contents"][0]["text"] == "http://replica.com"
+    assert cancelled == ["http://primary.com"]
+    assert task_manager.hedging_stats()["hedges"] == 1
+    assert task_manager.hedging_stats()["hedge_wins"] == 1
+
+@pytest.mark.asyncio
+async def test_async_execution_returns_immediately_and_cancel_stops_the_call(mock_send_mcp_request: AsyncMock):
+    """异步模式: tasks/send 立即返回，tasks/get 返回进度，tasks/cancel 取消进行中的 MCP 调用并将任务标记为 CANCELED。"""
+    from src.vendor.A2A.types import CancelTaskRequest, GetTaskRequest, TaskIdParams, TaskNotCancelableError, TaskQueryParams
+
+    task_manager = MCPGatewayAgentTaskManager(async_execution=True)
+    call_started = asyncio.Event()
+    call_cancelled = asyncio.Event()
+
+    async def slow_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        call_started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            call_cancelled.set()
+            raise
+
+    mock_send_mcp_request.side_effect = slow_mcp_service
+    payload = {"mcp_target_url": "http://slow.com", "mcp_method": "tools/call", "mcp_params": {"name": "slow"}}
+    response = await task_manager.on_send_task(_send_request("async-1", payload))
+    assert response.result.status.state == TaskState.SUBMITTED
+
+    await asyncio.wait_for(call_started.wait(), 1)
+    progress = await task_manager.on_get_task(GetTaskRequest(params=TaskQueryParams(id="async-1")))
+    assert progress.result.status.state == TaskState.WORKING
+
+    cancel_response = await task_manager.on_cancel_task(CancelTaskRequest(params=TaskIdParams(id="async-1")))
+    assert cancel_response.error is None
+    assert cancel_response.result.status.state == TaskState.CANCELED
+    assert call_cancelled.is_set()
+    assert task_manager.tasks["async-1"].status.state == TaskState.CANCELED
+
+    # 已结束的任务不能再取消
+    mock_send_mcp_request.side_effect = None
+    mock_send_mcp_request.return_value = {"jsonrpc": "2.0", "id": "done", "result": {"content": []}}
+    await task_manager.on_send_task(_send_request("async-2", {**payload, "mcp_request_id": "done"}))
+    for _ in range(10):
+        await asyncio.sleep(0)
+    assert task_manager.tasks["async-2"].status.state == TaskState.COMPLETED
+    cancel_response = await task_manager.on_cancel_task(CancelTaskRequest(params=TaskIdParams(id="async-2")))
+    assert isinstance(cancel_response.error, TaskNotCancelableError)
+
+@pytest.mark.asyncio
+async def test_cancel_interrupts_blocking_send_task(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """同步模式下 tasks/cancel 同样中止进行中的调用，等待中的 tasks/send 返回 CANCELED 的任务。"""
+    from src.vendor.A2A.types import CancelTaskRequest, TaskIdParams
+
+    call_started = asyncio.Event()
+
+    async def slow_mcp_service(target_url, mcp_json_rpc_request_dict, **kwargs):
+        call_started.set()
+        await asyncio.sleep(10)
+
+    mock_send_mcp_request.side_effect = slow_mcp_service
+    send = asyncio.create_task(task_manager.on_send_task(_send_request("blocking-1", {
+        "mcp_target_url": "http://slow.com", "mcp_method": "tools/call", "mcp_params": {"name": "slow"},
+    })))
+    await asyncio.wait_for(call_started.wait(), 1)
+    cancel_response = await task_manager.on_cancel_task(CancelTaskRequest(params=TaskIdParams(id="blocking-1")))
+
+    response = await send
+    assert cancel_response.result.status.state == TaskState.CANCELED
+    assert response.result.status.state == TaskState.CANCELED
+
+@pytest.mark.asyncio
+async def test_on_send_task_pushes_result_to_registered_webhook(mock_send_mcp_request: AsyncMock):
+    """非流式任务注册了 pushNotification 时，结果产物和最终状态被推送到 webhook。"""
+    from src.vendor.A2A.server.push import PushNotificationSender
+    from src.vendor.A2A.types import PushNotificationConfig
+
+    delivered = []
+
+    def webhook(request: httpx.Request) -> httpx.Response:
+        delivered.extend(json.loads(request.content))
+        return httpx.Response(200)
+
+    task_manager = MCPGatewayAgentTaskManager(push_sender=PushNotificationSender(
+        batch_window=0, transport=httpx.MockTransport(webhook), allowed_hosts=["client.local"]
+    ))
+    mock_send_mcp_request.return_value = {"jsonrpc": "2.0", "id": "p-1", "result": {"content": []}}
+    message = Message(role="user", parts=[DataPart(data={
+        "mcp_target_url": "http://mcp-service.com", "mcp_method": "tools/call", "mcp_params": {"name": "echo"}, "mcp_request_id": "p-1",
+    })])
+    await task_manager.on_send_task(SendTaskRequest(id="req-push", params=TaskSendParams(
+        id="push-task", message=message, pushNotification=PushNotificationConfig(url="http://client.local/hook")
+    )))
+    await task_manager.on_shutdown()
+
+    assert delivered[-1]["status"]["state"] == "completed" and delivered[-1]["final"] is True
+    assert any("artifact" in event for event in delivered)
+
+@pytest.mark.asyncio
+async def test_on_send_task_rejects_webhook_on_a_private_address(mock_send_mcp_request: AsyncMock):
+    """pushNotification 指向回环地址时返回 -32602，任务既不创建也不调用 MCP。"""
+    from src.vendor.A2A.server.push import PushNotificationSender
+    from src.vendor.A2A.types import PushNotificationConfig
+
+    task_manager = MCPGatewayAgentTaskManager(push_sender=PushNotificationSender(batch_window=0))
+    message = Message(role="user", parts=[DataPart(data={"mcp_target_url": "http://mcp-service.com", "mcp_method": "tools/list"})])
+    response = await task_manager.on_send_task(SendTaskRequest(id="req-push", params=TaskSendParams(
+        id="push-task", message=message, pushNotification=PushNotificationConfig(url="http://127.0.0.1:9000/hook")
+    )))
+    await task_manager.on_shutdown()
+
+    assert response.error.code == -32602
+    assert "push-task" not in task_manager.tasks
+    mock_send_mcp_request.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_latency_stats_report_recorded_calls(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """latency_stats() 按 (方法, 目标) 报告样本数；样本不足时百分位为 None，读超时取上限。"""
+    mock_send_mcp_request.return_value = {"jsonrpc": "2.0", "id": "l-1", "result": {"content": []}}
+    await task_manager.on_send_task(_send_request("latency-1", {
+        "mcp_target_url": "http://mcp-service.com", "mcp_method": "tools/call", "mcp_params": {"name": "echo"},
+    }))
+
+    assert task_manager.latency_stats() == {
+        "tools/call:echo http://mcp-service.com": {
+            "samples": 1, "p50_s": None, "p95_s": None, "p99_s": None,
+            "read_timeout_s": task_manager.latency_tracker.max_timeout,
+        }
+    }
+
+@pytest.mark.asyncio
+async def test_upstream_calls_are_counted_per_target_method_and_code(task_manager: MCPGatewayAgentTaskManager, mock_send_mcp_request: AsyncMock):
+    """注册指标后，每次 MCP 调用按 (目标, 方法, 结果码) 计数，发出的请求记录耗时。"""
+    from src.vendor.A2A.server.metrics import MetricsRegistry
+
+    metrics = MetricsRegistry()
+    task_manager.register_metrics(metrics)
+    payload = {"mcp_target_url": "http://mcp-service.com", "mcp_method": "tools/call", "mcp_params": {"name": "echo"}}
+    server_error = httpx.HTTPStatusError(
+        "boom", request=httpx.Request("POST", "http://mcp-service.com"), response=httpx.Response(503)
+    )
+    mock_send_mcp_request.side_effect = [
+        {"jsonrpc": "2.0", "id": "m-1", "result": {"content": []}},
+        {"jsonrpc": "2.0", "id": "m-2", "error": {"code": -32602, "message": "Invalid params"}},
+        server_error,
+    ]
+    for i in range(3):
+        await task_manager.on_send_task(_send_request(f"metrics-{i}", payload))
+
+    calls = metrics.get("mcp_upstream_calls_total")
+    assert calls.value("http://mcp-service.com", "tools/call", "ok") == 1
+    assert calls.value("http://mcp-service.com", "tools/call", "-32602") == 1
+    assert calls.value("http://mcp-service.com", "tools/call", "http_503") == 1
+    assert metrics.get("mcp_upstream_duration_seconds").count("http://mcp-service.com", "tools/call") == 3
+    assert 'mcp_upstream_calls_total{mcp_target_url="http://mcp-service.com",mcp_method="tools/call",code="ok"} 1' in metrics.render()
+
+def test_task_manager_keeps_the_given_empty_client_registry():
+    """空的 MCPClientRegistry (len 为 0) 也不能被替换成新的注册表，否则自定义传输层和连接池配置会丢失。"""
+    from src.translator.mcp_client import MCPClientRegistry
+
+    registry = MCPClientRegistry()
+    assert MCPGatewayAgentTaskManager(client_registry=registry).client_registry is registry
+
+
+@pytest.mark.asyncio
+async def test_mcp_calls_use_the_pool_configuration_of_the_given_registry():
+    """命令行构建的连接池配置 (--mcp-max-connections 等) 必须用于实际的 MCP 调用。"""
+    from src.translator.mcp_client import MCPClientPoolConfig, MCPClientRegistry
+
+    seen_urls = []
+
+    def mcp_service(request: httpx.Request) -> httpx.Response:
+        seen_urls.append(str(request.url))
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": body["id"], "result": {"content": []}})
+
+    config = MCPClientPoolConfig(max_connections=3, max_keepalive_connections=1)
+    registry = MCPClientRegistry(config, transport=httpx.MockTransport(mcp_service))
+    task_manager = MCPGatewayAgentTaskManager(client_registry=registry)
+    request = SendTaskRequest(id="req-pool", params=TaskSendParams(id="task-pool", message=Message(role="user", parts=[DataPart(data={
+        "mcp_target_url": "http://mcp-service.com/mcp", "mcp_method": "tools/call", "mcp_params": {"name": "echo"},
+    })])))
+
+    response = await task_manager.on_send_task(request)
+
+    assert response.result.status.state == TaskState.COMPLETED
+    assert seen_urls == ["http://mcp-service.com/mcp"]
+    assert len(registry) == 1 and task_manager.client_registry.config is config
+    await task_manager.on_shutdown()
+
 # async def test_on_send_task_successful_resources_read(...):
 # async def test_on_send_task_mcp_returns_json_rpc_error(...):
 # async def test_on_send_task_mcp_network_error(...):
@@ -0,0 +1,151 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from src.vendor.A2A.server.retention import RetentionPolicy
+from src.vendor.A2A.server.store import SQLiteTaskStore
+from src.vendor.A2A.types import (
+    Artifact,
+    GetTaskRequest,
+    TaskQueryParams,
+    TaskState,
+    TaskStatus,
+    TextPart,
+)
+
+from tests.conftest import StubTaskManager, send_params
+
+
+def _row_count(path) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_batches_writes_and_survives_restart(tmp_path):
+    """
+    写入先对读者可见，再由后台批量提交；重启后任务 (包括 artifacts) 仍然存在，
+    保留策略的记录也会恢复。
+    """
+    db_path = str(tmp_path / "tasks.db")
+    manager = StubTaskManager(task_store=SQLiteTaskStore(db_path, flush_interval=60))
+    await manager.on_startup()
+
+    for i in range(3):
+        await manager.upsert_task(send_params(f"task-{i}"))
+        await manager.update_store(f"task-{i}", TaskStatus(state=TaskState.WORKING), [])
+    await manager.update_store(
+        "task-0", TaskStatus(state=TaskState.COMPLETED), [Artifact(parts=[TextPart(text="out")])]
+    )
+    await manager.delete_task("task-2")
+
+    # 尚未落盘，但读取和计数已经反映所有写入
+    assert _row_count(db_path) == 0
+    assert len(manager.tasks) == 2
+    assert manager.tasks["task-0"].status.state == TaskState.COMPLETED
+    assert "task-2" not in manager.tasks
+
+    await manager.tasks.flush()
+    assert _row_count(db_path) == 2
+    await manager.on_shutdown()
+
+    restarted = StubTaskManager(
+        task_store=SQLiteTaskStore(db_path, cache_size=1),
+        retention_policy=RetentionPolicy(terminal_ttl=0, max_tasks=None),
+    )
+    await restarted.on_startup()
+    assert len(restarted.tasks) == 2
+    assert sorted(restarted.tasks) == ["task-0", "task-1"]
+
+    response = await restarted.on_get_task(GetTaskRequest(params=TaskQueryParams(id="task-0")))
+    assert response.result.artifacts[0].parts[0].text == "out"
+    assert response.result.status.state == TaskState.COMPLETED
+
+    # 已结束的任务在重启后按 TTL 淘汰，进行中的任务保留
+    assert await restarted.sweep_tasks() == 1
+    await restarted.on_shutdown()
+    assert _row_count(db_path) == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_flushes_when_batch_fills(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    store = SQLiteTaskStore(db_path, flush_interval=60, flush_batch=10)
+    manager = StubTaskManager(task_store=store)
+    await manager.on_startup()
+
+    for i in range(10):
+        await manager.upsert_task(send_params(f"task-{i}"))
+    # 批次已满时立即唤醒后台写入，而不是等待 flush_interval
+    for _ in range(100):
+        if _row_count(db_path) == 10:
+            break
+        await asyncio.sleep(0.01)
+    assert _row_count(db_path) == 10
+    await manager.on_shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_cold_reads_run_off_the_event_loop(tmp_path):
+    """缓存未命中的读取 (包括不存在的任务) 在工作线程中查询数据库，不阻塞事件循环。"""
+    import threading
+
+    db_path = str(tmp_path / "tasks.db")
+    manager = StubTaskManager(task_store=SQLiteTaskStore(db_path))
+    await manager.on_startup()
+    await manager.upsert_task(send_params("stored"))
+    await manager.on_shutdown()
+
+    store = SQLiteTaskStore(db_path)
+    lookups = []
+    select_body = store._select_body
+
+    def recording_select_body(task_id):
+        lookups.append((task_id, threading.current_thread() is threading.main_thread()))
+        return select_body(task_id)
+
+    store._select_body = recording_select_body
+    restarted = StubTaskManager(task_store=store)
+    await restarted.on_startup()
+
+    assert (await restarted.on_get_task(GetTaskRequest(params=TaskQueryParams(id="stored")))).result.id == "stored"
+    assert (await restarted.on_get_task(GetTaskRequest(params=TaskQueryParams(id="missing")))).error is not None
+    await restarted.upsert_task(send_params("new"))
+    assert (await restarted.on_get_task(GetTaskRequest(params=TaskQueryParams(id="missing")))).error is not None
+
+    # 每个 id 只查询一次 (不存在也会被记住)，且都不在事件循环线程上
+    assert lookups == [("stored", False), ("missing", False), ("new", False)]
+    await restarted.on_shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_restores_only_in_flight_tasks_without_retention_and_sweeps_without_scanning(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    manager = StubTaskManager(task_store=SQLiteTaskStore(db_path))
+    await manager.on_startup()
+    for task_id in ("done", "running"):
+        await manager.upsert_task(send_params(task_id))
+    await manager.update_store("done", TaskStatus(state=TaskState.COMPLETED), [])
+    await manager.on_shutdown()
+
+    class _NoScanStore(SQLiteTaskStore):
+        def __iter__(self):
+            raise AssertionError("the store must not be scanned")
+
+    keep_all = StubTaskManager(
+        task_store=_NoScanStore(db_path), retention_policy=RetentionPolicy(terminal_ttl=None, max_tasks=None)
+    )
+    await keep_all.on_startup()
+    assert await keep_all.tasks.restored(include_terminal=False) == [("running", TaskState.SUBMITTED)]
+    assert keep_all.retention.in_flight() == 1 and len(keep_all.tasks) == 2
+    assert await keep_all.sweep_tasks() == 0
+    await keep_all.on_shutdown()
+
+    expiring = StubTaskManager(
+        task_store=_NoScanStore(db_path), retention_policy=RetentionPolicy(terminal_ttl=0, max_tasks=1)
+    )
+    await expiring.on_startup()
+    assert await expiring.sweep_tasks() == 1
+    assert "done" not in expiring.tasks and "running" in expiring.tasks
+    await expiring.on_shutdown()
@@ -0,0 +1,77 @@
+import json
+
+from src.vendor.A2A.server.tracing import (
+    FileSpanExporter,
+    InMemorySpanExporter,
+    Tracer,
+    current_traceparent,
+    parse_traceparent,
+    span,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+def test_parse_traceparent_accepts_valid_and_rejects_malformed_headers():
+    context = parse_traceparent(PARENT)
+    assert (context.trace_id, context.span_id, context.sampled) == (TRACE_ID, "00f067aa0ba902b7", True)
+    assert context.traceparent() == PARENT
+    assert parse_traceparent(f"00-{TRACE_ID}-00f067aa0ba902b7-00").sampled is False
+    for invalid in (None, "", "garbage", f"ff-{TRACE_ID}-00f067aa0ba902b7-01", f"00-{'0' * 32}-00f067aa0ba902b7-01",
+                    f"00-{TRACE_ID}-{'0' * 16}-01", f"00-{TRACE_ID}-00f067aa0ba902b7-01-extra"):
+        assert parse_traceparent(invalid) is None
+
+
+def test_disabled_tracer_records_nothing_but_forwards_traceparent():
+    """没有导出器时不创建 span；传入的 traceparent 原样向下游传递。"""
+    tracer = Tracer()
+    with tracer.start_span("a2a tasks/send") as root:
+        assert root is None and current_traceparent() is None
+    with tracer.start_span("a2a tasks/send", PARENT) as root:
+        with span("mcp.http") as child:
+            assert root is None and child is None
+            assert current_traceparent() == PARENT
+    assert current_traceparent() is None
+
+
+def test_sampled_spans_form_a_tree_and_are_exported():
+    exporter = InMemorySpanExporter()
+    tracer = Tracer(sample_rate=0.0, exporter=exporter)
+
+    # 未采样的请求 (采样率为 0，且没有调用方的采样决定) 不记录
+    with tracer.start_span("a2a tasks/get"):
+        with span("task.upsert"):
+            pass
+    assert exporter.finished_spans() == []
+
+    # 调用方已采样时遵循其决定，沿用其 trace id
+    try:
+        with tracer.start_span("a2a tasks/send", PARENT, task_id="t1") as root:
+            with span("mcp.http", url="http://mcp.local") as child:
+                assert current_traceparent() == f"00-{TRACE_ID}-{child.context.span_id}-01"
+                raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    child_span, root_span = exporter.finished_spans(TRACE_ID)
+    assert root_span is root and root_span.parent_id == "00f067aa0ba902b7"
+    assert child_span.parent_id == root_span.context.span_id
+    assert child_span.attributes == {"url": "http://mcp.local"}
+    assert child_span.as_dict()["status"] == "error" and "boom" in child_span.error
+    assert root_span.end_ns >= child_span.end_ns
+
+
+def test_file_exporter_writes_one_json_line_per_span(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, exporter=FileSpanExporter(str(path)))
+    with tracer.start_span("a2a tasks/send"):
+        with span("task.update_store", state="completed"):
+            pass
+    tracer.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["name"] for r in records] == ["task.update_store", "a2a tasks/send"]
+    assert records[0]["parent_id"] == records[1]["span_id"]
+    assert records[0]["attributes"] == {"state": "completed"}
+    assert records[0]["duration_ms"] >= 0
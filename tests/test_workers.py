@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+from starlette.testclient import TestClient
+
+from src.translator.agent_card import def_get_mcp_gateway_agent_card
+from src.translator.task_manager import MCPGatewayAgentTaskManager
+from src.translator.workers import FORWARDED_HEADER, WorkerRouter, task_owner
+from src.vendor.A2A.server import A2AServer
+from src.vendor.A2A.types import Message, TaskSendParams, TextPart
+
+
+def _server(router: WorkerRouter) -> A2AServer:
+    return A2AServer(
+        agent_card=def_get_mcp_gateway_agent_card(host="localhost", port=8080),
+        task_manager=MCPGatewayAgentTaskManager(),
+        task_router=router,
+    )
+
+
+def test_task_owner_is_stable_and_covers_all_workers():
+    owners = {task_owner(f"task-{i}", 4) for i in range(100)}
+    assert owners == {0, 1, 2, 3}
+    assert task_owner("task-42", 4) == task_owner("task-42", 4)
+
+
+def test_requests_for_foreign_tasks_are_forwarded_to_owner():
+    """
+    worker 0 收到属于 worker 1 的任务请求时，转发给 worker 1 并原样返回其响应；
+    属于自己的任务在本地处理。
+    """
+    local_id = next(f"task-{i}" for i in range(100) if task_owner(f"task-{i}", 2) == 0)
+    foreign_id = next(f"task-{i}" for i in range(100) if task_owner(f"task-{i}", 2) == 1)
+
+    owner = _server(WorkerRouter(1, 2, ipc_dir="/unused"))
+    asyncio.run(owner.task_manager.upsert_task(
+        TaskSendParams(id=foreign_id, message=Message(role="user", parts=[TextPart(text="hi")]))
+    ))
+
+    seen_headers = []
+
+    async def record_forwarded(request: httpx.Request):
+        seen_headers.append(request.headers.get(FORWARDED_HEADER))
+
+    router = WorkerRouter(0, 2, ipc_dir="/unused")
+    # 用 ASGI 传输代替 Unix 域套接字连接到所属 worker
+    router._clients[1] = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=owner.app),
+        base_url="http://a2a-worker",
+        event_hooks={"request": [record_forwarded]},
+    )
+
+    with TestClient(_server(router).app) as client:
+        forwarded = client.post(
+            "/", json={"jsonrpc": "2.0", "id": 1, "method": "tasks/get", "params": {"id": foreign_id}}
+        )
+        local = client.post(
+            "/", json={"jsonrpc": "2.0", "id": 2, "method": "tasks/get", "params": {"id": local_id}}
+        )
+
+    assert forwarded.status_code == 200
+    assert forwarded.json()["result"]["id"] == foreign_id
+    assert seen_headers == ["0"]
+    # 本地任务不转发；本 worker 从未见过该任务
+    assert local.json()["error"]["code"] == -32001
+    assert router._clients == {}  # 服务器关闭时释放 IPC 客户端